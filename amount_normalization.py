@@ -0,0 +1,185 @@
+"""
+Bulk, unit-aware normalization of monetary amounts
+Takes whole columns of extracted amounts (from LLM output or financial statement tables),
+applies the scale declared in the table caption ("in thousands", "$ in millions") and returns
+NumPy arrays in one canonical unit together with a per-value parse status
+"""
+
+import re
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+# Parse status codes
+OK = 0
+EMPTY = 1
+INVALID = 2
+PERCENT = 3
+
+UNIT_FACTORS = {
+    "units": 1.0,
+    "thousands": 1e3,
+    "millions": 1e6,
+    "billions": 1e9,
+    "trillions": 1e12
+}
+
+SUFFIX_FACTORS = {
+    "k": 1e3, "thousand": 1e3, "thousands": 1e3,
+    "m": 1e6, "mm": 1e6, "mn": 1e6, "mil": 1e6, "million": 1e6, "millions": 1e6,
+    "b": 1e9, "bn": 1e9, "billion": 1e9, "billions": 1e9,
+    "t": 1e12, "tn": 1e12, "trillion": 1e12, "trillions": 1e12
+}
+
+CURRENCIES = {
+    "$": "USD", "us$": "USD", "usd": "USD",
+    "€": "EUR", "eur": "EUR",
+    "£": "GBP", "gbp": "GBP",
+    "¥": "JPY", "jpy": "JPY"
+}
+
+_CURRENCY = r'US\$|\$|€|£|¥|USD|EUR|GBP|JPY'
+_NUMBER = r'\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?|\.\d+'
+_SUFFIX = r'thousands?|millions?|billions?|trillions?|bn|mn|mm|mil|tn|k|m|b|t'
+_MINUS = r'[-−–]'
+
+# A single amount, e.g. "$1.2 billion", "(345)", "€12,500", "-4.1m", "3.5%"
+AMOUNT_PATTERN = re.compile(
+    rf'(?P<minus>{_MINUS})?\s*(?P<open>\()?\s*(?P<minus2>{_MINUS})?\s*'
+    rf'(?P<currency>{_CURRENCY})?\s*(?P<open2>\()?\s*(?P<minus3>{_MINUS})?\s*'
+    rf'(?P<number>{_NUMBER})'
+    rf'(?:\s*(?P<suffix>{_SUFFIX})(?![A-Za-z]))?'
+    rf'\s*(?P<currency2>USD|EUR|GBP|JPY)?\s*(?P<close>\))?\s*(?P<percent>%)?',
+    re.IGNORECASE
+)
+
+# Amounts embedded in prose: require a currency marker or scale word so years and
+# footnote numbers are not picked up
+AMOUNT_IN_TEXT_PATTERN = re.compile(
+    rf'\(?\s*(?:{_CURRENCY})\s*{_MINUS}?\s*(?:{_NUMBER})(?:\s*(?:{_SUFFIX})(?![A-Za-z]))?\s*\)?'
+    rf'|(?:{_NUMBER})\s*(?:thousands?|millions?|billions?|trillions?|bn|mn)(?![A-Za-z])',
+    re.IGNORECASE
+)
+
+# Table captions such as "(in thousands, except per share data)" or "$ in millions"
+SCALE_CAPTION_PATTERN = re.compile(
+    r"\bin\s+(?:US\$|\$|€|£|¥|USD|EUR|GBP|JPY)?\s*(thousands|millions|billions|'?000s?)\b"
+    r"|(?:US\$|\$|€|£|¥)\s*(?:in\s+)?(thousands|millions|billions|'?000s?|m|mn|bn)\b",
+    re.IGNORECASE
+)
+
+DASHES = {"-", "—", "–", "−", "--"}
+
+CURRENCY_PATTERN = re.compile(r'US\$|\$|€|£|¥|\b(?:USD|EUR|GBP|JPY)\b', re.IGNORECASE)
+
+
+def detect_scale(caption: Optional[str]) -> float:
+    """Multiplier (to units) declared by a table caption; 1.0 when none is found"""
+    if not caption:
+        return 1.0
+    match = SCALE_CAPTION_PATTERN.search(caption)
+    if not match:
+        return 1.0
+    word = (match.group(1) or match.group(2)).lower().lstrip("'")
+    if word.startswith("000"):
+        return 1e3
+    return SUFFIX_FACTORS.get(word, 1.0)
+
+
+def detect_currency(text: Optional[str]) -> str:
+    """ISO code of the first currency marker in a caption or header ("" when there is none)"""
+    match = CURRENCY_PATTERN.search(text or "")
+    return CURRENCIES[match.group(0).lower()] if match else ""
+
+
+class NormalizedAmounts:
+    """
+    Result of a bulk normalization
+    `values` are in `unit`; entries whose `status` is not OK are NaN (`ok` is the mask)
+    """
+
+    def __init__(self, values: np.ndarray, status: np.ndarray, currency: np.ndarray, unit: str):
+        self.values = values
+        self.status = status
+        self.currency = currency
+        self.unit = unit
+
+    @property
+    def ok(self) -> np.ndarray:
+        return self.status == OK
+
+    def __len__(self):
+        return len(self.values)
+
+
+def normalize_amounts(values: Iterable, caption: Optional[str] = None, unit: str = "millions",
+                      default_unit: Optional[str] = None) -> NormalizedAmounts:
+    """
+    Normalize a column of amounts to `unit`
+
+    Args:
+        values: Strings (or numbers) as extracted, e.g. "$1.2 billion", "(345)", "€12,500"
+        caption: Table caption or header; its declared scale applies to values without
+            their own scale suffix
+        unit: Canonical output unit (units, thousands, millions, billions, trillions)
+        default_unit: Scale for unsuffixed values when there is no caption (default: units)
+    """
+    raw = [v if isinstance(v, str) else ("" if v is None else format(float(v), "f")) for v in values]
+    n = len(raw)
+    if default_unit is not None:
+        base_scale = UNIT_FACTORS[default_unit]
+    else:
+        base_scale = detect_scale(caption)
+
+    status = np.full(n, INVALID, dtype=np.int8)
+    number_text = ["nan"] * n
+    scale = np.full(n, base_scale, dtype=np.float64)
+    negative = np.zeros(n, dtype=bool)
+    currency = np.full(n, "", dtype=object)
+
+    fullmatch = AMOUNT_PATTERN.fullmatch
+    for i, text in enumerate(raw):
+        text = text.strip()
+        if not text:
+            status[i] = EMPTY
+            continue
+        if text in DASHES:
+            status[i] = OK
+            number_text[i] = "0"
+            continue
+        match = fullmatch(text)
+        if match is None:
+            continue
+        minus, opened, minus2, symbol, opened2, minus3, number, suffix, symbol2, closed, percent = match.groups()
+        opened = opened or opened2
+        if percent:
+            status[i] = PERCENT
+            continue
+        if bool(opened) != bool(closed):
+            continue
+        status[i] = OK
+        number_text[i] = number.replace(",", "")
+        negative[i] = bool(opened or minus or minus2 or minus3)
+        if suffix:
+            scale[i] = SUFFIX_FACTORS[suffix.lower()]
+        if symbol or symbol2:
+            currency[i] = CURRENCIES[(symbol or symbol2).lower()]
+
+    # Vectorized numeric conversion and scaling
+    numbers = np.array(number_text, dtype=np.float64)
+    result = numbers * scale / UNIT_FACTORS[unit]
+    result = np.where(negative, -result, result)
+    result[status != OK] = np.nan
+
+    return NormalizedAmounts(result, status, currency, unit)
+
+
+def normalize_amount(value, unit: str = "millions", default_unit: Optional[str] = None) -> Optional[float]:
+    """Normalize a single amount; None if it can't be parsed"""
+    result = normalize_amounts([value], unit=unit, default_unit=default_unit)
+    return float(result.values[0]) if result.ok[0] else None
+
+
+def find_amounts(text: str) -> List[str]:
+    """Monetary amounts mentioned in a line of prose, e.g. ['$1.2 billion', '(€345m)']"""
+    return [m.group(0).strip() for m in AMOUNT_IN_TEXT_PATTERN.finditer(text)]
@@ -0,0 +1,345 @@
+"""
+Portable analysis bundles
+One file holds everything needed to show an analyzed report again without extraction, LLM
+or search calls: the report text, the section analyses, web research, extracted statements
+and figures. Each entry is compressed on its own and stored once per content hash, behind a
+small header index, so opening a bundle reads only the header and each section is
+decompressed when it is first shown. A directory of bundles is the library.
+
+Layout: MAGIC | header length (4 bytes, little-endian) | zlib(JSON header) | entry data
+"""
+
+import hashlib
+import json
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional
+
+from metrics import METRICS
+from report_store import DEFAULT_STORE_DIR, company_key, decode_artifact, encode_artifact, report_id_for_text
+from single_flight import fingerprint
+
+MAGIC = b"FABUNDLE"
+FORMAT_VERSION = 1
+BUNDLE_SUFFIX = ".fab"
+DEFAULT_LIBRARY_DIR = os.environ.get("FUNDAMENTALS_LIBRARY_DIR", os.path.join(DEFAULT_STORE_DIR, "library"))
+# Report store artifacts carried in bundles (all JSON-safe once encoded; bundles never hold pickles)
+BUNDLED_ARTIFACTS = ("statements", "cover", "metadata", "cleanup", "skipped_pages")
+
+_LENGTH = struct.Struct("<I")
+# Headers are small; anything claiming more is not a bundle
+MAX_HEADER_BYTES = 16 * 1024 * 1024
+# Report ids become report store paths, so only content hashes are accepted
+REPORT_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+ENTRY_NAME_PATTERN = re.compile(r"text|(analysis|research)/\w+|figure/\w+\.json|artifact/(%s)\.json"
+                                % "|".join(BUNDLED_ARTIFACTS))
+
+
+class BundleError(ValueError):
+    """Not a bundle, an unsupported version, or a damaged entry"""
+
+
+def pack_bundle(meta: dict, entries: Dict[str, bytes]) -> bytes:
+    """Bundle bytes for `entries` (name -> raw bytes); identical entries are stored once"""
+    data = bytearray()
+    index = {}
+    stored: Dict[str, tuple] = {}
+    for name in sorted(entries):
+        raw = entries[name]
+        digest = hashlib.sha256(raw).hexdigest()
+        if digest not in stored:
+            compressed = zlib.compress(raw, 9)
+            stored[digest] = (len(data), len(compressed))
+            data += compressed
+        offset, length = stored[digest]
+        index[name] = {"sha256": digest, "offset": offset, "length": length, "size": len(raw)}
+    # Content address: the same entries always give the same id
+    bundle_id = fingerprint(*(f"{name}={entry['sha256']}" for name, entry in sorted(index.items())))
+    header = dict(meta, format=FORMAT_VERSION, bundle_id=bundle_id, entries=index)
+    header_bytes = zlib.compress(json.dumps(header, sort_keys=True).encode("utf-8"), 9)
+    return MAGIC + _LENGTH.pack(len(header_bytes)) + header_bytes + bytes(data)
+
+
+def read_header(f) -> tuple:
+    """(header, offset of the entry data) from a binary file positioned at the start"""
+    if f.read(len(MAGIC)) != MAGIC:
+        raise BundleError("not an analysis bundle")
+    length_bytes = f.read(_LENGTH.size)
+    if len(length_bytes) != _LENGTH.size:
+        raise BundleError("truncated header")
+    (length,) = _LENGTH.unpack(length_bytes)
+    if length > MAX_HEADER_BYTES:
+        raise BundleError("header too large")
+    try:
+        header = json.loads(zlib.decompress(f.read(length)))
+    except (zlib.error, ValueError):
+        raise BundleError("damaged header")
+    if header.get("format", 0) > FORMAT_VERSION:
+        raise BundleError(f"bundle format {header.get('format')} is newer than this app supports")
+    return header, len(MAGIC) + _LENGTH.size + length
+
+
+class AnalysisBundle:
+    """A bundle on disk; entries are read and decompressed one at a time"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.header, self._data_offset = read_header(f)
+        if not isinstance(self.header.get("report_id"), str) or not REPORT_ID_PATTERN.fullmatch(self.header["report_id"]):
+            raise BundleError("invalid report id")
+        if not isinstance(self.header.get("entries"), dict):
+            raise BundleError("damaged header")
+
+    @property
+    def bundle_id(self) -> str:
+        return self.header["bundle_id"]
+
+    @property
+    def report_id(self) -> str:
+        return self.header["report_id"]
+
+    @property
+    def company_name(self) -> str:
+        return self.header.get("company_name") or "Unknown Company"
+
+    @property
+    def created(self) -> float:
+        return self.header.get("created", 0.0)
+
+    @property
+    def source(self) -> str:
+        return self.header.get("source", "app")
+
+    def names(self, prefix: str = "") -> List[str]:
+        return sorted(name for name in self.header["entries"] if name.startswith(prefix))
+
+    def sections(self) -> List[str]:
+        """Section keys with an analysis in this bundle"""
+        return [name.split("/", 1)[1] for name in self.names("analysis/")]
+
+    def read(self, name: str) -> Optional[bytes]:
+        entry = self.header["entries"].get(name)
+        if entry is None:
+            return None
+        start = time.perf_counter()
+        with open(self.path, "rb") as f:
+            f.seek(self._data_offset + entry["offset"])
+            compressed = f.read(entry["length"])
+        try:
+            raw = zlib.decompress(compressed)
+        except zlib.error:
+            raise BundleError(f"damaged entry {name}")
+        if hashlib.sha256(raw).hexdigest() != entry["sha256"]:
+            raise BundleError(f"damaged entry {name}")
+        METRICS.observe("library.entry_read_ms", (time.perf_counter() - start) * 1000)
+        return raw
+
+    def read_text(self, name: str) -> Optional[str]:
+        raw = self.read(name)
+        return raw.decode("utf-8") if raw is not None else None
+
+    def read_json(self, name: str, default=None):
+        raw = self.read(name)
+        return json.loads(raw) if raw is not None else default
+
+    def analysis(self, section_key: str) -> Optional[str]:
+        return self.read_text(f"analysis/{section_key}")
+
+    def research(self) -> Dict[str, str]:
+        return {name.split("/", 1)[1]: self.read_text(name) for name in self.names("research/")}
+
+    def artifacts(self) -> dict:
+        """Report store artifacts, decoded back to what the app stores"""
+        artifacts = {}
+        for artifact in BUNDLED_ARTIFACTS:
+            value = self.read_json(f"artifact/{artifact}.json")
+            if value is not None:
+                artifacts[artifact] = decode_artifact(artifact, value)
+        return artifacts
+
+    def figure(self, name: str) -> Optional[str]:
+        """A figure as Plotly JSON"""
+        return self.read_text(f"figure/{name}.json")
+
+    def verify(self):
+        """
+        Check every entry of a bundle from elsewhere before it joins the library
+        Raises BundleError for unknown entry names, a report id that isn't the text's hash,
+        or any entry that doesn't read and decode
+        """
+        for name in self.names():
+            if not ENTRY_NAME_PATTERN.fullmatch(name):
+                raise BundleError(f"unexpected entry {name!r}")
+        try:
+            text = self.read_text("text")
+            if text is None or report_id_for_text(text) != self.report_id:
+                raise BundleError("report id does not match the report text")
+            for name in self.names("analysis/") + self.names("research/"):
+                self.read_text(name)
+            for name in self.names("figure/"):
+                self.read_json(name)
+            self.artifacts()
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            if isinstance(e, BundleError):
+                raise
+            raise BundleError(f"damaged entry: {e}")
+        entries = self.header["entries"]
+        if fingerprint(*(f"{name}={entries[name]['sha256']}" for name in sorted(entries))) != self.bundle_id:
+            raise BundleError("bundle id does not match its entries")
+
+
+def build_bundle(store, report_id: str, company_name: str, analyses: Dict[str, str],
+                 research: Optional[Dict[str, str]] = None, figures: Optional[Dict[str, str]] = None,
+                 source: str = "app") -> bytes:
+    """
+    Bundle a report from the report store with its analyses (section key -> text),
+    research (section key -> text) and figures (name -> Plotly JSON)
+    `source` records what produced it ("app" or "warmup")
+    """
+    entries = {"text": store.get_text(report_id).encode("utf-8")}
+    for section_key, analysis in analyses.items():
+        entries[f"analysis/{section_key}"] = analysis.encode("utf-8")
+    for section_key, text in (research or {}).items():
+        if text:
+            entries[f"research/{section_key}"] = text.encode("utf-8")
+    for name in BUNDLED_ARTIFACTS:
+        value = store.get_artifact(report_id, name)
+        if value:
+            entries[f"artifact/{name}.json"] = json.dumps(encode_artifact(name, value)).encode("utf-8")
+    for name, figure_json in (figures or {}).items():
+        entries[f"figure/{name}.json"] = figure_json.encode("utf-8")
+    meta = {"report_id": report_id, "company_name": company_name, "created": time.time(), "source": source}
+    return pack_bundle(meta, entries)
+
+
+class BundleLibrary:
+    """
+    A directory of bundles, named by company and content address
+    Listing reads only the headers of new or changed files, so a warm library lists in milliseconds
+    """
+
+    def __init__(self, root: str = DEFAULT_LIBRARY_DIR):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        # path -> (mtime_ns, size, bundle)
+        self._headers: Dict[str, tuple] = {}
+        # report id -> newest bundle, rebuilt when the directory changes (e.g. a warm-up run adds bundles)
+        self._by_report: Optional[Dict[str, AnalysisBundle]] = None
+        self._indexed_mtime = None
+
+    def save(self, data: bytes, verify: bool = False) -> AnalysisBundle:
+        """
+        Add bundle bytes to the library (a bundle already there is not written again)
+        With `verify`, every entry is checked first and a bad bundle never reaches the library
+        """
+        import io
+        header, _ = read_header(io.BytesIO(data))
+        bundle_id = header.get("bundle_id")
+        if not isinstance(bundle_id, str) or not re.fullmatch(r"[0-9a-f]{16,}", bundle_id):
+            raise BundleError("invalid bundle id")
+        slug = re.sub(r"\s+", "-", company_key(str(header.get("company_name") or "report")))[:40] or "report"
+        path = os.path.join(self.root, f"{slug}-{bundle_id[:16]}{BUNDLE_SUFFIX}")
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            try:
+                if verify:
+                    AnalysisBundle(tmp_path).verify()
+            except BundleError:
+                os.remove(tmp_path)
+                raise
+            os.replace(tmp_path, path)
+            METRICS.increment("library.saved")
+        bundle = AnalysisBundle(path)
+        with self._lock:
+            if self._by_report is not None:
+                self._index(bundle)
+                self._indexed_mtime = os.stat(self.root).st_mtime_ns
+        return bundle
+
+    def import_file(self, stream) -> AnalysisBundle:
+        """Add an uploaded bundle file to the library, after checking all of it"""
+        if hasattr(stream, "seek"):
+            stream.seek(0)
+        return self.save(stream.read(), verify=True)
+
+    def discard(self, bundle: AnalysisBundle):
+        """Remove a bundle from the library (e.g. one superseded by a newer bundle of the report)"""
+        try:
+            os.remove(bundle.path)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._headers.pop(bundle.path, None)
+            if self._by_report is not None and self._by_report.get(bundle.report_id) is bundle:
+                # The next lookup rebuilds the index from what's left
+                self._by_report = None
+
+    def bundles(self) -> List[AnalysisBundle]:
+        """Bundles in the library, newest first"""
+        start = time.perf_counter()
+        with self._lock:
+            seen = {}
+            for entry in os.scandir(self.root):
+                if not entry.name.endswith(BUNDLE_SUFFIX):
+                    continue
+                stat = entry.stat()
+                cached = self._headers.get(entry.path)
+                if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+                    seen[entry.path] = cached
+                    continue
+                try:
+                    seen[entry.path] = (stat.st_mtime_ns, stat.st_size, AnalysisBundle(entry.path))
+                except (BundleError, OSError) as e:
+                    print(f"Skipping bundle {entry.name}: {e}")
+            self._headers = seen
+            bundles = [bundle for _, _, bundle in seen.values()]
+        METRICS.observe("library.scan_ms", (time.perf_counter() - start) * 1000)
+        return sorted(bundles, key=lambda b: b.created, reverse=True)
+
+    def get(self, bundle_id: str) -> Optional[AnalysisBundle]:
+        return next((b for b in self.bundles() if b.bundle_id == bundle_id), None)
+
+    def find_report(self, report_id: str) -> Optional[AnalysisBundle]:
+        """Newest bundle of a report, if the library has one"""
+        try:
+            mtime = os.stat(self.root).st_mtime_ns
+        except OSError:
+            mtime = None
+        with self._lock:
+            index = self._by_report if mtime == self._indexed_mtime else None
+        if index is None:
+            bundles = self.bundles()
+            with self._lock:
+                self._by_report = {}
+                for bundle in reversed(bundles):
+                    self._index(bundle)
+                self._indexed_mtime = mtime
+                index = self._by_report
+        return index.get(report_id)
+
+    def _index(self, bundle: AnalysisBundle):
+        current = self._by_report.get(bundle.report_id)
+        if current is None or bundle.created >= current.created:
+            self._by_report[bundle.report_id] = bundle
+
+
+_library: Optional[BundleLibrary] = None
+_library_lock = threading.Lock()
+
+
+def get_bundle_library() -> BundleLibrary:
+    """Process-wide bundle library"""
+    global _library
+    if _library is None:
+        with _library_lock:
+            if _library is None:
+                _library = BundleLibrary()
+    return _library
@@ -1,11 +1,24 @@
-import streamlit as st
 import os
-from pathlib import Path
-import PyPDF2
-import io
-from visualizations import create_sample_sankey, display_sankey_with_data
-from llm_providers import get_available_providers, create_provider, get_api_key_from_env
-from web_research import WebResearchEnhancer, extract_company_name_from_report
+import time
+import uuid
+from concurrent.futures import TimeoutError as FutureTimeout
+import streamlit as st
+from report_store import get_default_store
+from generation_policy import estimate_tokens, get_output_lengths
+from metrics import METRICS
+from cancellation import CancelledError, RERUN, REUPLOAD, get_cancellations
+from llm_providers import get_available_providers, create_provider, get_api_key_from_env, get_shared_completion, is_failed_answer
+from web_research import WebResearchEnhancer, identify_report_company
+from incremental_analysis import plan_incremental_update, build_patch_prompt
+from pdf_workers import PdfParseError
+from single_flight import fingerprint
+from similarity_cache import get_similarity_cache
+from upload_spool import get_upload_spool
+from report_ingest import HTML_EXTENSIONS, ingest_report
+from token_budget import BudgetExceeded, MAX_QUEUE_SECONDS, RESEARCH_TOKENS, get_token_governor
+from section_prompts import SECTION_PROMPTS, section_prompt
+from watchlist_warmup import get_usage_log
+from analysis_bundle import BUNDLE_SUFFIX, AnalysisBundle, BundleError, build_bundle, get_bundle_library
 
 # Page configuration
 st.set_page_config(
@@ -18,10 +31,11 @@ st.set_page_config(
 # Initialize session state
 if 'analysis_complete' not in st.session_state:
     st.session_state.analysis_complete = False
-if 'report_text' not in st.session_state:
-    st.session_state.report_text = None
-if 'analyses' not in st.session_state:
-    st.session_state.analyses = {}
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if 'report_id' not in st.session_state:
+    # Handle into the shared report store; the text and analyses live out of session
+    st.session_state.report_id = None
 if 'selected_provider' not in st.session_state:
     st.session_state.selected_provider = "Groq (FREE - Llama 3.3)"
 if 'llm_provider' not in st.session_state:
@@ -32,146 +46,468 @@ if 'web_researcher' not in st.session_state:
     st.session_state.web_researcher = None
 if 'use_web_research' not in st.session_state:
     st.session_state.use_web_research = True
+if 'previous_report_id' not in st.session_state:
+    # Last year's filing for the same company, when one has been analyzed before
+    st.session_state.previous_report_id = None
+if 'incremental_plan' not in st.session_state:
+    st.session_state.incremental_plan = None
+if 'use_incremental' not in st.session_state:
+    st.session_state.use_incremental = True
+if 'use_digest' not in st.session_state:
+    st.session_state.use_digest = True
+if 'similar_analyses' not in st.session_state:
+    # (report_id, section) -> how the near-identical input that supplied its analysis compared
+    st.session_state.similar_analyses = {}
+if 'saved_bundle' not in st.session_state:
+    # Path of the library bundle saved from this session's report, offered for download
+    st.session_state.saved_bundle = None
+
+# Keep this session's report resident (and re-acquire it if it was evicted while idle)
+get_default_store().touch(st.session_state.session_id, st.session_state.report_id)
+
+# How often a waiting analysis checks whether the user has moved on
+ANALYSIS_POLL_SECONDS = 0.25
+
+SECTIONS = [
+    "Overview",
+    "1. Quick Stats",
+    "2. Business Overview",
+    "3. Business Model Map",
+    "4. The Machine",
+    "5. Ecosystem",
+    "6. Industry Deep Dive",
+    "7. Risk Analysis",
+    "8. Hamilton Helmer 7 Powers",
+    "9. Bull & Bear Cases"
+]
+
+# Section keys in SECTIONS order (what analyses are stored and bundled under)
+SECTION_KEYS = list(SECTION_PROMPTS)
 
 def extract_text_from_pdf(pdf_file):
-    """Extract text from uploaded PDF file"""
-    pdf_reader = PyPDF2.PdfReader(pdf_file)
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text()
-    return text
+    """Extract text from uploaded PDF file (spooled to disk, parsed in the sandboxed PDF workers)"""
+    import tempfile
+    from pdf_workers import parse_pdf
+    from upload_spool import copy_hashed
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as f:
+        copy_hashed(pdf_file, f)
+        f.flush()
+        return parse_pdf(f.name).text
+
+def get_report_text():
+    """Text of this session's report, fetched from the shared report store"""
+    if not st.session_state.report_id:
+        return None
+    store = get_default_store()
+    if not store.has_text(st.session_state.report_id):
+        # Opened from a bundle on a replica that never saw the report
+        bundle = get_bundle_library().find_report(st.session_state.report_id)
+        if bundle is not None:
+            store.put_text(bundle.read_text("text"))
+    return store.get_text(st.session_state.report_id)
+
+@st.cache_resource(show_spinner=False)
+def get_provider_catalog() -> dict:
+    """Provider catalog, built once per process instead of on every rerun"""
+    return get_available_providers()
+
+@st.cache_resource(show_spinner=False)
+def connect_provider(provider_name: str, api_key: str):
+    """
+    Create a provider once per (provider, key) and share it across reruns and sessions
+    Raises ConnectionError so failed connections are not cached
+    """
+    provider = create_provider(provider_name, api_key)
+    if not provider or not provider.available:
+        raise ConnectionError(f"Could not connect to {provider_name}")
+    return provider
+
+# Where sessions over their token budget are sent when a local model is running
+LOCAL_FALLBACK_PROVIDER = "Ollama (FREE - Local)"
+
+@st.cache_resource(ttl=60, show_spinner=False)
+def get_local_fallback():
+    """Local provider for over-budget requests, or None if Ollama isn't running (rechecked every minute)"""
+    from llm_providers import OllamaProvider
+    if not OllamaProvider.is_running():
+        return None
+    try:
+        return connect_provider(LOCAL_FALLBACK_PROVIDER, None)
+    except ConnectionError:
+        return None
+
+@st.cache_resource(show_spinner=False)
+def get_web_researcher(company_name: str) -> WebResearchEnhancer:
+    """One research enhancer (and search cache) per company, shared across sessions"""
+    return WebResearchEnhancer(company_name)
+
+@st.cache_data(show_spinner=False)
+def get_sample_sankey_figure():
+    """Sample Sankey figure, built once instead of on every visit to the section"""
+    # Deferred: plotly is only loaded once a chart is actually rendered
+    from visualizations import create_sample_sankey
+    return create_sample_sankey()
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def get_statements(report_id: str) -> dict:
+    """Financial statements extracted at upload (empty if none were found)"""
+    return get_default_store().get_artifact(report_id, "statements", {}) if report_id else {}
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def get_business_model(report_id: str, analysis: str):
+    """
+    Structured business model, memoized per report
+    Computed deterministically from the extracted income statement when available,
+    otherwise parsed from the analysis
+    """
+    from statement_extraction import business_model_from_statements
+    model = business_model_from_statements(get_statements(report_id))
+    if model is not None:
+        return model
+    from financial_extraction import parse_business_model
+    return parse_business_model(analysis)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def get_business_model_figure(report_id: str, analysis: str):
+    """Sankey figure for this report's business model, so switching tabs doesn't rebuild it"""
+    model = get_business_model(report_id, analysis)
+    if model is None:
+        return None
+    from visualizations import create_sankey_diagram
+    profits = model.profits()
+    return create_sankey_diagram(
+        model.revenues(),
+        model.costs(),
+        gross_profit=profits["gross_profit"],
+        operating_profit=profits["operating_profit"],
+        net_income=profits["net_income"]
+    )
 
 def main():
     st.title("📊 Stock Fundamentals Analyzer")
     st.markdown("### Upload an annual report to get comprehensive fundamental analysis")
 
-    # Sidebar for navigation
+    # Sidebar: provider panel reruns on its own, upload triggers a full rerun
     with st.sidebar:
-        st.header("🤖 AI Provider")
+        provider_panel()
 
-        # LLM Provider Selection
-        providers = get_available_providers()
-        provider_names = list(providers.keys())
+        st.divider()
 
-        selected_provider = st.selectbox(
-            "Choose AI Provider:",
-            provider_names,
-            index=provider_names.index(st.session_state.selected_provider) if st.session_state.selected_provider in provider_names else 0,
-            help="Select which AI service to use for analysis"
-        )
+        upload_panel()
 
-        # Display provider info
-        provider_info = providers[selected_provider]
-        st.info(f"💡 {provider_info['description']}\n\n**Cost:** {provider_info['cost']}")
+        library_panel()
 
-        # API Key input if required
-        api_key = None
-        if provider_info["requires_key"]:
-            key_name = provider_info["key_name"]
-            # Check if key exists in environment
-            env_key = get_api_key_from_env(key_name)
+        if not st.session_state.analysis_complete:
+            st.divider()
+            st.info("Upload an annual report to begin analysis")
 
-            if env_key:
-                st.success(f"✓ {key_name} found in environment")
-                api_key = env_key
-            else:
-                st.warning(f"⚠️ {key_name} not found")
-                api_key = st.text_input(
-                    f"Enter {key_name}:",
-                    type="password",
-                    help=f"Get your free API key at: {provider_info['signup_url']}"
-                )
-                if not api_key:
-                    st.markdown(f"[Get free API key →]({provider_info['signup_url']})")
-
-        # Initialize provider
-        if st.button("🔌 Connect Provider"):
-            provider = create_provider(selected_provider, api_key)
-            if provider and provider.available:
-                st.session_state.llm_provider = provider
-                st.session_state.selected_provider = selected_provider
-                st.success(f"✓ Connected to {provider.provider_name}")
-            else:
-                st.error("Failed to connect to provider. Check your API key or installation.")
+        metrics_panel()
 
-        # Show current provider status
-        if st.session_state.llm_provider:
-            st.success(f"🟢 Active: {st.session_state.llm_provider.provider_name}")
+    # Main content area
+    if not st.session_state.analysis_complete:
+        display_welcome()
+    else:
+        analysis_workspace()
+
+@st.fragment
+def provider_panel():
+    """AI provider selection and connection (reruns independently of the rest of the app)"""
+    st.header("🤖 AI Provider")
+
+    # LLM Provider Selection
+    providers = get_provider_catalog()
+    provider_names = list(providers.keys())
+
+    selected_provider = st.selectbox(
+        "Choose AI Provider:",
+        provider_names,
+        index=provider_names.index(st.session_state.selected_provider) if st.session_state.selected_provider in provider_names else 0,
+        help="Select which AI service to use for analysis"
+    )
+
+    # Display provider info
+    provider_info = providers[selected_provider]
+    st.info(f"💡 {provider_info['description']}\n\n**Cost:** {provider_info['cost']}")
+
+    # API Key input if required
+    api_key = None
+    if provider_info["requires_key"]:
+        key_name = provider_info["key_name"]
+        # Check if key exists in environment
+        env_key = get_api_key_from_env(key_name)
+
+        if env_key:
+            st.success(f"✓ {key_name} found in environment")
+            api_key = env_key
         else:
-            st.warning("🔴 No provider connected")
-
-        st.divider()
-
-        st.header("📄 Upload Report")
-
-        # File upload
-        uploaded_file = st.file_uploader(
-            "Upload Annual Report (PDF)",
-            type=['pdf'],
-            help="Upload the company's latest annual report (10-K, annual report, etc.)"
-        )
+            st.warning(f"⚠️ {key_name} not found")
+            api_key = st.text_input(
+                f"Enter {key_name}:",
+                type="password",
+                help=f"Get your free API key at: {provider_info['signup_url']}"
+            )
+            if not api_key:
+                st.markdown(f"[Get free API key →]({provider_info['signup_url']})")
 
-        if uploaded_file is not None:
-            if st.button("🔍 Analyze Report", type="primary"):
-                if not st.session_state.llm_provider:
-                    st.error("⚠️ Please connect to an AI provider first!")
-                else:
-                    with st.spinner("Extracting text from PDF..."):
-                        st.session_state.report_text = extract_text_from_pdf(uploaded_file)
-
-                    with st.spinner("Identifying company..."):
-                        # Extract company name for web research
-                        company_name = extract_company_name_from_report(
-                            st.session_state.report_text,
-                            st.session_state.llm_provider
+    # Initialize provider
+    if st.button("🔌 Connect Provider"):
+        try:
+            provider = connect_provider(selected_provider, api_key)
+            st.session_state.llm_provider = provider
+            st.session_state.selected_provider = selected_provider
+            st.success(f"✓ Connected to {provider.provider_name}")
+        except ConnectionError:
+            st.error("Failed to connect to provider. Check your API key or installation.")
+
+    # Show current provider status
+    if st.session_state.llm_provider:
+        st.success(f"🟢 Active: {st.session_state.llm_provider.provider_name}")
+    else:
+        st.warning("🔴 No provider connected")
+
+def metrics_panel():
+    """Process-wide performance metrics (provider timings, counters)"""
+    snapshot = METRICS.snapshot()
+    if not snapshot["counters"] and not snapshot["timings"]:
+        return
+    with st.expander("📈 Performance"):
+        for name, timing in sorted(snapshot["timings"].items()):
+            unit = "" if name.endswith("per_second") else " ms"
+            st.caption(f"{name}: last {timing['last']:,.0f}{unit}, mean {timing['mean']:,.0f}{unit} (n={timing['count']})")
+        for name, count in sorted(snapshot["counters"].items()):
+            st.caption(f"{name}: {count:,}")
+
+def upload_panel():
+    """Report upload and ingestion"""
+    st.header("📄 Upload Report")
+
+    # File upload
+    uploaded_file = st.file_uploader(
+        "Upload Annual Report (PDF or inline XBRL/HTML)",
+        type=['pdf', *HTML_EXTENSIONS],
+        help="Upload the company's latest annual report (10-K PDF, or the EDGAR .htm filing)"
+    )
+
+    if uploaded_file is not None:
+        if st.button("🔍 Analyze Report", type="primary"):
+            if not st.session_state.llm_provider:
+                st.error("⚠️ Please connect to an AI provider first!")
+            else:
+                store = get_default_store()
+                # Work still running for the previous report is no longer wanted
+                get_cancellations().cancel_session(st.session_state.session_id, REUPLOAD)
+                with st.spinner("Extracting text from report..."):
+                    # Streamed to disk and hashed in chunks; no in-memory copy of the file
+                    upload = get_upload_spool().spool(st.session_state.session_id, uploaded_file, uploaded_file.name)
+                    try:
+                        report_id = ingest_report(upload)
+                    except PdfParseError as e:
+                        get_upload_spool().release(st.session_state.session_id)
+                        st.error(f"❌ Could not read this PDF: {e}")
+                        st.stop()
+                    report_text = store.get_text(report_id)
+                    store.acquire(st.session_state.session_id, report_id)
+                    store.clear_analyses(st.session_state.session_id)
+                    st.session_state.report_id = report_id
+                    st.session_state.saved_bundle = None
+
+                with st.spinner("Identifying company..."):
+                    # Cover page, metadata and tagged names first; the LLM only if those are weak
+                    cover = store.get_artifact(report_id, "cover", {})
+                    guess = identify_report_company(
+                        report_text,
+                        st.session_state.llm_provider,
+                        metadata=store.get_artifact(report_id, "metadata", {}),
+                        tagged_name=cover.get("dei:entityregistrantname")
+                    )
+                    company_name = guess.name or "Unknown Company"
+                    st.session_state.company_name = company_name
+                    # Searching for an unidentified company would only return noise
+                    st.session_state.web_researcher = get_web_researcher(company_name) if guess.name else None
+
+                # Align with last year's filing for this company, if we have one
+                previous_report_id = store.previous_filing(company_name, report_id) if guess.name else None
+                st.session_state.previous_report_id = previous_report_id
+                st.session_state.incremental_plan = None
+                if previous_report_id:
+                    with st.spinner("Comparing with the previous filing..."):
+                        st.session_state.incremental_plan = plan_incremental_update(
+                            store.get_text(previous_report_id),
+                            report_text
                         )
-                        st.session_state.company_name = company_name
-                        st.session_state.web_researcher = WebResearchEnhancer(company_name)
-
-                    st.session_state.analysis_complete = True
-                    st.success(f"✓ Report uploaded: {st.session_state.company_name}")
-
-        st.divider()
-
-        # Web research toggle
-        if st.session_state.analysis_complete:
-            st.session_state.use_web_research = st.checkbox(
-                "🌐 Include Web Research",
-                value=st.session_state.use_web_research,
-                help="Supplement analysis with online research about the company, industry, and competitors"
-            )
+                if guess.name:
+                    store.register_filing(company_name, report_id)
+                    # Watchlist warm-up does the most-opened companies first
+                    get_usage_log().record(company_name)
+                if st.session_state.use_digest:
+                    start_report_digest(report_id, report_text)
+
+                st.session_state.analysis_complete = True
+                st.success(f"✓ Report uploaded: {st.session_state.company_name}")
+                cleanup = store.get_artifact(report_id, "cleanup")
+                if cleanup:
+                    st.caption(f"🧹 Report text: {cleanup['summary']}")
+                skipped = store.get_artifact(report_id, "skipped_pages")
+                if skipped:
+                    st.warning(f"⚠️ Skipped {len(skipped)} unreadable page(s): " + "; ".join(
+                        f"page {page} ({reason})" for page, reason in sorted(skipped.items())
+                    ))
+                if not guess.confident:
+                    st.warning("⚠️ Could not identify the company with confidence; web research is limited")
+
+def library_panel():
+    """Saved analyses: open one without any extraction, provider or search calls, or import a bundle file"""
+    library = get_bundle_library()
+    bundles = library.bundles()
+    with st.expander(f"📚 Library ({len(bundles)})"):
+        if bundles:
+            labels = {
+                b.bundle_id: f"{b.company_name} · {time.strftime('%Y-%m-%d', time.localtime(b.created))} · "
+                             f"{len(b.sections())}/{len(SECTION_KEYS)} sections"
+                for b in bundles
+            }
+            choice = st.selectbox("Saved analyses", list(labels), format_func=labels.get)
+            if st.button("📂 Open"):
+                open_bundle(library.get(choice))
+
+        imported = st.file_uploader(
+            "Import a bundle",
+            type=[BUNDLE_SUFFIX.lstrip('.')],
+            key="bundle_upload",
+            help="An analysis bundle saved by this app, e.g. shared by a colleague"
+        )
+        if imported is not None and st.button("📥 Import and Open"):
+            try:
+                bundle = library.import_file(imported)
+            except BundleError as e:
+                st.error(f"❌ Not a usable analysis bundle: {e}")
+            else:
+                open_bundle(bundle)
+
+def open_bundle(bundle: AnalysisBundle):
+    """
+    Point this session at a bundled report
+    Statements and research are restored now; text and sections are read from the bundle when needed
+    """
+    try:
+        artifacts = bundle.artifacts()
+        research = bundle.research()
+    except (BundleError, KeyError, ValueError) as e:
+        st.error(f"❌ Could not open this saved analysis: {e}")
+        return
+    store = get_default_store()
+    session_id = st.session_state.session_id
+    get_cancellations().cancel_session(session_id, REUPLOAD)
+    report_id = bundle.report_id
+    for name, value in artifacts.items():
+        if store.get_artifact(report_id, name) is None:
+            store.put_artifact(report_id, name, value)
+    store.acquire(session_id, report_id)
+    store.clear_analyses(session_id)
+
+    researcher = get_web_researcher(bundle.company_name) if research else None
+    if researcher is not None:
+        for section_key, text in research.items():
+            researcher.cache.setdefault(section_key, text)
+
+    st.session_state.report_id = report_id
+    st.session_state.company_name = bundle.company_name
+    st.session_state.web_researcher = researcher
+    st.session_state.previous_report_id = None
+    st.session_state.incremental_plan = None
+    st.session_state.saved_bundle = bundle.path
+    st.session_state.analysis_complete = True
+    METRICS.increment("library.opened")
+    get_usage_log().record(bundle.company_name)
+    st.success(f"✓ Opened saved analysis: {bundle.company_name} "
+               f"({len(bundle.sections())}/{len(SECTION_KEYS)} sections)")
+
+def save_bundle() -> AnalysisBundle:
+    """Bundle this session's report and finished sections into the library"""
+    store = get_default_store()
+    report_id = st.session_state.report_id
+    analyses = {}
+    for section_key in SECTION_KEYS:
+        analysis = (store.get_analysis(st.session_state.session_id, section_key)
+                    or store.get_archived_analysis(report_id, section_key))
+        if not is_failed_answer(analysis):
+            analyses[section_key] = analysis
+    researcher = st.session_state.web_researcher
+    figures = {}
+    if "business_model_map" in analyses:
+        fig = get_business_model_figure(report_id, analyses["business_model_map"])
+        if fig is not None:
+            figures["business_model"] = fig.to_json()
+    get_report_text()
+    data = build_bundle(store, report_id, st.session_state.company_name, analyses,
+                        research=dict(researcher.cache) if researcher else None, figures=figures)
+    return get_bundle_library().save(data)
+
+@st.fragment
+def analysis_workspace():
+    """
+    Section navigation and the section pane
+    Runs as a fragment so switching sections or toggling web research only reruns this pane
+    """
+    nav_col, pane_col = st.columns([1, 4])
+
+    with nav_col:
+        st.session_state.use_web_research = st.checkbox(
+            "🌐 Include Web Research",
+            value=st.session_state.use_web_research,
+            help="Supplement analysis with online research about the company, industry, and competitors"
+        )
 
-        st.divider()
+        st.session_state.use_digest = st.checkbox(
+            "📑 Analyze From Report Digest",
+            value=st.session_state.use_digest,
+            help="Summarize the report once and give each section the summary plus the relevant passages, "
+                 "instead of the full report text"
+        )
 
-        # Navigation menu
-        if st.session_state.analysis_complete:
-            st.subheader("Analysis Sections")
-            section = st.radio(
-                "Choose section:",
-                [
-                    "Overview",
-                    "1. Quick Stats",
-                    "2. Business Overview",
-                    "3. Business Model Map",
-                    "4. The Machine",
-                    "5. Ecosystem",
-                    "6. Industry Deep Dive",
-                    "7. Risk Analysis",
-                    "8. Hamilton Helmer 7 Powers",
-                    "9. Bull & Bear Cases"
-                ],
-                label_visibility="collapsed"
+        if st.session_state.incremental_plan:
+            st.session_state.use_incremental = st.checkbox(
+                "♻️ Reuse Last Year's Analysis",
+                value=st.session_state.use_incremental,
+                help="Reuse or patch last year's analysis for sections whose source text barely changed"
             )
-        else:
-            st.info("Upload an annual report to begin analysis")
-            section = "Overview"
 
-    # Main content area
-    if not st.session_state.analysis_complete:
-        display_welcome()
-    else:
+        st.subheader("Analysis Sections")
+        section = st.radio(
+            "Choose section:",
+            SECTIONS,
+            key="section",
+            label_visibility="collapsed"
+        )
+        savings_slot = st.empty()
+        budget_slot = st.empty()
+
+        if st.button("📦 Save to Library", help="Save this report and its finished sections as a bundle "
+                                                  "that opens instantly and can be shared"):
+            st.session_state.saved_bundle = save_bundle().path
+        if st.session_state.saved_bundle and os.path.exists(st.session_state.saved_bundle):
+            with open(st.session_state.saved_bundle, "rb") as f:
+                st.download_button("⬇️ Download Bundle", f.read(),
+                                   file_name=os.path.basename(st.session_state.saved_bundle),
+                                   mime="application/octet-stream")
+
+    with pane_col:
         display_section(section)
 
+    # Filled in after the section ran, so it includes this run's call
+    savings = get_output_lengths().savings()
+    if savings["calls"]:
+        savings_slot.caption(
+            f"✂️ Output budget: {savings['reserved_tokens']:,} tokens reserved over {savings['calls']} calls, "
+            f"{savings['saved_tokens']:,} ({savings['saved_share']:.0%}) fewer than fixed limits"
+        )
+    if st.session_state.llm_provider:
+        budgets = get_token_governor().status(st.session_state.llm_provider, st.session_state.session_id)
+        if budgets:
+            budget_slot.caption("🎟️ Token budget: " + " · ".join(
+                f"{b['scope']} {b['used']:,}/{b['limit']:,} {b['window']}" for b in budgets
+            ))
+
 def display_welcome():
     """Display welcome screen with instructions"""
     st.markdown("""
@@ -224,6 +560,22 @@ def display_section(section):
         else:
             st.info("📄 **Annual Report Only** - Analysis based solely on the uploaded annual report.")
 
+        if st.session_state.use_web_research and st.session_state.web_researcher:
+            plan = st.session_state.web_researcher.plan.summary()
+            st.caption(f"🔎 Web research: {plan['planned']} searches cover all sections instead of "
+                       f"{plan['requested']} ({plan['saved_share']:.0%} fewer requests to the search engine)")
+
+        # Year-over-year comparison with the previous filing
+        if st.session_state.incremental_plan:
+            plan = st.session_state.incremental_plan
+            counts = {action: sum(1 for d in plan.values() if d.action == action)
+                      for action in ("reuse", "patch", "regenerate")}
+            st.info(f"♻️ **Previous filing found** - {counts['reuse']} sections can be reused, "
+                    f"{counts['patch']} patched and {counts['regenerate']} regenerated from scratch.")
+            with st.expander("What changed since last year"):
+                for section_key, delta in plan.items():
+                    st.markdown(f"**{section_key}** ({delta.action}): {delta.summary()}")
+
         st.markdown("""
         Use the sidebar to navigate through different sections of the fundamental analysis.
 
@@ -261,75 +613,308 @@ def display_section(section):
     elif section == "9. Bull & Bear Cases":
         display_bull_bear_cases()
 
-def get_analysis(section_key, prompt):
-    """Get analysis using the configured LLM provider for a specific section"""
+def get_incremental_delta(section_key):
+    """Year-over-year delta for a section when incremental re-analysis is active"""
+    plan = st.session_state.incremental_plan
+    if not plan or not st.session_state.use_incremental:
+        return None
+    return plan.get(section_key)
+
+def digest_key_figures(report_id: str) -> str:
+    """Headline statement figures carried verbatim into the report digest"""
+    from report_digest import format_key_figures
+    from statement_extraction import key_metrics
+    return format_key_figures(key_metrics(get_statements(report_id)))
+
+def start_report_digest(report_id: str, report_text: str):
+    """
+    Build the report digest in the background while the user reads the overview
+    Sections that need it before it is done attach to the same build
+    """
+    from report_digest import worth_digesting, get_report_digest
+    if not worth_digesting(report_text):
+        return
+    cancellations = get_cancellations()
+    token = cancellations.begin(st.session_state.session_id, report_id, "digest")
+    cancellations.submit(token, get_report_digest, st.session_state.llm_provider, get_default_store(),
+                         report_id, report_text, digest_key_figures(report_id))
+
+def plan_token_budget(provider, prompt: str, report_text: str, policy, web_research: bool):
+    """
+    Decide how a request fits the token budgets, telling the user about any degradation
+    Returns the provider to use and its BudgetDecision, or (None, decision) when the request is refused
+    """
+    governor = get_token_governor()
+    session_id = st.session_state.session_id
+
+    def plan(candidate):
+        return governor.plan(candidate, session_id, estimate_tokens(prompt),
+                             estimate_tokens(report_text[:candidate.max_context_chars]), policy.max_tokens,
+                             RESEARCH_TOKENS if web_research else 0)
+
+    decision = plan(provider)
+    if decision.action == "run":
+        if decision.degraded:
+            METRICS.increment("budget.degraded")
+            st.info(f"🪫 Token budget low ({decision.share_left:.0%} of {decision.tightest} left): "
+                    f"{', '.join(decision.notes())}")
+        return provider, decision
+
+    if decision.wait_seconds <= MAX_QUEUE_SECONDS:
+        METRICS.increment("budget.queued")
+        st.info(f"⏳ Token budget full ({decision.tightest}); this section is queued for about "
+                f"{max(1, round(decision.wait_seconds))}s")
+        return provider, decision
+
+    local = get_local_fallback()
+    if local is not None:
+        METRICS.increment("budget.routed_local")
+        st.info(f"🏠 Token budget used up ({decision.tightest}); analyzing with {local.provider_name} instead")
+        return local, plan(local)
+
+    METRICS.increment("budget.refused")
+    frees_in = "later" if decision.wait_seconds == float("inf") else f"in about {decision.wait_seconds / 60:.0f} min"
+    st.error(f"🪫 Token budget used up ({decision.tightest}); it frees up {frees_in}. "
+             f"Connect Ollama in the sidebar to keep analyzing locally.")
+    return None, decision
+
+def get_analysis(section_key, prompt, policy=None):
+    """
+    Get analysis using the configured LLM provider for a specific section
+    `policy` overrides the section's generation policy (output budget, temperature, stop sequences)
+    """
+    store = get_default_store()
+    delta = get_incremental_delta(section_key)
+    if delta:
+        st.caption(f"♻️ Compared with last year's filing: {delta.summary()}")
+
     # Return cached analysis if available
-    if section_key in st.session_state.analyses:
-        return st.session_state.analyses[section_key]
+    cached = store.get_analysis(st.session_state.session_id, section_key)
+    if cached is not None:
+        show_similar_reuse(section_key)
+        return cached
+
+    # Reports in the library: sections are read from the bundle, one at a time
+    bundle = get_bundle_library().find_report(st.session_state.report_id)
+    try:
+        bundled = bundle.analysis(section_key) if bundle is not None else None
+    except BundleError as e:
+        print(f"Ignoring bundled {section_key}: {e}")
+        bundled = None
+    if bundled is not None:
+        store.set_analysis(st.session_state.session_id, section_key, bundled)
+        st.caption("📦 From the saved analysis in the library")
+        return bundled
+
+    # Reuse last year's analysis when the underlying text is essentially unchanged
+    previous_analysis = None
+    if delta:
+        previous_analysis = store.get_archived_analysis(st.session_state.previous_report_id, section_key)
+        # Archives from before failures were filtered out may still hold one
+        if is_failed_answer(previous_analysis):
+            previous_analysis = None
+    if previous_analysis and delta.action == "reuse":
+        store.set_analysis(st.session_state.session_id, section_key, previous_analysis)
+        store.archive_analysis(st.session_state.report_id, section_key, previous_analysis)
+        return previous_analysis
 
     # Check if provider is configured
     if not st.session_state.llm_provider:
         st.error("⚠️ No AI provider connected. Please select and connect a provider in the sidebar.")
         return "AI provider not configured. Please connect to an AI provider in the sidebar to continue."
 
-    # Enhance prompt with web research if enabled
-    enhanced_prompt = prompt
-    if st.session_state.use_web_research and st.session_state.web_researcher:
-        with st.spinner(f"Gathering web research for {section_key}..."):
-            enhanced_prompt = st.session_state.web_researcher.enhance_prompt(prompt, section_key)
+    session_id = st.session_state.session_id
+    report_id = st.session_state.report_id
+    researcher = st.session_state.web_researcher if st.session_state.use_web_research else None
+    output_lengths = get_output_lengths()
+    policy = policy or output_lengths.policy_for(section_key)
+    report_text = get_report_text()
+    key_figures = digest_key_figures(report_id) if st.session_state.use_digest else None
+
+    # Metered providers: degrade, queue or reroute the request to stay within the token budgets
+    provider, budget = plan_token_budget(st.session_state.llm_provider, prompt, report_text, policy,
+                                         researcher is not None)
+    if provider is None:
+        return "Analysis postponed: the token budget is used up."
+    if not budget.web_research:
+        researcher = None
+    governor = get_token_governor()
+    similarity_cache = get_similarity_cache()
+    # Requests that differ only in report text or research can share an analysis; patches cannot
+    similar_scope = None
+    if similarity_cache.enabled and not (previous_analysis and delta.action == "patch"):
+        similar_scope = fingerprint(provider.provider_name, provider.model, section_key, fingerprint(prompt),
+                                    policy.key())
+    similar_match = []
 
     # Get analysis from provider
     spinner_text = f"Analyzing {section_key}"
-    if st.session_state.use_web_research:
+    if researcher:
         spinner_text += " (with web research)"
-    spinner_text += f" using {st.session_state.llm_provider.provider_name}..."
+    spinner_text += f" using {provider.provider_name}..."
+    if budget.action == "over":
+        spinner_text = f"Waiting for the token budget, then {spinner_text[0].lower()}{spinner_text[1:]}"
+
+    def run(token):
+        # Runs on the analysis pool; checkpoints in search and provider calls abort it once cancelled
+        reservation = governor.reserve(provider, session_id, budget.tokens)
+        try:
+            enhanced_prompt = prompt
+            research = ""
+            if researcher:
+                # Enhance prompt with web research if enabled
+                research = researcher.get_research_for_section(section_key)
+                enhanced_prompt = researcher.enhance_prompt(prompt, section_key)
+
+            # Moderately changed sections: patch last year's analysis using only the new passages
+            context = report_text
+            if previous_analysis and delta.action == "patch":
+                enhanced_prompt = build_patch_prompt(enhanced_prompt, previous_analysis, delta)
+                context = delta.changed_text()
+            elif key_figures is not None:
+                # Large reports: the shared digest plus the passages this section draws on
+                from report_digest import DigestUnavailable, worth_digesting, get_report_digest, digest_context
+                if worth_digesting(report_text):
+                    try:
+                        digest = get_report_digest(provider, store, report_id, report_text, key_figures)
+                        context = digest_context(digest, report_text, section_key)
+                    except DigestUnavailable as e:
+                        # The section is budgeted on the report itself, so it can go ahead without
+                        print(f"Report digest unavailable, sending the report: {e}")
+            if budget.context_share < 1.0:
+                context = context[:int(provider.max_context_chars * budget.context_share)]
+
+            # Near-identical report text and research: reuse that analysis instead of calling the provider
+            probe = None
+            if similar_scope:
+                probe = similarity_cache.fingerprint(context[:provider.max_context_chars], research)
+                match = similarity_cache.lookup(similar_scope, probe)
+                if match:
+                    similar_match.append(match)
+                    analysis = match.analysis
+            if not similar_match:
+                # Only answers the provider actually wrote say anything about output lengths
+                analysis = get_shared_completion(
+                    provider, prompt=enhanced_prompt, context=context, policy=policy, reservation=reservation,
+                    on_generated=lambda answer: output_lengths.record(section_key, answer, policy,
+                                                                      provider.default_max_tokens))
+        finally:
+            # Cancelled, failed or reused before the provider call: release the held tokens
+            reservation.settle(0)
+        if not similar_match and probe and not is_failed_answer(analysis):
+            similarity_cache.add(similar_scope, probe, analysis)
+        # An answer that arrives after the user moved on is still kept, unless the report was replaced.
+        # Failures are not: they'd be shown again this session and built on by next year's filing
+        if token.keep_completed() and not is_failed_answer(analysis):
+            # Cache the result, and archive it so next year's filing can build on it
+            store.set_analysis(session_id, section_key, analysis)
+            store.archive_analysis(report_id, section_key, analysis)
+        return analysis
+
+    cancellations = get_cancellations()
+    token = cancellations.begin(session_id, report_id, section_key)
+    future = cancellations.submit(token, run, token)
 
     with st.spinner(spinner_text):
         try:
-            analysis = st.session_state.llm_provider.get_completion(
-                prompt=enhanced_prompt,
-                context=st.session_state.report_text
-            )
-            # Cache the result
-            st.session_state.analyses[section_key] = analysis
+            analysis = wait_for_analysis(future, token)
+            if similar_match:
+                st.session_state.similar_analyses[(report_id, section_key)] = similar_match[0].describe()
+                show_similar_reuse(section_key)
             return analysis
+        except CancelledError:
+            st.warning("Analysis was cancelled because a new report was uploaded.")
+            return "Analysis cancelled."
+        except BudgetExceeded as e:
+            st.warning(f"🪫 {e}. Try this section again in a minute.")
+            return "Analysis postponed: the token budget is full."
         except Exception as e:
             error_msg = f"Error during analysis: {str(e)}"
             st.error(error_msg)
             return error_msg
 
+def show_similar_reuse(section_key):
+    """Mark an analysis that was reused from a near-identical earlier input"""
+    similarity = st.session_state.similar_analyses.get((st.session_state.report_id, section_key))
+    if similarity:
+        st.info(f"♻️ Reused the analysis of a near-identical earlier input ({similarity}); "
+                f"the AI provider was not called for this section.")
+
+def wait_for_analysis(future, token):
+    """
+    Wait for a background analysis
+    Polls with a Streamlit call, which is where a pending rerun (the user navigated away or
+    changed an input) interrupts this script run; the work is then cancelled
+    """
+    status = st.empty()
+    start = time.monotonic()
+    try:
+        while True:
+            try:
+                result = future.result(timeout=ANALYSIS_POLL_SECONDS)
+                break
+            except FutureTimeout:
+                status.caption(f"⏳ {time.monotonic() - start:.0f}s")
+    finally:
+        if not future.done():
+            token.cancel(RERUN)
+    status.empty()
+    return result
+
+CURRENCY_SYMBOLS = {"USD": "$", "EUR": "€", "GBP": "£", "JPY": "¥"}
+
+def format_figure(value: float, currency: str, per_share: bool = False) -> str:
+    """
+    A statement figure (in millions, or per share) in the report's currency, scaled to read well;
+    no symbol when the statements don't show a currency
+    """
+    symbol = CURRENCY_SYMBOLS.get(currency, f"{currency} " if currency else "")
+    if per_share:
+        return f"{symbol}{value:,.2f}"
+    if abs(value) >= 1000:
+        return f"{symbol}{value / 1000:,.1f}B"
+    if abs(value) >= 1:
+        return f"{symbol}{value:,.0f}M"
+    return f"{symbol}{value * 1000:,.0f}K"
+
 def display_quick_stats():
     st.header("1. Quick Stats")
 
-    prompt = """Analyze this annual report and provide a concise one-liner summary with:
-    - Sector and Industry classification
-    - Market capitalization (if mentioned)
-    - Stock ticker symbol
-
-    Format: "[Company Name] | [Sector] - [Industry] | Market Cap: $X.XB"
-
-    Keep it brief and factual."""
-
-    analysis = get_analysis("quick_stats", prompt)
+    analysis = get_analysis("quick_stats", section_prompt("quick_stats"))
 
     st.markdown("### Company Snapshot")
     st.info(analysis)
 
+    # Headline figures computed directly from the extracted financial statements
+    from statement_extraction import key_metrics, statements_currency
+    statements = get_statements(st.session_state.report_id)
+    metrics = key_metrics(statements)
+    if metrics:
+        st.markdown("### Key Figures (from the financial statements)")
+        labels = {
+            "revenue": "Revenue",
+            "gross_profit": "Gross Profit",
+            "operating_income": "Operating Income",
+            "net_income": "Net Income",
+            "eps_diluted": "Diluted EPS",
+            "total_assets": "Total Assets",
+            "cash_from_operations": "Operating Cash Flow"
+        }
+        shown = [name for name in labels if name in metrics]
+        columns = st.columns(min(4, len(shown))) if shown else []
+        for i, name in enumerate(shown):
+            years = sorted(metrics[name], reverse=True)
+            latest = metrics[name][years[0]]
+            delta = None
+            if len(years) > 1 and metrics[name][years[1]]:
+                delta = f"{(latest / metrics[name][years[1]] - 1):+.1%} vs {years[1]}"
+            value = format_figure(latest, statements_currency(statements), per_share=name == "eps_diluted")
+            columns[i % len(columns)].metric(f"{labels[name]} ({years[0]})", value, delta)
+
 def display_business_overview():
     st.header("2. Business Overview")
 
-    prompt = """Provide a quick but comprehensive overview of the business covering:
-
-    1. **How It Makes Money**: Primary revenue streams and business model
-    2. **Customers**: Who are the main customer segments?
-    3. **Suppliers**: Key suppliers and dependencies
-    4. **Rivals**: Main competitors in the market
-    5. **Ecosystem**: Key partners, platforms, or ecosystem players
-    6. **Company History**: Brief history and major milestones
-
-    Keep each subsection concise (2-3 sentences). Use bullet points for clarity."""
-
-    analysis = get_analysis("business_overview", prompt)
+    analysis = get_analysis("business_overview", section_prompt("business_overview"))
     st.markdown(analysis)
 
 def display_business_model_map():
@@ -340,123 +925,58 @@ def display_business_model_map():
     through to major cost categories, similar to a Sankey diagram.
     """)
 
-    prompt = """Analyze the annual report and extract:
-
-    1. **Revenue Breakdown**: List all major revenue streams with approximate percentages or dollar amounts
-    2. **Cost Structure**: Break down major cost categories (COGS, SG&A, R&D, etc.) with amounts
-    3. **Gross Profit and Operating Profit**: Extract these key metrics
-
-    Format your response as a structured breakdown that can be used to create a flow diagram.
-    Include actual numbers from the report whenever possible."""
+    from financial_extraction import strip_json_block
 
-    analysis = get_analysis("business_model_map", prompt)
+    analysis = get_analysis("business_model_map", section_prompt("business_model_map"))
+    model = get_business_model(st.session_state.report_id, analysis)
 
     col1, col2 = st.columns([1, 1])
 
     with col1:
         st.subheader("Financial Breakdown")
-        st.markdown(analysis)
+        st.markdown(strip_json_block(analysis))
 
     with col2:
         st.subheader("Visual Representation")
-        st.info("📊 Showing business model flow diagram")
-        # Display sample Sankey diagram
-        fig = create_sample_sankey()
-        st.plotly_chart(fig, use_container_width=True)
-        st.caption("💡 Diagram shows revenue sources flowing into costs and profits")
+        if model is not None:
+            from visualizations import display_sankey_with_data
+            display_sankey_with_data(
+                model.revenues(),
+                model.costs(),
+                model.profits(),
+                fig=get_business_model_figure(st.session_state.report_id, analysis)
+            )
+            unit = f"{model.currency} millions" if model.currency else "millions"
+            st.caption(f"💡 Built from the figures extracted from this report (in {unit})")
+        else:
+            st.info("📊 Could not extract structured figures - showing an example business model diagram")
+            # Display sample Sankey diagram
+            fig = get_sample_sankey_figure()
+            st.plotly_chart(fig, use_container_width=True)
+            st.caption("💡 Diagram shows revenue sources flowing into costs and profits")
 
 def display_the_machine():
     st.header("4. The Machine")
 
-    prompt = """Analyze the business as a machine with three components:
-
-    1. **INPUTS**: What goes into the business?
-       - Raw materials, technology, talent, capital, data, etc.
-       - Key dependencies and resources
-
-    2. **PROCESS**: How does the business transform inputs?
-       - Core operations and capabilities
-       - Key processes and technologies
-       - Value creation mechanisms
-
-    3. **OUTPUTS**: What comes out?
-       - Products and services
-       - Value delivered to customers
-       - Financial outcomes
-
-    Provide a detailed but clear explanation of each component."""
-
-    analysis = get_analysis("the_machine", prompt)
+    analysis = get_analysis("the_machine", section_prompt("the_machine"))
     st.markdown(analysis)
 
 def display_ecosystem():
     st.header("5. Ecosystem Analysis")
 
-    prompt = """Provide a detailed analysis of the company's ecosystem:
-
-    1. **CUSTOMERS**:
-       - Customer segments and characteristics
-       - Customer concentration and dependencies
-       - Customer acquisition and retention
-
-    2. **SUPPLIERS**:
-       - Key suppliers and supply chain
-       - Supplier power and dependencies
-       - Supply chain risks
-
-    3. **COMPETITION**:
-       - Direct competitors
-       - Competitive positioning
-       - Market share dynamics
-
-    4. **SUBSTITUTES**:
-       - Alternative solutions or products
-       - Threat of substitution
-
-    5. **OTHER CHARACTERISTICS**:
-       - Network effects
-       - Regulatory environment
-       - Industry dynamics
-
-    Be specific and use information from the annual report."""
-
-    analysis = get_analysis("ecosystem", prompt)
+    analysis = get_analysis("ecosystem", section_prompt("ecosystem"))
     st.markdown(analysis)
 
 def display_industry_deep_dive():
     st.header("6. Industry Deep Dive")
 
-    prompt = """Provide a comprehensive analysis of the industry:
-
-    1. **Industry Overview**: Market size, growth rates, maturity
-    2. **Key Trends**: Major trends shaping the industry
-    3. **Market Dynamics**: Supply/demand dynamics, pricing power
-    4. **Technology Impact**: How technology is disrupting or enabling
-    5. **Regulatory Environment**: Key regulations affecting the industry
-    6. **Future Outlook**: Where is the industry headed?
-
-    Draw insights from the annual report's industry discussion sections."""
-
-    analysis = get_analysis("industry_deep_dive", prompt)
+    analysis = get_analysis("industry_deep_dive", section_prompt("industry_deep_dive"))
     st.markdown(analysis)
 
 def display_risk_analysis():
     st.header("7. Risk Analysis")
 
-    prompt = """Extract and analyze all major risks facing the business:
-
-    1. **Strategic Risks**: Competition, market position, strategic execution
-    2. **Operational Risks**: Supply chain, operations, execution risks
-    3. **Financial Risks**: Debt, liquidity, currency, interest rate risks
-    4. **Regulatory & Legal Risks**: Compliance, litigation, regulatory changes
-    5. **Technology Risks**: Cybersecurity, technological disruption
-    6. **Market Risks**: Economic conditions, market volatility
-    7. **ESG Risks**: Environmental, social, governance risks
-
-    For each risk category, highlight the most material risks mentioned in the report.
-    Rate each category as High/Medium/Low risk based on disclosure emphasis."""
-
-    analysis = get_analysis("risk_analysis", prompt)
+    analysis = get_analysis("risk_analysis", section_prompt("risk_analysis"))
     st.markdown(analysis)
 
 def display_seven_powers():
@@ -467,40 +987,7 @@ def display_seven_powers():
     Each power is assessed as **Strong**, **Moderate**, or **Weak** relative to competition.
     """)
 
-    prompt = """Assess the company across Hamilton Helmer's 7 Powers framework:
-
-    1. **SCALE ECONOMIES**: Does increasing scale reduce per-unit costs?
-       - Assessment: Strong/Moderate/Weak
-       - Evidence from the report
-       - Comparison to competitors
-
-    2. **NETWORK EFFECTS**: Does the product become more valuable as more people use it?
-       - Assessment: Strong/Moderate/Weak
-       - Evidence and examples
-
-    3. **COUNTER-POSITIONING**: Does the business model create disadvantages for incumbents?
-       - Assessment: Strong/Moderate/Weak
-       - How it differs from traditional competitors
-
-    4. **SWITCHING COSTS**: How difficult is it for customers to switch to competitors?
-       - Assessment: Strong/Moderate/Weak
-       - Types of switching costs present
-
-    5. **BRANDING**: Does the brand command premium pricing or preference?
-       - Assessment: Strong/Moderate/Weak
-       - Brand strength indicators
-
-    6. **CORNERED RESOURCE**: Does the company have unique access to key resources?
-       - Assessment: Strong/Moderate/Weak
-       - What resources and how defensible
-
-    7. **PROCESS POWER**: Are there proprietary processes that competitors can't replicate?
-       - Assessment: Strong/Moderate/Weak
-       - Examples of unique processes
-
-    For each power, provide assessment, reasoning, and competitive comparison."""
-
-    analysis = get_analysis("seven_powers", prompt)
+    analysis = get_analysis("seven_powers", section_prompt("seven_powers"))
     st.markdown(analysis)
 
     # Summary visualization
@@ -511,32 +998,7 @@ def display_seven_powers():
 def display_bull_bear_cases():
     st.header("9. Bull & Bear Cases")
 
-    prompt = """Develop comprehensive bull and bear investment cases:
-
-    **🐂 BULL CASE - What Needs to Go RIGHT:**
-
-    1. Key assumptions that must hold true
-    2. Market opportunities that materialize
-    3. Execution on strategic initiatives
-    4. Favorable industry trends
-    5. Competitive advantages that strengthen
-    6. Financial targets achieved
-    7. Potential upside scenarios
-
-    **🐻 BEAR CASE - What Could Go WRONG:**
-
-    1. Key risks that materialize
-    2. Market opportunities that don't materialize
-    3. Execution failures or challenges
-    4. Adverse industry trends
-    5. Competitive threats intensify
-    6. Financial challenges or misses
-    7. Potential downside scenarios
-
-    Be specific and realistic. Base scenarios on information and risks disclosed in the annual report.
-    For each case, provide 5-7 concrete points."""
-
-    analysis = get_analysis("bull_bear_cases", prompt)
+    analysis = get_analysis("bull_bear_cases", section_prompt("bull_bear_cases"))
 
     col1, col2 = st.columns(2)
 
@@ -0,0 +1,209 @@
+"""
+Analysis bundles: size, library listing and opening a saved analysis
+
+A producer process uploads a synthetic report, analyzes all nine sections (fake provider and
+search) and saves the result to the library. A fresh process with its own empty report store
+then opens the bundle from the library and visits every section, counting provider calls and
+searches (both should be 0). Then a library of N bundles is listed cold
+(new process state) and warm, and one bundle is opened and read section by section.
+
+Usage:
+    python benchmarks/bundle_library.py [--pages 50] [--bundles 300] [--json]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+# Measure what the bundle provides, not the shared cache
+os.environ.setdefault("FUNDAMENTALS_CACHE", "off")
+
+from benchmarks.replica_cache import SECTION_LABELS
+
+APP_PATH = os.path.join(REPO_ROOT, "app.py")
+
+
+def _button(at, prefix: str):
+    return next(b for b in [*at.sidebar.button, *at.button] if b.label.startswith(prefix))
+
+
+def produce(pdf_path: str) -> dict:
+    """Analyze a report with web research and save it to the library"""
+    from streamlit.logger import set_log_level
+    from streamlit.testing.v1 import AppTest
+    from benchmarks.fakes import FakeProvider, FakeSearch
+    set_log_level("error")
+
+    with open(pdf_path, "rb") as f:
+        pdf = f.read()
+    provider = FakeProvider()
+    search = FakeSearch()
+    with search.installed():
+        at = AppTest.from_file(APP_PATH, default_timeout=600)
+        at.session_state["llm_provider"] = provider
+        at.run()
+        at.sidebar.file_uploader[0].set_value(("report.pdf", pdf, "application/pdf"))
+        at.run()
+        _button(at, "🔍").click().run()
+        for label in SECTION_LABELS:
+            at.radio(key="section").set_value(label).run()
+        start = time.perf_counter()
+        _button(at, "📦").click().run()
+        export_ms = (time.perf_counter() - start) * 1000
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return {"bundle": at.session_state["saved_bundle"], "provider_calls": provider.calls,
+            "search_queries": search.queries, "export_rerun_ms": round(export_ms, 1)}
+
+
+def consume() -> dict:
+    """Open the library's bundle in a fresh process and show every section"""
+    from streamlit.logger import set_log_level
+    from streamlit.testing.v1 import AppTest
+    from benchmarks.fakes import FakeProvider, FakeSearch
+    from metrics import METRICS
+    set_log_level("error")
+
+    # Connected, so any section missing from the bundle would be generated (and counted)
+    provider = FakeProvider()
+    search = FakeSearch()
+    section_ms = []
+    with search.installed():
+        at = AppTest.from_file(APP_PATH, default_timeout=600)
+        at.session_state["llm_provider"] = provider
+        at.run()
+        start = time.perf_counter()
+        _button(at, "📂").click().run()
+        open_ms = (time.perf_counter() - start) * 1000
+        for label in SECTION_LABELS:
+            start = time.perf_counter()
+            at.radio(key="section").set_value(label).run()
+            section_ms.append((time.perf_counter() - start) * 1000)
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    counters = METRICS.snapshot()["counters"]
+    return {
+        "provider_calls": provider.calls,
+        "search_queries": search.queries,
+        "pdf_parsed": counters.get("pdf.workers_started", 0) > 0,
+        "open_rerun_ms": round(open_ms, 1),
+        "section_rerun_ms_p50": round(statistics.median(section_ms), 1)
+    }
+
+
+def run_process(role: str, env: dict, *extra) -> dict:
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), f"--{role}", *extra],
+                            env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def library_timings(bundle_path: str, bundles: int) -> dict:
+    """Cold and warm listing of a library of `bundles` copies, and reading one bundle lazily"""
+    from analysis_bundle import AnalysisBundle, BundleLibrary, pack_bundle
+
+    source = AnalysisBundle(bundle_path)
+    entries = {name: source.read(name) for name in source.names()}
+    root = tempfile.mkdtemp(prefix="fundamentals_library_")
+    library = BundleLibrary(root)
+    for i in range(bundles):
+        # Distinct reports, so each copy gets its own content address
+        entries["text"] = source.read("text") + f"\nCopy {i}".encode()
+        library.save(pack_bundle(dict(source.header, report_id=f"{i:032x}", entries=None), entries))
+
+    start = time.perf_counter()
+    cold = BundleLibrary(root).bundles()
+    cold_ms = (time.perf_counter() - start) * 1000
+    warm_times = []
+    for _ in range(20):
+        start = time.perf_counter()
+        library.bundles()
+        warm_times.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    bundle = AnalysisBundle(cold[0].path)
+    bundle.analysis("business_overview")
+    first_section_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    for name in bundle.names():
+        bundle.read(name)
+    full_read_ms = (time.perf_counter() - start) * 1000
+    shutil.rmtree(root, ignore_errors=True)
+
+    raw_bytes = sum(entry["size"] for entry in source.header["entries"].values())
+    return {
+        "bundle_kb": round(os.path.getsize(bundle_path) / 1024, 1),
+        "raw_kb": round(raw_bytes / 1024, 1),
+        "entries": len(source.names()),
+        "sections": len(source.sections()),
+        "bundles": len(cold),
+        "cold_list_ms": round(cold_ms, 1),
+        "warm_list_ms": round(statistics.median(warm_times), 2),
+        "open_and_first_section_ms": round(first_section_ms, 2),
+        "read_all_entries_ms": round(full_read_ms, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--bundles", type=int, default=300, help="Library size for the listing timings")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--produce", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--consume", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--pdf", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.produce:
+        print(json.dumps(produce(args.pdf)))
+        return
+    if args.consume:
+        print(json.dumps(consume()))
+        return
+
+    from benchmarks.synthetic_pdf import synthetic_report_pdf
+
+    workdir = tempfile.mkdtemp(prefix="fundamentals_bundles_")
+    pdf_path = os.path.join(workdir, "report.pdf")
+    with open(pdf_path, "wb") as f:
+        f.write(synthetic_report_pdf(args.pages, seed=int(time.time()), company="Bundle Test Corporation"))
+
+    library_dir = os.path.join(workdir, "library")
+
+    def env():
+        # Each process gets its own report store; only the library is shared
+        return dict(os.environ, FUNDAMENTALS_CACHE="off", FUNDAMENTALS_LIBRARY_DIR=library_dir,
+                    FUNDAMENTALS_STORE_DIR=tempfile.mkdtemp(prefix="store_", dir=workdir),
+                    FUNDAMENTALS_UPLOAD_DIR=tempfile.mkdtemp(prefix="uploads_", dir=workdir))
+
+    producer = run_process("produce", env(), "--pdf", pdf_path)
+    consumer = run_process("consume", env())
+    results = {"producer": producer, "consumer": consumer, "library": library_timings(producer["bundle"], args.bundles)}
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    library = results["library"]
+    print(f"Producer: {producer['provider_calls']} LLM calls, {producer['search_queries']} searches, "
+          f"save {producer['export_rerun_ms']:.0f} ms (rerun)")
+    print(f"Bundle: {library['bundle_kb']:.0f} KB for {library['raw_kb']:.0f} KB raw, "
+          f"{library['entries']} entries, {library['sections']}/9 sections")
+    print(f"Opened in a fresh process: {consumer['provider_calls']} LLM calls, {consumer['search_queries']} searches, "
+          f"parsed PDF: {consumer['pdf_parsed']}")
+    print(f"  open {consumer['open_rerun_ms']:.0f} ms, section p50 {consumer['section_rerun_ms_p50']:.0f} ms (rerun)")
+    print(f"Library of {library['bundles']}: cold list {library['cold_list_ms']:.1f} ms, "
+          f"warm list {library['warm_list_ms']:.2f} ms")
+    print(f"  open + first section {library['open_and_first_section_ms']:.2f} ms, "
+          f"all entries {library['read_all_entries_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Full-report token and wall-time comparison: raw report context vs. the hierarchical digest
+
+Runs all nine analysis sections over a synthetic 10-K with a metered fake provider whose
+latency grows with input and output tokens and which, like the real providers, reads only
+the first `--context-chars` of the context. The raw approach sends the report to every
+section; the digest approach builds the digest once (chunk summaries in parallel) and then
+sends each section the digest plus a slice of the items it draws on.
+
+Sections run one after another, as when a user steps through them. Wall times are scaled
+down by --time-scale while running and reported at full scale.
+
+Usage:
+    python benchmarks/digest_comparison.py [--pages 150] [--context-chars 30000] [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fakes import MeteredProvider, synthetic_10k
+from generation_policy import SECTION_POLICIES
+from report_digest import build_digest, digest_context
+from report_sections import build_section_index, sources_for
+
+# Stands in for the section prompts in app.py, which run to about this length
+SECTION_PROMPT = "Analyze the annual report for this section. " * 30
+
+
+def coverage(text: str, section_key: str, seen_chars: int) -> float:
+    """Share of the items a section draws on that fall within the first `seen_chars`"""
+    index = build_section_index(text)
+    items = sources_for(section_key, index)
+    total = sum(len(index[item]) for item in items)
+    seen = sum(max(0, min(index[item].end, seen_chars) - index[item].start) for item in items)
+    return seen / total if total else 1.0
+
+
+def run_sections(provider, contexts: dict) -> float:
+    start = time.perf_counter()
+    for section_key, context in contexts.items():
+        provider.get_completion(SECTION_PROMPT, context, SECTION_POLICIES[section_key])
+    return time.perf_counter() - start
+
+
+def compare(pages: int, context_chars: int, time_scale: float) -> dict:
+    text = synthetic_10k(pages)
+    sections = list(SECTION_POLICIES)
+
+    raw = MeteredProvider(context_chars=context_chars, time_scale=time_scale)
+    raw_seconds = run_sections(raw, {key: text for key in sections})
+
+    digested = MeteredProvider(context_chars=context_chars, time_scale=time_scale)
+    start = time.perf_counter()
+    digest = build_digest(digested, text)
+    build_seconds = time.perf_counter() - start
+    build_tokens = digested.input_tokens
+    contexts = {key: digest_context(digest, text, key) for key in sections}
+    section_seconds = run_sections(digested, contexts)
+
+    def scaled(seconds):
+        return seconds / time_scale
+
+    return {
+        "report_chars": len(text),
+        "context_chars": context_chars,
+        "raw": {
+            "calls": raw.calls,
+            "input_tokens": raw.input_tokens,
+            "output_tokens": raw.output_tokens,
+            "wall_seconds": scaled(raw_seconds),
+            "mean_source_coverage": sum(coverage(text, key, context_chars) for key in sections) / len(sections)
+        },
+        "digest": {
+            "calls": digested.calls,
+            "digest_calls": digest.calls,
+            "digest_input_tokens": build_tokens,
+            "section_input_tokens": digested.input_tokens - build_tokens,
+            "input_tokens": digested.input_tokens,
+            "output_tokens": digested.output_tokens,
+            "digest_wall_seconds": scaled(build_seconds),
+            "section_wall_seconds": scaled(section_seconds),
+            "wall_seconds": scaled(build_seconds + section_seconds)
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=150)
+    parser.add_argument("--context-chars", type=int, default=30000,
+                        help="Context the provider reads (Groq/OpenAI 30000, Ollama 20000, Anthropic 50000)")
+    parser.add_argument("--time-scale", type=float, default=0.02)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    result = compare(args.pages, args.context_chars, args.time_scale)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    raw, digest = result["raw"], result["digest"]
+    print(f"Report: {result['report_chars']:,} chars, provider reads {result['context_chars']:,} chars per call\n")
+    print(f"{'':24}{'raw context':>14}{'digest':>14}")
+    print(f"{'calls':24}{raw['calls']:>14}{digest['calls']:>14}")
+    print(f"{'input tokens':24}{raw['input_tokens']:>14,}{digest['input_tokens']:>14,}")
+    print(f"{'  of which sections':24}{raw['input_tokens']:>14,}{digest['section_input_tokens']:>14,}")
+    print(f"{'output tokens':24}{raw['output_tokens']:>14,}{digest['output_tokens']:>14,}")
+    print(f"{'wall time (s)':24}{raw['wall_seconds']:>14.1f}{digest['wall_seconds']:>14.1f}")
+    print(f"{'  of which sections':24}{raw['wall_seconds']:>14.1f}{digest['section_wall_seconds']:>14.1f}")
+    print(f"\nRaw context covers {raw['mean_source_coverage']:.0%} of the report items each section draws on;"
+          f" the digest covers all of Items 1, 1A, 7 and 7A.")
+
+
+if __name__ == "__main__":
+    main()
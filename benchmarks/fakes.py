@@ -0,0 +1,206 @@
+"""
+Offline stand-ins for the LLM providers and web search used by the benchmarks
+"""
+
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from generation_policy import CHARS_PER_TOKEN, estimate_tokens
+from llm_providers import LLMProvider
+
+
+class FakeProvider(LLMProvider):
+    """Provider that sleeps for a fixed latency and returns a canned answer"""
+
+    def __init__(self, latency: float = 0.0, response: str = "Fake analysis."):
+        super().__init__()
+        self.provider_name = "Fake Provider"
+        self.model = "fake-model"
+        self.available = True
+        self.latency = latency
+        self.response = response
+        self.calls = 0
+        self.last_policy = None
+
+    def get_completion(self, prompt: str, context: str, policy=None) -> str:
+        self.calls += 1
+        self.last_policy = self.resolve_policy(policy)
+        if self.latency:
+            time.sleep(self.latency)
+        return self.response
+
+
+class MeteredProvider(FakeProvider):
+    """
+    Fake provider with a size-dependent latency, recording the tokens it was sent
+    Like the real providers, it only sees the first `context_chars` of the context
+    """
+
+    def __init__(self, context_chars: int = 30000, base_latency: float = 0.3,
+                 input_tokens_per_second: float = 5000.0, output_tokens_per_second: float = 100.0,
+                 time_scale: float = 1.0):
+        super().__init__()
+        self.context_chars = context_chars
+        self.base_latency = base_latency
+        self.input_tokens_per_second = input_tokens_per_second
+        self.output_tokens_per_second = output_tokens_per_second
+        self.time_scale = time_scale
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self._lock = threading.Lock()
+
+    def get_completion(self, prompt: str, context: str, policy=None) -> str:
+        policy = self.resolve_policy(policy)
+        input_tokens = estimate_tokens(prompt + context[:self.context_chars])
+        # Answers use about half of their budget
+        output_tokens = policy.max_tokens // 2
+        with self._lock:
+            self.calls += 1
+            self.last_policy = policy
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+        latency = (self.base_latency + input_tokens / self.input_tokens_per_second
+                   + output_tokens / self.output_tokens_per_second)
+        time.sleep(latency * self.time_scale)
+        return "Revenue $1,234 million, up 12%. " * (output_tokens * CHARS_PER_TOKEN // 32)
+
+
+class FakeSearch:
+    """Stands in for the DuckDuckGo fetch: canned results after a fixed latency, counting queries"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, query: str, num_results: int):
+        with self._lock:
+            self.queries += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [
+            {"title": f"{query} result {i + 1}", "link": f"https://example.com/{i}",
+             "snippet": f"Background on {query}: market share, competitors and recent results ({i + 1})."}
+            for i in range(num_results)
+        ]
+
+    @contextmanager
+    def installed(self):
+        """Route web research through this fake for the duration of the block"""
+        import web_research
+        original = web_research._fetch_duckduckgo
+        web_research._fetch_duckduckgo = self
+        try:
+            yield self
+        finally:
+            web_research._fetch_duckduckgo = original
+
+
+class FakeRedisServer:
+    """
+    Local stand-in for a Redis-compatible server: GET, SET (EX/PX), DEL, EXISTS, PING over RESP2
+    on a free localhost port, counting commands and stored bytes
+    """
+
+    def __init__(self):
+        import socketserver
+        self.data = {}
+        self.commands = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                while True:
+                    command = server._read_command(self.rfile)
+                    if command is None:
+                        return
+                    self.wfile.write(server._execute(command))
+
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f"redis://127.0.0.1:{self._server.server_address[1]}/0"
+
+    @staticmethod
+    def _read_command(stream):
+        header = stream.readline()
+        if not header:
+            return None
+        parts = []
+        for _ in range(int(header[1:])):
+            length = int(stream.readline()[1:])
+            parts.append(stream.read(length + 2)[:-2])
+        return parts
+
+    def _execute(self, command) -> bytes:
+        name = command[0].upper()
+        with self._lock:
+            self.commands += 1
+            now = time.time()
+            for key in [k for k, (_, expires) in self.data.items() if expires and expires < now]:
+                del self.data[key]
+            if name == b"PING":
+                return b"+PONG\r\n"
+            if name in (b"CLIENT", b"SELECT"):
+                return b"+OK\r\n"
+            if name == b"GET":
+                entry = self.data.get(command[1])
+                return b"$-1\r\n" if entry is None else b"$%d\r\n%s\r\n" % (len(entry[0]), entry[0])
+            if name == b"SET":
+                options = [part.upper() for part in command[3:]]
+                expires = None
+                if b"EX" in options:
+                    expires = now + int(command[3 + options.index(b"EX") + 1])
+                elif b"PX" in options:
+                    expires = now + int(command[3 + options.index(b"PX") + 1]) / 1000
+                self.data[command[1]] = (command[2], expires)
+                return b"+OK\r\n"
+            if name in (b"DEL", b"EXISTS"):
+                found = [key for key in command[1:] if key in self.data]
+                if name == b"DEL":
+                    for key in found:
+                        del self.data[key]
+                return b":%d\r\n" % len(found)
+        return b"-ERR unknown command '%s'\r\n" % name
+
+    def stored_bytes(self) -> int:
+        with self._lock:
+            return sum(len(value) for value, _ in self.data.values())
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def synthetic_10k(pages: int = 120, seed: int = 1) -> str:
+    """Annual report text with 10-K item structure, about 4,000 characters per page"""
+    rnd = random.Random(seed)
+    words = ("revenue growth customers platform margin segment operating cloud services regulatory "
+             "competition pricing supply demand subscription products markets").split()
+    # Share of pages per item, roughly as in large-company filings
+    layout = [("1", "Business", 0.18), ("1A", "Risk Factors", 0.16), ("1B", "Unresolved Staff Comments", 0.01),
+              ("2", "Properties", 0.01), ("3", "Legal Proceedings", 0.01),
+              ("5", "Market for Registrant's Common Equity", 0.02),
+              ("7", "Management's Discussion and Analysis", 0.16),
+              ("7A", "Quantitative and Qualitative Disclosures About Market Risk", 0.02),
+              ("8", "Financial Statements and Supplementary Data", 0.35), ("9A", "Controls and Procedures", 0.02),
+              ("10", "Directors, Executive Officers and Corporate Governance", 0.02), ("15", "Exhibits", 0.04)]
+    parts = ["ACME CORPORATION\nANNUAL REPORT ON FORM 10-K\nFor the fiscal year ended December 31, 2024\n"]
+    for item, title, share in layout:
+        parts.append(f"\nItem {item}. {title}\n")
+        for _ in range(max(1, round(pages * share))):
+            for _ in range(6):
+                sentences = []
+                for _ in range(5):
+                    sentence = " ".join(rnd.choice(words) for _ in range(15))
+                    if rnd.random() < 0.3:
+                        sentence += f" of ${rnd.randint(10, 9999):,} million, {rnd.randint(1, 40)}%"
+                    sentences.append(sentence.capitalize() + ".")
+                parts.append(" ".join(sentences) + "\n\n")
+    return "".join(parts)
@@ -0,0 +1,137 @@
+"""
+Import-time budget for the app's startup path
+
+Runs `python -X importtime -c "import app"` in a fresh interpreter, parses the
+per-module timings and checks them against benchmarks/import_budget.json:
+- our own modules must stay within their cumulative time budget
+- heavyweight modules (plotly, PyPDF2, provider SDKs) must not be imported by our
+  code at startup; modules streamlit itself loads are measured separately and ignored
+
+Usage:
+    python benchmarks/import_time.py            # print report, exit 1 on regression
+    python benchmarks/import_time.py --json     # machine-readable output
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "import_budget.json")
+
+
+def measure_imports(target: str = "app", runs: int = 3) -> Dict[str, Dict[str, int]]:
+    """
+    Import `target` in fresh interpreters and return the best-of-N timings
+    Maps module name -> {"self_us": ..., "cumulative_us": ...}
+    """
+    best: Dict[str, Dict[str, int]] = {}
+
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Importing {target} failed:\n{result.stderr[-2000:]}")
+
+        for name, self_us, cumulative_us in parse_importtime(result.stderr):
+            timing = best.get(name)
+            if timing is None or cumulative_us < timing["cumulative_us"]:
+                best[name] = {"self_us": self_us, "cumulative_us": cumulative_us}
+
+    return best
+
+
+def parse_importtime(stderr: str):
+    """Yield (module, self_us, cumulative_us) from -X importtime output"""
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # header line
+        # Nested imports are indented; the name itself never contains spaces
+        yield fields[2].strip(), int(fields[0]), int(fields[1])
+
+
+def check_budget(timings: Dict[str, Dict[str, int]], budget: dict, baseline: Dict[str, Dict[str, int]] = None) -> list:
+    """
+    Return a list of human-readable budget violations
+    `baseline` holds the timings of a bare `import streamlit`; modules it already
+    loads are not held against us
+    """
+    baseline = baseline or {}
+    violations = []
+
+    for module, limit_ms in budget.get("max_cumulative_ms", {}).items():
+        timing = timings.get(module)
+        if timing is None:
+            continue
+        # Exclude time spent importing streamlit itself, which we don't control
+        own_us = timing["cumulative_us"] - _streamlit_share_us(timings, module)
+        if own_us / 1000 > limit_ms:
+            violations.append(f"{module}: {own_us / 1000:.1f} ms > budget {limit_ms} ms")
+
+    for module in budget.get("forbidden_at_startup", []):
+        if module in timings and module not in baseline:
+            violations.append(f"{module} is imported at startup (should be lazy)")
+
+    return violations
+
+
+def _streamlit_share_us(timings: Dict[str, Dict[str, int]], module: str) -> int:
+    """Time spent importing streamlit inside `module`'s import (app imports it first)"""
+    streamlit = timings.get("streamlit")
+    if streamlit is None or module != "app":
+        return 0
+    return streamlit["cumulative_us"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app import time against the budget")
+    parser.add_argument("--target", default="app", help="Module to import (default: app)")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters to try (best-of)")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable JSON")
+    args = parser.parse_args()
+
+    with open(BUDGET_FILE) as f:
+        budget = json.load(f)
+
+    timings = measure_imports(args.target, args.runs)
+    baseline = measure_imports("streamlit", 1)
+    violations = check_budget(timings, budget, baseline)
+
+    tracked = list(budget.get("max_cumulative_ms", {})) + ["streamlit"]
+    report = {
+        "target": args.target,
+        "modules": {name: timings[name] for name in tracked if name in timings},
+        "heavy_modules_loaded": [
+            m for m in budget.get("forbidden_at_startup", []) if m in timings and m not in baseline
+        ],
+        "violations": violations
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"Import time for '{args.target}' (best of {args.runs}):")
+        for name, timing in report["modules"].items():
+            print(f"  {name:<20} {timing['cumulative_us'] / 1000:8.1f} ms cumulative")
+        if violations:
+            print("\nBudget violations:")
+            for v in violations:
+                print(f"  ✗ {v}")
+        else:
+            print("\n✓ Within import-time budget")
+
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
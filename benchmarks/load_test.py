@@ -0,0 +1,228 @@
+"""
+Multi-session load test for the Streamlit app
+
+Drives N concurrent simulated analysts through the real app script in one process, as one
+Streamlit server would host them. Each session is an AppTest on its own thread that connects
+a stub provider, uploads a synthetic annual-report PDF through the file uploader, clicks
+"Analyze Report" and then steps through the nine sections. Providers and web search are
+offline fakes with configurable latency.
+
+For each concurrency level it reports p50/p95/p99 latency per interaction (upload and
+section navigation), process RSS (current and peak), CPU time and utilization, and the
+provider and search calls made.
+
+Usage:
+    python benchmarks/load_test.py --sessions 1,2,4,8 [--pages 50] [--provider-latency 0.2] [--json]
+"""
+
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+from typing import Dict, List
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# Keep load-test reports, digests and output lengths out of the real store
+os.environ.setdefault("FUNDAMENTALS_STORE_DIR", tempfile.mkdtemp(prefix="fundamentals_load_"))
+# Repeated rounds measure the uncached path; replica_cache.py measures the shared cache
+os.environ.setdefault("FUNDAMENTALS_CACHE", "off")
+
+import streamlit.testing.v1.app_test as app_test
+from streamlit import config
+from streamlit.logger import set_log_level
+from streamlit.runtime.runtime import Runtime
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest
+
+from benchmarks.fakes import FakeProvider, FakeSearch
+from benchmarks.synthetic_pdf import synthetic_report_pdf
+
+set_log_level("error")
+
+APP_PATH = os.path.join(REPO_ROOT, "app.py")
+SECTION_LABELS = [
+    "1. Quick Stats", "2. Business Overview", "3. Business Model Map", "4. The Machine", "5. Ecosystem",
+    "6. Industry Deep Dive", "7. Risk Analysis", "8. Hamilton Helmer 7 Powers", "9. Bull & Bear Cases"
+]
+PERCENTILES = (50, 95, 99)
+
+
+def share_streamlit_globals():
+    """
+    Let AppTest sessions run concurrently, the way sessions of one Streamlit server do
+    AppTest assumes one test at a time, and three of its per-run globals break under concurrency:
+    - each run compiles app.py into its own ScriptCache, and compiling on several threads at
+      once trips a CPython 3.11 bug ("AST constructor recursion depth mismatch"); a server
+      compiles the script once, so all sessions share one cache here
+    - each run installs a mock Runtime and clears it when it ends, under the feet of runs still
+      in progress; here a cleared runtime falls back to the last one installed
+    - each run patches config.get_option for "global.appTest" and restores it when it ends;
+      here the option is set once for the whole process
+    """
+    config.set_option("global.appTest", True)
+    app_test.patch_config_options = lambda overrides: nullcontext()
+
+    shared = ScriptCache()
+    get_bytecode = ScriptCache.get_bytecode
+    ScriptCache.get_bytecode = lambda self, script_path: get_bytecode(shared, script_path)
+
+    last = []
+
+    def instance(cls):
+        if cls._instance is not None:
+            last[:] = [cls._instance]
+            return cls._instance
+        if not last:
+            raise RuntimeError("Runtime hasn't been created!")
+        return last[0]
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or bool(last))
+
+
+def rss_bytes() -> int:
+    """Current resident set size, from /proc (Linux)"""
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def peak_rss_bytes() -> int:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Session:
+    """One simulated analyst: upload, analyze, then visit every section"""
+
+    def __init__(self, number: int, pdf: bytes, provider_latency: float, think_seconds: float):
+        self.number = number
+        self.pdf = pdf
+        self.provider = FakeProvider(latency=provider_latency)
+        self.think_seconds = think_seconds
+        self.timings: Dict[str, List[float]] = {"upload": [], "navigate": []}
+        self.error = None
+
+    def _timed(self, kind: str, action):
+        start = time.perf_counter()
+        action()
+        self.timings[kind].append((time.perf_counter() - start) * 1000)
+        if self.think_seconds:
+            time.sleep(self.think_seconds)
+
+    def run(self):
+        try:
+            at = AppTest.from_file(APP_PATH, default_timeout=600)
+            at.session_state["llm_provider"] = self.provider
+            at.run()
+            at.sidebar.file_uploader[0].set_value((f"report-{self.number}.pdf", self.pdf, "application/pdf"))
+            at.run()
+            analyze = next(b for b in at.sidebar.button if b.label.startswith("🔍"))
+            self._timed("upload", lambda: analyze.click().run())
+            for label in SECTION_LABELS:
+                self._timed("navigate", lambda: at.radio(key="section").set_value(label).run())
+            if at.exception:
+                self.error = at.exception[0].value
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    points = np.percentile(values, PERCENTILES)
+    return {f"p{p}_ms": round(float(v), 1) for p, v in zip(PERCENTILES, points)}
+
+
+def run_level(sessions: int, pages: int, provider_latency: float, search: FakeSearch,
+              think_seconds: float, shared_report: bool) -> dict:
+    # Distinct reports (and companies) per session by default, so extraction, digests and
+    # web research are not shared between sessions
+    pdfs = [
+        synthetic_report_pdf(pages) if shared_report
+        else synthetic_report_pdf(pages, seed=1000 * sessions + i, company=f"Acme {sessions}-{i} Corporation")
+        for i in range(sessions)
+    ]
+    simulated = [Session(i, pdfs[i], provider_latency, think_seconds) for i in range(sessions)]
+    threads = [threading.Thread(target=s.run, name=f"session-{s.number}") for s in simulated]
+
+    searches_before = search.queries
+    cpu_before = cpu_seconds()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    cpu = cpu_seconds() - cpu_before
+
+    timings = {kind: [t for s in simulated for t in s.timings[kind]] for kind in ("upload", "navigate")}
+    return {
+        "sessions": sessions,
+        "wall_seconds": round(wall, 2),
+        "interactions": {kind: {"count": len(values), **percentiles(values)} for kind, values in timings.items()},
+        "rss_mb": round(rss_bytes() / 2 ** 20, 1),
+        "peak_rss_mb": round(peak_rss_bytes() / 2 ** 20, 1),
+        "cpu_seconds": round(cpu, 2),
+        # Share of one core used over the run; the GIL caps Python work near 1.0
+        "cpu_utilization": round(cpu / wall, 2) if wall else 0.0,
+        "provider_calls": sum(s.provider.calls for s in simulated),
+        "search_queries": search.queries - searches_before,
+        "errors": [f"session {s.number}: {s.error}" for s in simulated if s.error]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", default="1,2,4,8", help="Concurrency levels (comma-separated)")
+    parser.add_argument("--pages", type=int, default=50, help="Pages in each synthetic report")
+    parser.add_argument("--provider-latency", type=float, default=0.2, help="Stub provider latency per call (s)")
+    parser.add_argument("--search-latency", type=float, default=0.05, help="Fake search latency per query (s)")
+    parser.add_argument("--think", type=float, default=0.0, help="Pause between a session's interactions (s)")
+    parser.add_argument("--shared-report", action="store_true",
+                        help="All sessions upload the same report (exercises cross-session sharing)")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable JSON")
+    args = parser.parse_args()
+
+    share_streamlit_globals()
+    search = FakeSearch(latency=args.search_latency)
+    results = []
+    with search.installed():
+        for level in [int(n) for n in args.sessions.split(",") if n]:
+            results.append(run_level(level, args.pages, args.provider_latency, search, args.think, args.shared_report))
+            if not args.json:
+                print(f"  {level} session(s) done in {results[-1]['wall_seconds']} s", file=sys.stderr)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 1 if any(r["errors"] for r in results) else 0
+
+    print(f"\n{'sessions':>8} {'interaction':>12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+          f" {'RSS MB':>8} {'peak MB':>8} {'CPU s':>7} {'CPU %':>6} {'LLM':>5} {'search':>7}")
+    for r in results:
+        for kind, stats in r["interactions"].items():
+            first = kind == "upload"
+            print(f"{r['sessions']:>8} {kind:>12} {stats.get('p50_ms', 0):>9.0f} {stats.get('p95_ms', 0):>9.0f}"
+                  f" {stats.get('p99_ms', 0):>9.0f}"
+                  + (f" {r['rss_mb']:>8.0f} {r['peak_rss_mb']:>8.0f} {r['cpu_seconds']:>7.1f}"
+                     f" {r['cpu_utilization']:>6.0%} {r['provider_calls']:>5} {r['search_queries']:>7}" if first else ""))
+        for error in r["errors"]:
+            print(f"         ✗ {error}")
+    return 1 if any(r["errors"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+Cross-replica reuse through the shared cache
+
+Simulates a user whose reconnect lands on another replica: replica A (one process) uploads a
+synthetic report and analyzes all nine sections; replica B (a second process with its own
+local report store) then does the same. Both use the cache backend under test, so B should
+find the extracted report, LLM answers and search results A paid for.
+
+Backends: "memory" (not shared, for contrast), "sqlite" (a database file both replicas open)
+and "redis" (a local Redis stand-in, or --redis-url for a real server). Also reports the
+per-operation latency of each backend.
+
+Usage:
+    python benchmarks/replica_cache.py [--backends memory,sqlite,redis] [--pages 50] [--json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+APP_PATH = os.path.join(REPO_ROOT, "app.py")
+SECTION_LABELS = [
+    "1. Quick Stats", "2. Business Overview", "3. Business Model Map", "4. The Machine", "5. Ecosystem",
+    "6. Industry Deep Dive", "7. Risk Analysis", "8. Hamilton Helmer 7 Powers", "9. Bull & Bear Cases"
+]
+
+
+def replica_session(pdf_path: str, provider_latency: float, search_latency: float) -> dict:
+    """One replica process: upload, analyze, visit every section (configured through the environment)"""
+    from streamlit.logger import set_log_level
+    from streamlit.testing.v1 import AppTest
+    from benchmarks.fakes import FakeProvider, FakeSearch
+    from metrics import METRICS
+    set_log_level("error")
+
+    with open(pdf_path, "rb") as f:
+        pdf = f.read()
+    provider = FakeProvider(latency=provider_latency)
+    search = FakeSearch(latency=search_latency)
+    start = time.perf_counter()
+    with search.installed():
+        at = AppTest.from_file(APP_PATH, default_timeout=600)
+        at.session_state["llm_provider"] = provider
+        at.run()
+        at.sidebar.file_uploader[0].set_value(("report.pdf", pdf, "application/pdf"))
+        at.run()
+        next(b for b in at.sidebar.button if b.label.startswith("🔍")).click().run()
+        for label in SECTION_LABELS:
+            at.radio(key="section").set_value(label).run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+
+    counters = METRICS.snapshot()["counters"]
+    return {
+        "provider_calls": provider.calls,
+        "search_queries": search.queries,
+        "pdf_parsed": counters.get("pdf.workers_started", 0) > 0,
+        "cache_hits": sum(v for k, v in counters.items() if k.startswith("cache.") and k.endswith(".hits")),
+        "wall_seconds": round(time.perf_counter() - start, 2)
+    }
+
+
+def backend_latency(url: str, operations: int = 200, value_bytes: int = 20000) -> dict:
+    """Median set and get time for compressible values of `value_bytes`"""
+    from shared_cache import SharedCache, create_backend
+    cache = SharedCache(create_backend(url))
+    value = ("Revenue $1,234 million, up 12%. " * (value_bytes // 32)).encode()
+    sets, gets = [], []
+    for i in range(operations):
+        start = time.perf_counter()
+        cache.set_bytes("llm", (f"latency-{i}",), value)
+        sets.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        cache.get_bytes("llm", f"latency-{i}")
+        gets.append(time.perf_counter() - start)
+    return {"set_ms": round(statistics.median(sets) * 1000, 3), "get_ms": round(statistics.median(gets) * 1000, 3)}
+
+
+def run_replica(pdf_path: str, cache_url: str, args) -> dict:
+    env = dict(os.environ,
+               FUNDAMENTALS_CACHE=cache_url,
+               FUNDAMENTALS_STORE_DIR=tempfile.mkdtemp(prefix="fundamentals_replica_"),
+               FUNDAMENTALS_UPLOAD_DIR=tempfile.mkdtemp(prefix="fundamentals_uploads_"))
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--replica", "--pdf", pdf_path,
+         "--provider-latency", str(args.provider_latency), "--search-latency", str(args.search_latency)],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="memory,sqlite,redis")
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--provider-latency", type=float, default=0.2, help="Fake provider latency per call (s)")
+    parser.add_argument("--search-latency", type=float, default=0.05, help="Fake search latency per query (s)")
+    parser.add_argument("--redis-url", help="Use this server instead of the local stand-in")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--replica", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--pdf", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.replica:
+        print(json.dumps(replica_session(args.pdf, args.provider_latency, args.search_latency)))
+        return
+
+    from benchmarks.fakes import FakeRedisServer
+    from benchmarks.synthetic_pdf import synthetic_report_pdf
+
+    workdir = tempfile.mkdtemp(prefix="fundamentals_replica_cache_")
+    pdf_path = os.path.join(workdir, "report.pdf")
+    with open(pdf_path, "wb") as f:
+        f.write(synthetic_report_pdf(args.pages, seed=int(time.time()), company="Replica Test Corporation"))
+
+    results = []
+    with FakeRedisServer() as standin:
+        urls = {
+            "memory": "memory",
+            "sqlite": f"sqlite://{os.path.join(workdir, 'cache.db')}",
+            "redis": args.redis_url or standin.url
+        }
+        for backend in [b for b in args.backends.split(",") if b]:
+            first = run_replica(pdf_path, urls[backend], args)
+            second = run_replica(pdf_path, urls[backend], args)
+            results.append({"backend": backend, "replica_a": first, "replica_b": second,
+                            **(backend_latency(urls[backend]) if backend != "memory" else {})})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'backend':<8}{'replica':>8}{'LLM calls':>11}{'searches':>10}{'parsed':>8}{'hits':>6}{'wall s':>8}"
+          f"{'set ms':>8}{'get ms':>8}")
+    for r in results:
+        for name in ("replica_a", "replica_b"):
+            replica = r[name]
+            latency = f"{r['set_ms']:>8.2f}{r['get_ms']:>8.2f}" if name == "replica_a" and "set_ms" in r else ""
+            print(f"{r['backend']:<8}{name[-1].upper():>8}{replica['provider_calls']:>11}{replica['search_queries']:>10}"
+                  f"{'yes' if replica['pdf_parsed'] else 'no':>8}{replica['cache_hits']:>6}"
+                  f"{replica['wall_seconds']:>8.1f}{latency}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Scripted interaction benchmark for Streamlit rerun latency
+
+Drives app.py through Streamlit's AppTest with a report already loaded and a
+zero-latency fake provider, then times each interaction (switching sections,
+toggling web research). AppTest always re-executes the whole script, so these
+numbers capture the cost of a full rerun; in the live server, fragment-scoped
+interactions skip the sidebar entirely and are cheaper still.
+
+Usage:
+    python benchmarks/rerun_latency.py [--rounds 3] [--json] [--app path/to/app.py]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# Keep benchmark reports and fake-provider output lengths out of the real store
+os.environ.setdefault("FUNDAMENTALS_STORE_DIR", tempfile.mkdtemp(prefix="fundamentals_bench_"))
+# Repeated rounds measure the uncached path; replica_cache.py measures the shared cache
+os.environ.setdefault("FUNDAMENTALS_CACHE", "off")
+
+from streamlit.testing.v1 import AppTest
+
+from benchmarks.fakes import FakeProvider
+
+SAMPLE_REPORT = "ACME Corporation Annual Report. Revenue was $1.2 billion. " * 200
+
+
+def loaded_app(app_path: str) -> AppTest:
+    """App with a report loaded and a fake provider connected"""
+    at = AppTest.from_file(app_path, default_timeout=60)
+    at.session_state["llm_provider"] = FakeProvider()
+    if os.path.exists(os.path.join(os.path.dirname(app_path), "report_store.py")):
+        from report_store import get_default_store
+        at.session_state["report_id"] = get_default_store().put_text(SAMPLE_REPORT)
+    else:
+        at.session_state["report_text"] = SAMPLE_REPORT  # Older layout kept text in session
+    at.session_state["company_name"] = "ACME Corporation"
+    at.session_state["use_web_research"] = False
+    at.session_state["analysis_complete"] = True
+    at.run()
+    return at
+
+
+def section_radio(at: AppTest):
+    """The section navigation radio (keyed in the workspace fragment, or the sidebar radio in older layouts)"""
+    try:
+        return at.radio(key="section")
+    except KeyError:
+        return at.radio[0]
+
+
+def timed(action) -> float:
+    start = time.perf_counter()
+    action()
+    return (time.perf_counter() - start) * 1000
+
+
+def run_benchmark(rounds: int, app_path: str) -> dict:
+    at = loaded_app(app_path)
+    sections = section_radio(at).options
+    timings = {"navigate": [], "navigate_cached": [], "toggle_web_research": []}
+
+    for round_number in range(rounds):
+        # First round generates (fake) analyses; later rounds hit the cache
+        bucket = "navigate" if round_number == 0 else "navigate_cached"
+        for section in sections:
+            timings[bucket].append(timed(lambda: section_radio(at).set_value(section).run()))
+
+        checkbox = at.checkbox[0]
+        timings["toggle_web_research"].append(timed(lambda: checkbox.set_value(not checkbox.value).run()))
+
+    return {
+        name: {
+            "count": len(values),
+            "mean_ms": round(statistics.mean(values), 2),
+            "median_ms": round(statistics.median(values), 2),
+            "max_ms": round(max(values), 2)
+        }
+            for name, values in timings.items() if values
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure Streamlit rerun latency per interaction")
+    parser.add_argument("--rounds", type=int, default=3, help="Passes over all sections")
+    parser.add_argument("--json", action="store_true", help="Print machine-readable JSON")
+    parser.add_argument("--app", default=os.path.join(REPO_ROOT, "app.py"), help="App script to drive (e.g. an older checkout)")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.rounds, os.path.abspath(args.app))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print("Rerun latency per interaction:")
+        for name, stats in results.items():
+            print(f"  {name:<22} mean {stats['mean_ms']:8.1f} ms   median {stats['median_ms']:8.1f} ms   max {stats['max_ms']:8.1f} ms   (n={stats['count']})")
+
+
+if __name__ == "__main__":
+    main()
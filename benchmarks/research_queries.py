@@ -0,0 +1,74 @@
+"""
+Outbound searches per report: merged research plan vs. sections searching on their own
+
+Gathers web research for every section of N companies through a fake search engine (fixed
+latency, counted queries) with the shared cache off, once with each section running its own
+searches and once through a WebResearchEnhancer, whose plan merges overlapping queries.
+
+Usage:
+    python benchmarks/research_queries.py [--companies 5] [--search-latency 0.05] [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+# Count what each path sends, not what the shared cache absorbs
+os.environ.setdefault("FUNDAMENTALS_CACHE", "off")
+
+from benchmarks.fakes import FakeSearch
+from research_planner import SECTION_INTENTS, ResearchPlan
+
+
+def gather(companies: int, search_latency: float, planned: bool) -> dict:
+    from web_research import WebResearchEnhancer, gather_web_research
+
+    search = FakeSearch(latency=search_latency)
+    start = time.perf_counter()
+    with search.installed():
+        for i in range(companies):
+            company = f"Benchmark Company {i} Inc"
+            enhancer = WebResearchEnhancer(company) if planned else None
+            for section in SECTION_INTENTS:
+                if enhancer:
+                    enhancer.get_research_for_section(section)
+                else:
+                    gather_web_research(company, section)
+    return {
+        "searches_per_report": search.queries / companies,
+        "seconds_per_report": round((time.perf_counter() - start) / companies, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--companies", type=int, default=5)
+    parser.add_argument("--search-latency", type=float, default=0.05, help="Fake search latency per query (s)")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    plan = ResearchPlan("Example Inc", search=lambda query, num_results: [])
+    results = {
+        "per_section": gather(args.companies, args.search_latency, planned=False),
+        "planned": gather(args.companies, args.search_latency, planned=True),
+        "plan": plan.summary()
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    alone, merged = results["per_section"], results["planned"]
+    saved = 1 - merged["searches_per_report"] / alone["searches_per_report"]
+    print(f"Searches per report: {alone['searches_per_report']:.0f} per section -> "
+          f"{merged['searches_per_report']:.0f} planned ({saved:.0%} fewer)")
+    print(f"Research time per report: {alone['seconds_per_report']:.2f}s -> {merged['seconds_per_report']:.2f}s "
+          f"at {args.search_latency * 1000:.0f} ms per search")
+    for topic, sections in results["plan"]["merged"].items():
+        print(f"  {topic}: shared by {', '.join(sections)}")
+
+
+if __name__ == "__main__":
+    main()
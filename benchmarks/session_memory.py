@@ -0,0 +1,108 @@
+"""
+tracemalloc report of per-session memory footprint
+
+Simulates N browser sessions that open the same (synthetic) report and generate
+all nine analyses, once with everything held in session state (the old layout)
+and once with the shared ReportStore, and reports the bytes each session adds.
+
+Usage:
+    python benchmarks/session_memory.py [--sessions 50] [--report-mb 2] [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from report_store import ReportStore
+
+SECTION_KEYS = [
+    "quick_stats", "business_overview", "business_model_map", "the_machine", "ecosystem",
+    "industry_deep_dive", "risk_analysis", "seven_powers", "bull_bear_cases"
+]
+
+
+def synthetic_report(size_mb: float) -> str:
+    paragraph = ("The Company operates in three segments. Revenue increased 7% to $4.2 billion "
+                 "driven by pricing and volume. Risk factors include competition and regulation. ")
+    return paragraph * int(size_mb * 1024 * 1024 / len(paragraph))
+
+
+def synthetic_analysis(section_key: str) -> str:
+    return f"## {section_key}\n" + "- Detailed analysis point with supporting evidence.\n" * 120
+
+
+def measure(sessions: int, make_session) -> list:
+    """Bytes allocated (and still held) by each call to make_session"""
+    tracemalloc.start()
+    held = []
+    footprints = []
+    for i in range(sessions):
+        before = tracemalloc.get_traced_memory()[0]
+        held.append(make_session(i))
+        footprints.append(tracemalloc.get_traced_memory()[0] - before)
+    tracemalloc.stop()
+    return footprints
+
+
+def run_benchmark(sessions: int, report_mb: float) -> dict:
+    pdf_text = synthetic_report(report_mb)
+
+    def in_session_state(_):
+        # Each session extracts its own copy of the text and keeps analyses uncompressed
+        return {
+            "report_text": "".join([pdf_text[:1], pdf_text[1:]]),
+            "analyses": {key: synthetic_analysis(key) for key in SECTION_KEYS}
+        }
+
+    store = ReportStore(root=tempfile.mkdtemp(prefix="fundamentals_bench_"))
+
+    def with_report_store(i):
+        session_id = f"session-{i}"
+        report_id = store.put_text("".join([pdf_text[:1], pdf_text[1:]]))
+        store.acquire(session_id, report_id)
+        for key in SECTION_KEYS:
+            store.set_analysis(session_id, key, synthetic_analysis(key))
+        return {"session_id": session_id, "report_id": report_id}
+
+    results = {}
+    for name, make_session in (("session_state", in_session_state), ("report_store", with_report_store)):
+        footprints = measure(sessions, make_session)
+        results[name] = {
+            "sessions": sessions,
+            "first_session_bytes": footprints[0],
+            "mean_additional_session_bytes": int(sum(footprints[1:]) / max(1, len(footprints) - 1)),
+            "total_bytes": sum(footprints)
+        }
+    results["report_store"]["store_stats"] = store.stats()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-session memory footprint (tracemalloc)")
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--report-mb", type=float, default=2.0)
+    parser.add_argument("--json", action="store_true", help="Print machine-readable JSON")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.sessions, args.report_mb)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{args.sessions} sessions, {args.report_mb} MB report:")
+    for name in ("session_state", "report_store"):
+        r = results[name]
+        print(f"  {name:<14} first {r['first_session_bytes'] / 1024:10.1f} KiB   "
+              f"each additional {r['mean_additional_session_bytes'] / 1024:10.1f} KiB   "
+              f"total {r['total_bytes'] / 1024 / 1024:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
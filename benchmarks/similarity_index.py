@@ -0,0 +1,121 @@
+"""
+Similarity cache lookup speed and match quality
+
+Fills a SimilarityCache index with N fingerprints spread over a few section scopes, then
+times lookups for near-duplicates (a few flipped bits) and for unrelated inputs, and checks
+every near-duplicate is found. Also times fingerprinting a 50,000-character report context and
+shows SimHash distances for a re-exported copy of a synthetic report and for a different report.
+
+Usage:
+    python benchmarks/similarity_index.py [--entries 50000] [--lookups 2000] [--json]
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from similarity_cache import CONTEXT_THRESHOLD, SIMHASH_BITS, SimHashIndex, hamming, minhash, simhash
+
+
+def _percentile(values, share: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+def index_lookups(entries: int, lookups: int, scopes: int = 9, seed: int = 7) -> dict:
+    rnd = random.Random(seed)
+    index = SimHashIndex(int(round((1 - CONTEXT_THRESHOLD) * SIMHASH_BITS)))
+    stored = []
+    start = time.perf_counter()
+    for entry_id in range(entries):
+        scope = f"section-{entry_id % scopes}"
+        fingerprint = rnd.getrandbits(SIMHASH_BITS)
+        index.add(entry_id, scope, fingerprint)
+        stored.append((scope, fingerprint))
+    build_seconds = time.perf_counter() - start
+
+    near_times, far_times, found = [], [], 0
+    for _ in range(lookups):
+        entry_id = rnd.randrange(entries)
+        scope, fingerprint = stored[entry_id]
+        for bit in rnd.sample(range(SIMHASH_BITS), rnd.randint(0, index.max_distance)):
+            fingerprint ^= 1 << bit
+        start = time.perf_counter()
+        matches = index.nearest(scope, fingerprint)
+        near_times.append(time.perf_counter() - start)
+        found += any(match_id == entry_id for _, match_id in matches)
+
+        start = time.perf_counter()
+        index.nearest(scope, rnd.getrandbits(SIMHASH_BITS))
+        far_times.append(time.perf_counter() - start)
+
+    return {
+        "entries": entries,
+        "max_distance": index.max_distance,
+        "build_seconds": round(build_seconds, 3),
+        "near_p50_us": round(statistics.median(near_times) * 1e6, 1),
+        "near_p99_us": round(_percentile(near_times, 0.99) * 1e6, 1),
+        "unrelated_p50_us": round(statistics.median(far_times) * 1e6, 1),
+        "unrelated_p99_us": round(_percentile(far_times, 0.99) * 1e6, 1),
+        "near_recall": found / lookups
+    }
+
+
+def fingerprint_quality() -> dict:
+    from benchmarks.synthetic_pdf import synthetic_report_pdf
+    from pdf_extraction import extract_pdf
+
+    original = extract_pdf(io.BytesIO(synthetic_report_pdf(60, seed=1))).text[:50000]
+    other = extract_pdf(io.BytesIO(synthetic_report_pdf(60, seed=2))).text[:50000]
+    # What another PDF producer changes: ligatures, spacing, hyphenation, casing, a producer line
+    reexported = (original.replace("fi", "ﬁ").replace("\n", " \n").replace("Annual", "ANNUAL")
+                  .replace("manufacturing", "manu-\nfacturing") + "\nProduced by Acrobat Distiller 11")
+
+    start = time.perf_counter()
+    fingerprint = simhash(original)
+    simhash_ms = (time.perf_counter() - start) * 1000
+    research = "\n".join(f"- Result {i}: analyst note on ACME's margins and segment growth" for i in range(6))
+    start = time.perf_counter()
+    minhash(research)
+    minhash_ms = (time.perf_counter() - start) * 1000
+    return {
+        "simhash_50k_chars_ms": round(simhash_ms, 1),
+        "minhash_research_ms": round(minhash_ms, 2),
+        "reexported_distance_bits": hamming(fingerprint, simhash(reexported)),
+        "other_report_distance_bits": hamming(fingerprint, simhash(other))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=50000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    results = {"index": index_lookups(args.entries, args.lookups), "fingerprints": fingerprint_quality()}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    index, quality = results["index"], results["fingerprints"]
+    print(f"Index: {index['entries']:,} entries, match within {index['max_distance']} bits "
+          f"(built in {index['build_seconds']:.2f}s)")
+    print(f"  near-duplicate lookup  p50 {index['near_p50_us']:.1f} µs  p99 {index['near_p99_us']:.1f} µs  "
+          f"recall {index['near_recall']:.0%}")
+    print(f"  unrelated lookup       p50 {index['unrelated_p50_us']:.1f} µs  p99 {index['unrelated_p99_us']:.1f} µs")
+    print(f"Fingerprints: SimHash of 50k chars {quality['simhash_50k_chars_ms']:.1f} ms, "
+          f"MinHash of research {quality['minhash_research_ms']:.2f} ms")
+    print(f"  re-exported copy {quality['reexported_distance_bits']} bits apart, "
+          f"different report {quality['other_report_distance_bits']} bits apart")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Offline benchmark suite
+
+Times the app's main code paths against synthetic inputs, with no network and no API keys:
+- PDF extraction (`extract_text_from_pdf`: text, statements and cleanup in the sandboxed PDF workers)
+  on synthetic annual reports (50-500 pages)
+- analysis parsing (`parse_financial_data`, `parse_amount`)
+- Sankey figure construction (`create_sankey_diagram`)
+- prompt assembly with web research (`WebResearchEnhancer.enhance_prompt`) over a fake search backend
+- a full nine-section `get_analysis` run through the real app script (AppTest) with a fake provider
+
+Results are written as JSON. With --compare, each benchmark's median is checked against a stored
+baseline and the run fails when one is slower by more than --threshold.
+
+Usage:
+    python benchmarks/suite.py                                  # run, print a table
+    python benchmarks/suite.py --output results.json            # also write JSON
+    python benchmarks/suite.py --save-baseline                  # store benchmarks/baseline.json
+    python benchmarks/suite.py --compare benchmarks/baseline.json --threshold 0.25
+    python benchmarks/suite.py --only pdf_extract --pages 50,200,500
+"""
+
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+# Keep benchmark reports, digests and output lengths out of the real store
+os.environ.setdefault("FUNDAMENTALS_STORE_DIR", tempfile.mkdtemp(prefix="fundamentals_bench_"))
+# Repeated rounds measure the uncached path; replica_cache.py measures the shared cache
+os.environ.setdefault("FUNDAMENTALS_CACHE", "off")
+
+from streamlit.logger import set_log_level
+
+# app.py is imported outside `streamlit run` for extract_text_from_pdf; its bare-mode warnings are expected
+set_log_level("error")
+
+from benchmarks.fakes import FakeProvider, FakeSearch
+from benchmarks.synthetic_pdf import synthetic_report_pdf
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_THRESHOLD = 0.25
+# Differences below this are timer noise, whatever the ratio
+NOISE_FLOOR_MS = 2.0
+
+SECTION_LABELS = [
+    "1. Quick Stats", "2. Business Overview", "3. Business Model Map", "4. The Machine", "5. Ecosystem",
+    "6. Industry Deep Dive", "7. Risk Analysis", "8. Hamilton Helmer 7 Powers", "9. Bull & Bear Cases"
+]
+SECTION_KEYS = [
+    "quick_stats", "business_overview", "business_model_map", "the_machine", "ecosystem",
+    "industry_deep_dive", "risk_analysis", "seven_powers", "bull_bear_cases"
+]
+
+
+def measure(fn: Callable[[], dict], repeats: int) -> dict:
+    """Run fn `repeats` times; fn may return extra figures (call counts) to report"""
+    timings = []
+    extra = {}
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        extra = fn() or {}
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "runs": repeats,
+        "median_ms": round(statistics.median(timings), 3),
+        "min_ms": round(min(timings), 3),
+        "max_ms": round(max(timings), 3),
+        **extra
+    }
+
+
+def bench_pdf_extract(pages: int) -> Callable[[], dict]:
+    from app import extract_text_from_pdf
+    pdf = synthetic_report_pdf(pages)
+
+    def run():
+        text = extract_text_from_pdf(io.BytesIO(pdf))
+        return {"pages": pages, "pdf_bytes": len(pdf), "text_chars": len(text)}
+    return run
+
+
+def synthetic_analysis(lines: int = 400) -> str:
+    """Business-model analysis text with revenue, cost and profit lines"""
+    rows = []
+    for i in range(lines):
+        kind = ("Revenue", "Cost of sales", "Operating expenses", "Net income")[i % 4]
+        rows.append(f"- {kind} segment {i}: ${1 + i % 50}.{i % 10} billion (up {i % 17}% year over year)")
+        rows.append("Commentary on drivers, pricing and demand across markets.")
+    return "\n".join(rows)
+
+
+def bench_parse_financial_data() -> Callable[[], dict]:
+    from visualizations import parse_financial_data
+    text = synthetic_analysis()
+
+    def run():
+        return {"revenue_lines": len(parse_financial_data(text)["revenues"])}
+    return run
+
+
+def bench_parse_amount(count: int = 5000) -> Callable[[], dict]:
+    from visualizations import parse_amount
+    samples = ["$5.2B", "$1.2 billion", "(345)", "€870m", "12,345", "$ 4.17", "1.5 trillion", "n/a"]
+    amounts = [samples[i % len(samples)] for i in range(count)]
+
+    def run():
+        for amount in amounts:
+            parse_amount(amount)
+        return {"amounts": count}
+    return run
+
+
+def bench_sankey() -> Callable[[], dict]:
+    from visualizations import create_sankey_diagram
+    revenues = [{"name": f"Segment {i}", "amount": 1000 + 150 * i} for i in range(8)]
+    costs = (
+        [{"name": "Cost of revenue", "amount": 5200, "category": "cost_of_revenue"}]
+        + [{"name": f"Operating cost {i}", "amount": 300 + 40 * i, "category": "operating"} for i in range(8)]
+        + [{"name": "Interest and taxes", "amount": 900, "category": "other"}]
+    )
+
+    def run():
+        create_sankey_diagram(revenues, costs, gross_profit=7000, operating_profit=3300, net_income=2400)
+        return {"nodes": len(revenues) + len(costs) + 4}
+    return run
+
+
+def bench_enhance_prompt(search: FakeSearch) -> Callable[[], dict]:
+    from web_research import WebResearchEnhancer
+
+    def run():
+        # A fresh enhancer per run, so every section does its searches
+        enhancer = WebResearchEnhancer("ACME Corporation")
+        before = search.queries
+        for section_key in SECTION_KEYS:
+            enhancer.enhance_prompt("Analyze the annual report.", section_key)
+        return {"search_queries": search.queries - before}
+    return run
+
+
+def bench_nine_sections(report_text: str, search: FakeSearch, provider_latency: float) -> Callable[[], dict]:
+    from streamlit.testing.v1 import AppTest
+    from report_store import get_default_store
+    from web_research import WebResearchEnhancer
+
+    report_id = get_default_store().put_text(report_text)
+    app_path = os.path.join(REPO_ROOT, "app.py")
+    runs = [0]
+
+    def run():
+        runs[0] += 1
+        provider = FakeProvider(latency=provider_latency)
+        # A distinct model per run, so each run builds its own report digest (a cold report)
+        provider.model = f"fake-model-{runs[0]}"
+        at = AppTest.from_file(app_path, default_timeout=120)
+        at.session_state["llm_provider"] = provider
+        at.session_state["report_id"] = report_id
+        at.session_state["company_name"] = "ACME Corporation"
+        at.session_state["web_researcher"] = WebResearchEnhancer("ACME Corporation")
+        at.session_state["use_web_research"] = True
+        at.session_state["analysis_complete"] = True
+        before = search.queries
+        at.run()
+        for label in SECTION_LABELS:
+            at.radio(key="section").set_value(label).run()
+        if at.exception:
+            raise RuntimeError(f"App raised: {at.exception[0].value}")
+        return {"provider_calls": provider.calls, "search_queries": search.queries - before}
+    return run
+
+
+def run_suite(pages: List[int], repeats: int, pdf_repeats: int, provider_latency: float,
+              only: List[str] = None) -> Dict[str, dict]:
+    search = FakeSearch()
+    cases = []
+    for count in pages:
+        cases.append((f"pdf_extract_{count}p", lambda count=count: bench_pdf_extract(count), pdf_repeats))
+    cases += [
+        ("parse_financial_data", bench_parse_financial_data, repeats),
+        ("parse_amount_5k", bench_parse_amount, repeats),
+        ("create_sankey_diagram", bench_sankey, repeats),
+        ("enhance_prompt_9_sections", lambda: bench_enhance_prompt(search), repeats),
+        ("get_analysis_9_sections", lambda: bench_nine_sections(_report_text(min(pages)), search, provider_latency),
+         pdf_repeats)
+    ]
+
+    results = {}
+    with search.installed():
+        for name, make, case_repeats in cases:
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            fn = make()
+            fn()  # warm-up: imports, caches
+            results[name] = measure(fn, case_repeats)
+            print(f"  {name:<28} {results[name]['median_ms']:10.1f} ms", file=sys.stderr)
+    return results
+
+
+def _report_text(pages: int) -> str:
+    from pdf_extraction import extract_pdf
+    return extract_pdf(io.BytesIO(synthetic_report_pdf(pages))).text
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[dict]:
+    """Per benchmark present in both: the relative change in median, flagged beyond the threshold"""
+    rows = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        before, after = previous["median_ms"], current["median_ms"]
+        change = (after - before) / before if before else 0.0
+        rows.append({
+            "name": name,
+            "baseline_ms": before,
+            "current_ms": after,
+            "change": round(change, 4),
+            "regression": change > threshold and after - before > NOISE_FLOOR_MS
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", default="50,500", help="Synthetic report sizes to extract (comma-separated)")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--pdf-repeats", type=int, default=3, help="Repeats for the slow cases (PDFs, full run)")
+    parser.add_argument("--provider-latency", type=float, default=0.0, help="Fake provider latency per call (s)")
+    parser.add_argument("--only", default="", help="Run benchmarks whose names start with these prefixes")
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative slowdown of the median counted as a regression (default 0.25)")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Write results to {BASELINE_FILE}")
+    args = parser.parse_args()
+
+    pages = [int(p) for p in args.pages.split(",") if p]
+    only = [p for p in args.only.split(",") if p]
+    results = run_suite(pages, args.repeats, args.pdf_repeats, args.provider_latency, only)
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeats": args.repeats,
+            "pdf_repeats": args.pdf_repeats
+        },
+        "results": results
+    }
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        report["comparison"] = compare(results, baseline, args.threshold)
+        regressions = [row for row in report["comparison"] if row["regression"]]
+
+    for path in filter(None, [args.output, BASELINE_FILE if args.save_baseline else None]):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    print(f"{'benchmark':<28}{'median ms':>12}{'min ms':>12}")
+    for name, stats in results.items():
+        print(f"{name:<28}{stats['median_ms']:>12.1f}{stats['min_ms']:>12.1f}")
+    if args.compare:
+        print(f"\nAgainst {args.compare} (threshold {args.threshold:.0%}):")
+        for row in report["comparison"]:
+            mark = "✗" if row["regression"] else "✓"
+            print(f"  {mark} {row['name']:<28} {row['baseline_ms']:10.1f} -> {row['current_ms']:10.1f} ms ({row['change']:+.1%})")
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""
+Synthetic annual-report PDFs for offline benchmarks
+
+Builds a 10-K-shaped PDF without any PDF library: a cover page, a table of contents,
+10-K items with running headers and page numbers, segment tables, and the three
+financial statements laid out in columns the way statement_extraction expects.
+
+Usage:
+    python benchmarks/synthetic_pdf.py --pages 200 --output /tmp/report.pdf
+"""
+
+import argparse
+import random
+from typing import List, Tuple
+
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+LINE_HEIGHT = 14
+BODY_LINES = 46
+HEADER = "{company} | Annual Report on Form 10-K"
+
+# (item, title, share of the body pages)
+ITEMS = [
+    ("1", "Business", 0.18),
+    ("1A", "Risk Factors", 0.16),
+    ("1B", "Unresolved Staff Comments", 0.01),
+    ("2", "Properties", 0.01),
+    ("3", "Legal Proceedings", 0.01),
+    ("5", "Market for Registrant's Common Equity", 0.02),
+    ("7", "Management's Discussion and Analysis", 0.17),
+    ("7A", "Quantitative and Qualitative Disclosures About Market Risk", 0.02),
+    ("8", "Financial Statements and Supplementary Data", 0.34),
+    ("9A", "Controls and Procedures", 0.02),
+    ("10", "Directors, Executive Officers and Corporate Governance", 0.02),
+    ("15", "Exhibits and Financial Statement Schedules", 0.04)
+]
+
+WORDS = ("volume growth customers platform margin segment operating cloud services regulatory "
+         "competition pricing supply demand subscription products markets contracts capacity "
+         "international development investment").split()
+
+# Label, 2024, 2023 (in millions)
+STATEMENTS = [
+    ("CONSOLIDATED STATEMENTS OF OPERATIONS", [
+        ("Products", "$ 28,410", "$ 26,950"), ("Services", "13,880", "12,215"),
+        ("Total net sales", "42,290", "39,165"), ("Cost of sales", "24,115", "22,870"),
+        ("Gross profit", "18,175", "16,295"), ("Research and development", "4,120", "3,870"),
+        ("Selling, general and administrative", "5,430", "5,190"), ("Total operating expenses", "9,550", "9,060"),
+        ("Operating income", "8,625", "7,235"), ("Other income (expense), net", "(215)", "140"),
+        ("Income before provision for income taxes", "8,410", "7,375"), ("Provision for income taxes", "1,680", "1,475"),
+        ("Net income", "$ 6,730", "$ 5,900"), ("Basic earnings per share", "$ 4.21", "$ 3.66"),
+        ("Diluted earnings per share", "$ 4.17", "$ 3.62")]),
+    ("CONSOLIDATED BALANCE SHEETS", [
+        ("Cash and cash equivalents", "$ 9,820", "$ 8,110"), ("Accounts receivable, net", "6,410", "5,980"),
+        ("Inventories", "3,215", "3,440"), ("Total current assets", "21,330", "19,420"),
+        ("Property, plant and equipment, net", "14,870", "13,520"), ("Goodwill", "5,610", "5,610"),
+        ("Total assets", "$ 48,920", "$ 45,160"), ("Accounts payable", "$ 5,120", "$ 4,870"),
+        ("Total current liabilities", "11,240", "10,690"), ("Long-term debt", "9,870", "10,420"),
+        ("Total liabilities", "24,510", "24,070"), ("Retained earnings", "18,260", "15,130"),
+        ("Total stockholders' equity", "24,410", "21,090"),
+        ("Total liabilities and stockholders' equity", "$ 48,920", "$ 45,160")]),
+    ("CONSOLIDATED STATEMENTS OF CASH FLOWS", [
+        ("Net income", "$ 6,730", "$ 5,900"), ("Depreciation and amortization", "2,310", "2,140"),
+        ("Changes in operating assets and liabilities", "(410)", "(220)"),
+        ("Net cash provided by operating activities", "8,630", "7,820"),
+        ("Capital expenditures", "(3,660)", "(3,210)"), ("Net cash used in investing activities", "(3,990)", "(3,540)"),
+        ("Repayments of debt", "(550)", "(500)"), ("Repurchases of common stock", "(2,380)", "(2,150)"),
+        ("Net cash used in financing activities", "(2,930)", "(2,650)"),
+        ("Net increase in cash and cash equivalents", "1,710", "1,630")])
+]
+
+Cell = Tuple[float, float, str]
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _image(size: int, rnd: random.Random) -> bytes:
+    """A grayscale image XObject of `size` incompressible bytes, standing in for a page scan"""
+    width = 1000
+    data = rnd.randbytes(width * max(1, size // width))
+    return (f"<< /Type /XObject /Subtype /Image /Width {width} /Height {len(data) // width} "
+            f"/ColorSpace /DeviceGray /BitsPerComponent 8 /Length {len(data)} >>\nstream\n").encode() + data + b"\nendstream"
+
+
+def write_pdf(pages: List[List[Cell]], title: str = "", image_bytes: int = 0, seed: int = 1) -> bytes:
+    """
+    Minimal PDF with one Helvetica text run per (x, y, text) cell
+    With `image_bytes`, each page also carries an image of that size, as scanned reports do
+    """
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    rnd = random.Random(seed)
+    for cells in pages:
+        content = "".join(
+            f"BT /F1 9 Tf 1 0 0 1 {x:g} {y:g} Tm ({_escape(text)}) Tj ET\n" for x, y, text in cells
+        ).encode("latin-1", "replace")
+        xobjects = ""
+        if image_bytes:
+            objects.append(_image(image_bytes, rnd))
+            xobjects = f"/XObject << /Im1 {len(objects)} 0 R >> "
+            content = b"q 468 0 0 600 72 100 cm /Im1 Do Q\n" + content
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 3 0 R >> {xobjects}>> /Contents {len(objects)} 0 R >>".encode()
+        )
+        kids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {len(kids)} >>".encode()
+    objects.append(f"<< /Title ({_escape(title)}) >>".encode())
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += (f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R /Info {len(objects)} 0 R >>\n"
+            f"startxref\n{xref}\n%%EOF\n").encode()
+    return bytes(out)
+
+
+def _body_line(rnd: random.Random) -> str:
+    line = " ".join(rnd.choice(WORDS) for _ in range(14))
+    if rnd.random() < 0.2:
+        line += f" of ${rnd.randint(10, 9999):,} million"
+    return line.capitalize()
+
+
+def _page(lines: List[str], number: int, header: str) -> List[Cell]:
+    """Running header, body lines and a page number footer"""
+    cells = [(72, PAGE_HEIGHT - 40, header)]
+    y = PAGE_HEIGHT - 72
+    for line in lines:
+        if line:
+            cells.append((72, y, line))
+        y -= LINE_HEIGHT
+    cells.append((PAGE_WIDTH / 2, 30, str(number)))
+    return cells
+
+
+def _table_lines(rnd: random.Random) -> List[str]:
+    """A segment table; its cells share one text run, as in many real reports"""
+    lines = ["Segment results (in millions)", "Segment 2024 2023 Change"]
+    for name in ("Devices", "Cloud", "Services", "Licensing", "Other"):
+        current, prior = rnd.randint(500, 9000), rnd.randint(500, 9000)
+        lines.append(f"{name} ${current:,} ${prior:,} {100 * (current - prior) / prior:+.1f}%")
+    return lines + [""]
+
+
+def _statement_page(title: str, rows, number: int, header: str) -> List[Cell]:
+    cells = [(72, PAGE_HEIGHT - 40, header), (72, 740, title),
+             (72, 726, "(in millions, except per share amounts)"), (400, 712, "2024"), (480, 712, "2023")]
+    y = 696
+    for label, current, prior in rows:
+        cells += [(72, y, label), (400, y, current), (480, y, prior)]
+        y -= LINE_HEIGHT
+    cells.append((PAGE_WIDTH / 2, 30, str(number)))
+    return cells
+
+
+def synthetic_report_pdf(pages: int = 100, seed: int = 1, company: str = "ACME Corporation",
+                         image_bytes: int = 0) -> bytes:
+    """A 10-K-shaped PDF of exactly `pages` pages (at least 10), optionally with a scan image per page"""
+    rnd = random.Random(seed)
+    header = HEADER.format(company=company.upper())
+    pages = max(10, pages)
+    body_pages = pages - 2 - len(STATEMENTS)
+    counts = [max(1, round(body_pages * share)) for _, _, share in ITEMS]
+    # Absorb rounding in the largest item
+    counts[ITEMS.index(max(ITEMS, key=lambda entry: entry[2]))] += body_pages - sum(counts)
+
+    output = [[(200, 640, "ANNUAL REPORT ON FORM 10-K"), (200, 620, "For the fiscal year ended December 31, 2024"),
+               (200, 580, company.upper()), (200, 566, "(Exact name of registrant as specified in its charter)")]]
+    toc = ["Table of Contents", ""] + [
+        f"Item {item}. {title} {'.' * 10} {3 + i * 7}" for i, (item, title, _) in enumerate(ITEMS)
+    ]
+    output.append(_page(toc, 2, header))
+
+    for (item, title, _), count in zip(ITEMS, counts):
+        for page in range(count):
+            lines = [f"Item {item}. {title}", ""] if page == 0 else []
+            if item in ("7", "8") and page % 4 == 1:
+                lines += _table_lines(rnd)
+            while len(lines) < BODY_LINES:
+                lines.append(_body_line(rnd) if len(lines) % 8 else "")
+            output.append(_page(lines, len(output) + 1, header))
+        if item == "8":
+            for statement_title, rows in STATEMENTS:
+                output.append(_statement_page(statement_title, rows, len(output) + 1, header))
+
+    return write_pdf(output, title=f"{company} 2024 Annual Report", image_bytes=image_bytes, seed=seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic annual-report PDF")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--company", default="ACME Corporation")
+    parser.add_argument("--image-kb", type=int, default=0, help="Scan image size per page (KB)")
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+    with open(args.output, "wb") as f:
+        f.write(synthetic_report_pdf(args.pages, args.seed, args.company, args.image_kb * 1024))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Peak memory of one report upload
+
+Uploads a large synthetic scanned-style PDF through the real app (AppTest), clicks
+"Analyze Report", and reports how much the server process's peak RSS grew while the upload
+was ingested, the peak RSS of any parser worker processes, and the upload wall time. A second
+session then uploads the same file, to time a repeat upload.
+
+Each app runs in a fresh process, so peak RSS starts clean. Point --app at another checkout's
+app.py to compare before and after a change.
+
+Usage:
+    python benchmarks/upload_memory.py [--pages 200] [--image-kb 300] [--app path/to/older/app.py] [--json]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO_ROOT, "app.py")
+
+
+def _peak_mb(who) -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return round(resource.getrusage(who).ru_maxrss / 1024, 1)
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20, 1)
+
+
+def measure_upload(app_path: str, pdf_path: str) -> dict:
+    """Runs in a child process with `app_path`'s checkout first on sys.path"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(app_path)))
+    os.environ.setdefault("FUNDAMENTALS_STORE_DIR", tempfile.mkdtemp(prefix="fundamentals_bench_"))
+    os.environ.setdefault("FUNDAMENTALS_UPLOAD_DIR", tempfile.mkdtemp(prefix="fundamentals_uploads_"))
+
+    from streamlit.logger import set_log_level
+    from streamlit.testing.v1 import AppTest
+    from benchmarks.fakes import FakeProvider
+    set_log_level("error")
+
+    with open(pdf_path, "rb") as f:
+        pdf = f.read()
+
+    def upload(session: int) -> float:
+        at = AppTest.from_file(app_path, default_timeout=600)
+        at.session_state["llm_provider"] = FakeProvider()
+        at.run()
+        at.sidebar.file_uploader[0].set_value((f"report-{session}.pdf", pdf, "application/pdf"))
+        at.run()
+        analyze = next(b for b in at.sidebar.button if b.label.startswith("🔍"))
+        start = time.perf_counter()
+        analyze.click().run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+        return time.perf_counter() - start
+
+    # Warm up imports and the app: one run, no upload
+    warm = AppTest.from_file(app_path, default_timeout=600)
+    warm.session_state["llm_provider"] = FakeProvider()
+    warm.run()
+    rss_before = _rss_mb()
+    peak_before = _peak_mb(resource.RUSAGE_SELF)
+
+    first = upload(1)
+    peak_after = _peak_mb(resource.RUSAGE_SELF)
+    repeat = upload(2)
+
+    try:
+        from pdf_workers import get_pdf_workers
+        get_pdf_workers().close()  # workers must exit to be counted in RUSAGE_CHILDREN
+    except ImportError:
+        pass
+
+    return {
+        "app": os.path.abspath(app_path),
+        "pdf_mb": round(len(pdf) / 2 ** 20, 1),
+        "rss_before_mb": rss_before,
+        "peak_before_mb": peak_before,
+        "peak_after_mb": peak_after,
+        "peak_growth_mb": round(peak_after - peak_before, 1),
+        "worker_peak_mb": _peak_mb(resource.RUSAGE_CHILDREN),
+        "upload_seconds": round(first, 2),
+        "repeat_upload_seconds": round(repeat, 2)
+    }
+
+
+def run_child(app_path: str, pdf_path: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", "--app", app_path, "--pdf", pdf_path],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--image-kb", type=int, default=300, help="Scan image size per page (KB)")
+    parser.add_argument("--app", action="append", help="app.py to measure (repeatable; default: this checkout)")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--pdf", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure_upload(args.app[0], args.pdf)))
+        return
+
+    sys.path.insert(0, REPO_ROOT)
+    from benchmarks.synthetic_pdf import synthetic_report_pdf
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        f.write(synthetic_report_pdf(args.pages, image_bytes=args.image_kb * 1024))
+    try:
+        results = [run_child(os.path.abspath(app), f.name) for app in (args.app or [APP_PATH])]
+    finally:
+        os.remove(f.name)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"PDF: {results[0]['pdf_mb']} MB, {args.pages} pages\n")
+    print(f"{'app':<40}{'peak growth MB':>16}{'worker peak MB':>16}{'upload s':>10}{'repeat s':>10}")
+    for r in results:
+        print(f"{r['app'][-40:]:<40}{r['peak_growth_mb']:>16.1f}{r['worker_peak_mb']:>16.1f}"
+              f"{r['upload_seconds']:>10.2f}{r['repeat_upload_seconds']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Watchlist warm-up: what it warms first, what it spends, and what the first analyst then waits for
+
+Builds a watchlist of N synthetic filings with uneven usage, then runs the warm-up once
+(fake provider on a metered key with a daily token budget, fake search with latency). The
+warm-up keeps half of that budget for interactive use, so only the most-used companies are
+warmed. Afterwards an interactive session uploads a warmed filing and a cold one and visits all
+nine sections, counting provider calls and searches. Each phase runs in its own process,
+sharing only the report store and the bundle library on disk.
+
+Usage:
+    python benchmarks/watchlist_warmup.py [--companies 8] [--key-tokens-per-day 200000] [--json]
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.replica_cache import SECTION_LABELS
+
+APP_PATH = os.path.join(REPO_ROOT, "app.py")
+
+
+def metered_provider():
+    """Fake provider that counts against a paid key's budgets, like the real ones"""
+    from benchmarks.fakes import FakeProvider
+    provider = FakeProvider(latency=0.05, response="Fake analysis. " * 60)
+    provider.budget_group = "groq"
+    provider.api_key = "benchmark-key"
+    return provider
+
+
+def warm(watchlist: str, search_latency: float) -> dict:
+    from benchmarks.fakes import FakeSearch
+    from watchlist_warmup import WarmupScheduler, load_watchlist
+
+    provider = metered_provider()
+    search = FakeSearch(latency=search_latency)
+    with search.installed():
+        scheduler = WarmupScheduler(provider, searches_per_minute=0)
+        entries = load_watchlist(watchlist)
+        order = [entry.company_name for _, entry in scheduler.queue(entries)]
+        report = scheduler.run(entries)
+    return {"queue": order, "warmed": report.warmed, "stopped": report.stopped, "provider_calls": provider.calls,
+            "search_queries": search.queries, "seconds": round(report.seconds, 2), "summary": report.summary()}
+
+
+def interactive(filing: str) -> dict:
+    from streamlit.logger import set_log_level
+    from streamlit.testing.v1 import AppTest
+    from benchmarks.fakes import FakeProvider, FakeSearch
+    set_log_level("error")
+
+    with open(filing, "rb") as f:
+        data = f.read()
+    provider = FakeProvider(latency=0.05)
+    search = FakeSearch(latency=0.05)
+    start = time.perf_counter()
+    with search.installed():
+        at = AppTest.from_file(APP_PATH, default_timeout=600)
+        at.session_state["llm_provider"] = provider
+        at.run()
+        at.sidebar.file_uploader[0].set_value((os.path.basename(filing), data, "application/pdf"))
+        at.run()
+        next(b for b in at.sidebar.button if b.label.startswith("🔍")).click().run()
+        for label in SECTION_LABELS:
+            at.radio(key="section").set_value(label).run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return {"provider_calls": provider.calls, "search_queries": search.queries,
+            "seconds": round(time.perf_counter() - start, 2)}
+
+
+def run_process(role: str, env: dict, *extra) -> dict:
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), f"--{role}", *extra],
+                            env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--companies", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--key-tokens-per-day", type=int, default=200000)
+    parser.add_argument("--search-latency", type=float, default=0.05, help="Fake search latency per query (s)")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--warm", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--interactive", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.warm:
+        print(json.dumps(warm(args.path, args.search_latency)))
+        return
+    if args.interactive:
+        print(json.dumps(interactive(args.path)))
+        return
+
+    from benchmarks.synthetic_pdf import synthetic_report_pdf
+
+    workdir = tempfile.mkdtemp(prefix="fundamentals_warmup_")
+    env = dict(os.environ,
+               FUNDAMENTALS_CACHE="off",
+               FUNDAMENTALS_STORE_DIR=os.path.join(workdir, "store"),
+               FUNDAMENTALS_UPLOAD_DIR=os.path.join(workdir, "uploads"),
+               FUNDAMENTALS_KEY_TOKENS_PER_DAY=str(args.key_tokens_per_day),
+               FUNDAMENTALS_GROQ_TOKENS_PER_MINUTE="0",
+               FUNDAMENTALS_GROQ_TOKENS_PER_DAY="0")
+    os.environ.update(env)
+    from watchlist_warmup import UsageLog
+
+    # Uneven usage, unrelated to the watchlist order
+    rnd = random.Random(11)
+    usage = UsageLog()
+    watchlist = os.path.join(workdir, "watchlist.csv")
+    companies = []
+    with open(watchlist, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["company", "filing"])
+        for i in range(args.companies):
+            company = f"Watchlist Company {i + 1:02d} Inc"
+            filing = f"filing_{i + 1:02d}.pdf"
+            with open(os.path.join(workdir, filing), "wb") as pdf:
+                pdf.write(synthetic_report_pdf(args.pages, seed=100 + i, company=company))
+            writer.writerow([company, filing])
+            companies.append((company, filing))
+            for _ in range(rnd.randint(0, 20)):
+                usage.record(company)
+
+    warmed = run_process("warm", env, "--path", watchlist, "--search-latency", str(args.search_latency))
+    done = dict(warmed["warmed"])
+    # A company the budget stopped partway through is neither warm nor cold
+    hot = next((filing for company, filing in companies if done.get(company) == 9), None)
+    cold = next((filing for company, filing in companies if company not in done), None)
+    results = {
+        "warmup": warmed,
+        "usage": {company: round(usage.frequency(company), 1) for company, _ in companies},
+        "warmed_filing": run_process("interactive", env, "--path", os.path.join(workdir, hot)) if hot else None,
+        "cold_filing": run_process("interactive", env, "--path", os.path.join(workdir, cold)) if cold else None
+    }
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print("Warm-up order (most used and stalest first):")
+    for company in warmed["queue"]:
+        done = dict(warmed["warmed"]).get(company)
+        status = f"warmed, {done}/9 sections" if done else "not reached"
+        print(f"  {company}  usage {results['usage'][company]:>4.1f}  {status}")
+    print(warmed["summary"])
+    print(f"  {warmed['provider_calls']} LLM calls, {warmed['search_queries']} searches")
+    for label, key in (("warmed", "warmed_filing"), ("cold", "cold_filing")):
+        session = results[key]
+        if session:
+            print(f"First open of a {label} filing: {session['provider_calls']} LLM calls, "
+                  f"{session['search_queries']} searches, {session['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
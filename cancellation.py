@@ -0,0 +1,151 @@
+"""
+Cooperative cancellation for per-session work
+Analysis jobs (web research plus the provider call) carry a token tied to the session and
+report. Navigating away or uploading a new report cancels it; long-running steps check the
+token between units of work (search requests, streamed chunks) and abort with CancelledError.
+"""
+
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Set
+
+from metrics import METRICS
+
+# Cancellation reasons
+RERUN = "rerun"            # the user navigated or changed an input while work was running
+REUPLOAD = "re-upload"     # a new report replaced the one the work was for
+SESSION_END = "session-end"
+
+# A provider answer that completes after cancellation is still kept for these reasons
+# (the user may come back to the section); work for a replaced report is discarded
+KEEP_COMPLETED_ON = {RERUN}
+
+MAX_WORKERS = 16
+
+
+class CancelledError(Exception):
+    """Raised inside cancelled work at its next checkpoint"""
+
+    def __init__(self, reason: str = ""):
+        super().__init__(f"cancelled ({reason})" if reason else "cancelled")
+        self.reason = reason
+
+
+class CancellationToken:
+    """Cancellation flag for one unit of session work"""
+
+    def __init__(self, session_id: str = "", report_id: Optional[str] = None, label: str = ""):
+        self.session_id = session_id
+        self.report_id = report_id
+        self.label = label
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str) -> bool:
+        """Cancel once; returns False if it was already cancelled"""
+        if self._event.is_set():
+            return False
+        self.reason = reason
+        self._event.set()
+        METRICS.increment(f"cancellations.{reason}")
+        return True
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise CancelledError(self.reason or "")
+
+    def keep_completed(self) -> bool:
+        """Whether a result that finished despite cancellation should still be cached"""
+        return not self.cancelled or self.reason in KEEP_COMPLETED_ON
+
+
+_current_token: contextvars.ContextVar = contextvars.ContextVar("cancellation_token", default=None)
+
+
+def current_token() -> Optional[CancellationToken]:
+    """Token of the work running on this thread, if any"""
+    return _current_token.get()
+
+
+def checkpoint():
+    """Abort here if the current work has been cancelled"""
+    token = _current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+class CancellationRegistry:
+    """Active tokens per session, and the worker pool that runs cancellable jobs"""
+
+    def __init__(self, max_workers: int = MAX_WORKERS):
+        self._lock = threading.Lock()
+        self._active: Dict[str, Set[CancellationToken]] = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis")
+
+    def begin(self, session_id: str, report_id: Optional[str], label: str = "") -> CancellationToken:
+        """
+        Start tracked work for a session
+        Work still registered for an older report of the same session is cancelled
+        """
+        token = CancellationToken(session_id, report_id, label)
+        with self._lock:
+            active = self._active.setdefault(session_id, set())
+            stale = [t for t in active if t.report_id != report_id]
+            active.difference_update(stale)
+            active.add(token)
+        for old in stale:
+            old.cancel(REUPLOAD)
+        return token
+
+    def finish(self, token: CancellationToken):
+        with self._lock:
+            active = self._active.get(token.session_id)
+            if active is not None:
+                active.discard(token)
+                if not active:
+                    del self._active[token.session_id]
+
+    def cancel_session(self, session_id: str, reason: str) -> int:
+        """Cancel everything a session has running; returns how many tokens were cancelled"""
+        with self._lock:
+            tokens = self._active.pop(session_id, set())
+        return sum(1 for token in tokens if token.cancel(reason))
+
+    def submit(self, token: CancellationToken, fn: Callable, *args, **kwargs) -> Future:
+        """Run fn on the worker pool with `token` as the current token"""
+        def run():
+            # Pool threads are reused, so the token is reset once the job ends
+            context_token = _current_token.set(token)
+            try:
+                token.raise_if_cancelled()
+                return fn(*args, **kwargs)
+            except CancelledError:
+                METRICS.increment("cancellations.aborted")
+                raise
+            finally:
+                _current_token.reset(context_token)
+                self.finish(token)
+        return self._executor.submit(run)
+
+    def active(self) -> int:
+        with self._lock:
+            return sum(len(tokens) for tokens in self._active.values())
+
+
+_registry: Optional[CancellationRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_cancellations() -> CancellationRegistry:
+    """Process-wide cancellation registry"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = CancellationRegistry()
+    return _registry
@@ -0,0 +1,140 @@
+"""
+Fast local identification of the reporting company
+Looks at the 10-K cover page, document metadata and frequently mentioned legal entity names
+in the first pages of the report, so the LLM is only asked when these signals are weak
+"""
+
+import re
+from collections import Counter
+from typing import Dict, Optional
+
+from report_store import company_key
+
+# Only the opening pages are scanned; the cover page and first mentions live there
+HEAD_CHARS = 20000
+
+# Below this, callers should fall back to asking the LLM
+CONFIDENCE_THRESHOLD = 0.6
+
+COVER_PAGE_PATTERN = re.compile(
+    r'\(?\s*exact\s+name\s+of\s+(?:the\s+)?registrants?\s+as\s+specified\s+in\s+(?:its|their)\s+charters?',
+    re.IGNORECASE
+)
+
+_SUFFIX = r'Inc\.?|Incorporated|Corporation|Corp\.?|Company|Co\.|plc|PLC|P\.L\.C\.|Ltd\.?|Limited|L\.P\.|LLC|N\.V\.|S\.A\.|SE|AG|Holdings'
+ENTITY_PATTERN = re.compile(
+    rf"(?<![\w\-.])((?:[A-Z][\w&'.\-]*,?\s+){{1,5}}?(?:{_SUFFIX}))(?![\w])"
+)
+
+LEADING_WORDS = {"the", "by", "and", "of", "for", "to", "in", "at", "with", "from"}
+# Capitalized words that begin sentences or headings rather than company names
+NOT_NAMES = {"Form", "Annual", "Report", "Item", "Part", "Securities", "Exchange", "Commission", "United", "States"}
+KEEP_UPPER = {"AG", "SE", "PLC", "LLC", "N.V.", "S.A.", "L.P.", "P.L.C."}
+
+
+class CompanyGuess:
+    """A company name with how much to trust it and where it came from"""
+
+    def __init__(self, name: Optional[str], confidence: float, source: str):
+        self.name = name
+        self.confidence = confidence
+        self.source = source
+
+    @property
+    def confident(self) -> bool:
+        return bool(self.name) and self.confidence >= CONFIDENCE_THRESHOLD
+
+    def __repr__(self):
+        return f"CompanyGuess({self.name!r}, {self.confidence:.2f}, {self.source!r})"
+
+
+def clean_name(name: str) -> str:
+    """Tidy whitespace and punctuation; convert ALL-CAPS cover-page names to title case"""
+    name = " ".join(name.replace("’", "'").split()).strip(" ,;:-–—")
+    words = name.split(" ")
+    while len(words) > 1 and words[0].lower() in LEADING_WORDS and words[0].lower() != "the":
+        words = words[1:]
+    if name.isupper():
+        words = [
+            w if w in KEEP_UPPER or "&" in w or any(ch.isdigit() for ch in w) else w.capitalize()
+            for w in words
+        ]
+    return " ".join(words)
+
+
+def from_cover_page(text: str) -> Optional[CompanyGuess]:
+    """Name printed just above "(Exact name of registrant as specified in its charter)" """
+    match = COVER_PAGE_PATTERN.search(text)
+    if not match:
+        return None
+    before = text[max(0, match.start() - 300):match.start()]
+    lines = [line.strip() for line in before.splitlines() if line.strip()]
+    if not lines:
+        return None
+    name = lines[-1]
+    # Commission file numbers and similar cover-page fields sometimes precede the name on its line
+    name = re.sub(r'^.*?(?:File\s+Number|No\.)\s*[\d\-]+\s*', '', name, flags=re.IGNORECASE)
+    name = clean_name(name)
+    if not (2 <= len(name) <= 100) or not re.search(r'[A-Za-z]', name):
+        return None
+    return CompanyGuess(name, 0.95, "cover page")
+
+
+def _entity_names(text: str) -> Counter:
+    counts = Counter()
+    for match in ENTITY_PATTERN.finditer(text):
+        name = clean_name(match.group(1))
+        words = name.split(" ")
+        if words[0] in NOT_NAMES or len(words) < 2:
+            continue
+        counts[name] += 1
+    return counts
+
+
+def from_entity_mentions(text: str) -> Optional[CompanyGuess]:
+    """Most frequent "Xyz Inc." / "Xyz Corporation" / "Xyz plc" style name"""
+    counts = _entity_names(text)
+    if not counts:
+        return None
+    name, count = counts.most_common(1)[0]
+    share = count / sum(counts.values())
+    confidence = 0.5 * share + min(0.35, 0.05 * count)
+    return CompanyGuess(name, round(confidence, 2), "entity mentions")
+
+
+def from_metadata(metadata: Optional[Dict[str, str]]) -> Optional[CompanyGuess]:
+    """Legal entity name in the document title, author or subject"""
+    for field in ("title", "author", "subject"):
+        value = (metadata or {}).get(field) or ""
+        match = ENTITY_PATTERN.search(value)
+        if match:
+            name = clean_name(match.group(1))
+            if name.split(" ")[0] not in NOT_NAMES:
+                return CompanyGuess(name, 0.7, f"document {field}")
+    return None
+
+
+def identify_company(text: str, metadata: Optional[Dict[str, str]] = None,
+                     tagged_name: Optional[str] = None) -> CompanyGuess:
+    """
+    Best local guess at the reporting company
+
+    Args:
+        text: Report text; only the first HEAD_CHARS characters are scanned
+        metadata: Document metadata (title, author, subject), e.g. from the PDF info dictionary
+        tagged_name: Registrant name tagged in an inline XBRL filing (dei:EntityRegistrantName)
+    """
+    if tagged_name:
+        return CompanyGuess(clean_name(tagged_name), 0.99, "inline XBRL")
+
+    head = (text or "")[:HEAD_CHARS]
+    guesses = [g for g in (from_cover_page(head), from_metadata(metadata), from_entity_mentions(head)) if g]
+    if not guesses:
+        return CompanyGuess(None, 0.0, "none")
+
+    # Independent signals naming the same company reinforce each other
+    best = max(guesses, key=lambda g: g.confidence)
+    agreeing = [g for g in guesses if company_key(g.name) == company_key(best.name)]
+    if len(agreeing) > 1:
+        best = CompanyGuess(best.name, min(0.99, best.confidence + 0.1 * (len(agreeing) - 1)), best.source)
+    return best
@@ -0,0 +1,177 @@
+"""
+Structured financial extraction for the Business Model Map
+The business-model prompt asks the LLM for a JSON block following BUSINESS_MODEL_SCHEMA;
+this module pulls that block out of the response, validates it and converts it to typed arrays
+"""
+
+import json
+import re
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from amount_normalization import normalize_amount
+
+BUSINESS_MODEL_SCHEMA = """{
+  "currency": "USD",
+  "unit": "millions",
+  "revenue_segments": [{"name": "Segment name", "amount": 1234.5}],
+  "costs": [{"name": "Cost line", "amount": 567.8, "category": "cost_of_revenue | operating | other | other_income"}],
+  "total_revenue": 1234.5,
+  "gross_profit": 666.7,
+  "operating_profit": 300.0,
+  "net_income": 210.0
+}"""
+
+JSON_INSTRUCTIONS = f"""
+At the END of your response, add a JSON code block (```json ... ```) with the numbers above,
+following exactly this schema (use null for anything not disclosed, plain numbers without
+currency symbols or commas, all amounts in the same unit):
+
+{BUSINESS_MODEL_SCHEMA}
+
+Cost categories: "cost_of_revenue" for COGS / cost of sales, "operating" for SG&A, R&D,
+depreciation and other operating expenses, "other" for interest, taxes and non-operating items,
+"other_income" for non-operating items that add to income (interest income, gains, tax benefits)."""
+
+COST_CATEGORIES = ("cost_of_revenue", "operating", "other", "other_income")
+
+# Declared "unit" values mapped to amount_normalization units
+DECLARED_UNITS = {
+    "units": "units", "ones": "units", "dollars": "units",
+    "thousands": "thousands", "thousand": "thousands",
+    "millions": "millions", "million": "millions",
+    "billions": "billions", "billion": "billions"
+}
+
+FENCED_JSON = re.compile(r'```(?:json)?\s*(\{.*?\})\s*```', re.DOTALL | re.IGNORECASE)
+
+
+class BusinessModelData:
+    """Validated revenue segments, cost lines and profit levels, amounts in millions"""
+
+    def __init__(self, segment_names: Tuple[str, ...], segment_amounts: np.ndarray,
+                 cost_names: Tuple[str, ...], cost_categories: Tuple[str, ...], cost_amounts: np.ndarray,
+                 total_revenue: float, gross_profit: Optional[float] = None,
+                 operating_profit: Optional[float] = None, net_income: Optional[float] = None,
+                 currency: str = "USD"):
+        self.segment_names = segment_names
+        self.segment_amounts = segment_amounts
+        self.cost_names = cost_names
+        self.cost_categories = cost_categories
+        self.cost_amounts = cost_amounts
+        self.total_revenue = total_revenue
+        self.gross_profit = gross_profit
+        self.operating_profit = operating_profit
+        self.net_income = net_income
+        self.currency = currency
+
+    def revenues(self) -> List[dict]:
+        """Revenue segments in the format create_sankey_diagram expects"""
+        return [{"name": n, "amount": float(a)} for n, a in zip(self.segment_names, self.segment_amounts)]
+
+    def costs(self) -> List[dict]:
+        return [
+            {"name": n, "amount": float(a), "category": c}
+            for n, c, a in zip(self.cost_names, self.cost_categories, self.cost_amounts)
+        ]
+
+    def profits(self) -> dict:
+        return {
+            "gross_profit": self.gross_profit,
+            "operating_profit": self.operating_profit,
+            "net_income": self.net_income
+        }
+
+
+def extract_json_block(text: str) -> Optional[str]:
+    """Return the last JSON object in the response, fenced or bare"""
+    fenced = FENCED_JSON.findall(text)
+    if fenced:
+        return fenced[-1]
+
+    # Bare JSON: scan back from the last closing brace to its matching opening brace
+    end = text.rfind("}")
+    depth = 0
+    for i in range(end, -1, -1):
+        if text[i] == "}":
+            depth += 1
+        elif text[i] == "{":
+            depth -= 1
+            if depth == 0:
+                return text[i:end + 1]
+    return None
+
+
+def strip_json_block(text: str) -> str:
+    """Response text without the machine-readable JSON block, for display"""
+    return FENCED_JSON.sub("", text).rstrip()
+
+
+def _amount(value, unit: str) -> Optional[float]:
+    """Amount in millions; a scale in the value itself ("1.2 billion") overrides the declared unit"""
+    if value is None or isinstance(value, bool):
+        return None
+    return normalize_amount(value, unit="millions", default_unit=unit)
+
+
+def parse_business_model(text: str) -> Optional[BusinessModelData]:
+    """
+    Parse and validate the JSON block of a business-model response
+    Returns None when there is no usable block (the caller falls back to the sample diagram)
+    """
+    block = extract_json_block(text or "")
+    if not block:
+        return None
+    try:
+        raw = json.loads(block)
+    except ValueError:
+        return None
+    if not isinstance(raw, dict):
+        return None
+
+    unit = DECLARED_UNITS.get(str(raw.get("unit") or "millions").lower().strip(), "millions")
+
+    segments = []
+    for item in raw.get("revenue_segments") or []:
+        if isinstance(item, dict):
+            amount = _amount(item.get("amount"), unit)
+            if amount is not None and amount > 0:
+                segments.append((str(item.get("name") or "Revenue").strip(), amount))
+
+    costs = []
+    for item in raw.get("costs") or []:
+        if isinstance(item, dict):
+            amount = _amount(item.get("amount"), unit)
+            if amount is not None and amount != 0:
+                category = str(item.get("category") or "operating").strip().lower()
+                if category not in COST_CATEGORIES:
+                    category = "operating"
+                costs.append((str(item.get("name") or "Cost").strip(), category, abs(amount)))
+
+    total_revenue = _amount(raw.get("total_revenue"), unit)
+    if not segments and total_revenue and total_revenue > 0:
+        segments = [("Revenue", total_revenue)]
+    if not segments:
+        return None
+    if not total_revenue or total_revenue <= 0:
+        total_revenue = sum(amount for _, amount in segments)
+
+    gross_profit = _amount(raw.get("gross_profit"), unit)
+    if gross_profit is None:
+        cost_of_revenue = sum(a for _, c, a in costs if c == "cost_of_revenue")
+        if cost_of_revenue:
+            gross_profit = total_revenue - cost_of_revenue
+
+    return BusinessModelData(
+        segment_names=tuple(name for name, _ in segments),
+        segment_amounts=np.array([amount for _, amount in segments], dtype=np.float64),
+        cost_names=tuple(name for name, _, _ in costs),
+        cost_categories=tuple(category for _, category, _ in costs),
+        cost_amounts=np.array([amount for _, _, amount in costs], dtype=np.float64),
+        total_revenue=float(total_revenue),
+        gross_profit=gross_profit,
+        operating_profit=_amount(raw.get("operating_profit"), unit),
+        net_income=_amount(raw.get("net_income"), unit),
+        currency=str(raw.get("currency") or "USD")
+    )
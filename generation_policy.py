@@ -0,0 +1,158 @@
+"""
+Per-section generation policies (output token budget, temperature, stop sequences)
+Budgets start from per-section defaults and adapt to the output lengths actually measured
+for each section, so short sections stop reserving (and waiting on) large output budgets
+"""
+
+import json
+import math
+import os
+import threading
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+from report_store import DEFAULT_STORE_DIR
+
+# Rough characters-per-token ratio for English prose, used to size outputs without a tokenizer
+CHARS_PER_TOKEN = 4
+
+MIN_OUTPUT_TOKENS = 128
+MAX_OUTPUT_TOKENS = 4096
+# Measured budgets need this many samples, and leave this much headroom over the p95 length
+MIN_SAMPLES = 5
+HEADROOM = 1.3
+SAMPLES_KEPT = 50
+
+
+class GenerationPolicy:
+    """How much and how a provider should generate for one request"""
+
+    def __init__(self, max_tokens: int = 2048, temperature: float = 0.3,
+                 stop: Tuple[str, ...] = (), prompt_suffix: str = ""):
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.stop = tuple(stop)
+        # Appended to the prompt, e.g. to make a stop sequence safe to apply
+        self.prompt_suffix = prompt_suffix
+
+    def with_max_tokens(self, max_tokens: int) -> "GenerationPolicy":
+        return GenerationPolicy(max_tokens, self.temperature, self.stop, self.prompt_suffix)
+
+    def key(self) -> str:
+        """Stable identity for request deduplication"""
+        return f"{self.max_tokens}|{self.temperature}|{'|'.join(self.stop)}|{self.prompt_suffix}"
+
+    def __repr__(self):
+        return f"GenerationPolicy(max_tokens={self.max_tokens}, temperature={self.temperature}, stop={self.stop!r})"
+
+
+# Starting points before any outputs have been measured
+SECTION_POLICIES: Dict[str, GenerationPolicy] = {
+    "quick_stats": GenerationPolicy(200, 0.1, stop=("\n\n",),
+                                    prompt_suffix="\n\nReply with that single line only, no preamble."),
+    "business_overview": GenerationPolicy(1200),
+    "business_model_map": GenerationPolicy(1600),
+    "the_machine": GenerationPolicy(1500),
+    "ecosystem": GenerationPolicy(1500),
+    "industry_deep_dive": GenerationPolicy(1500),
+    "risk_analysis": GenerationPolicy(1500),
+    "seven_powers": GenerationPolicy(2500),
+    "bull_bear_cases": GenerationPolicy(2000)
+}
+DEFAULT_POLICY = GenerationPolicy(2048)
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+class OutputLengths:
+    """
+    Measured output lengths per section, persisted next to the report store
+    Also tracks how many output tokens were reserved compared with the providers' fixed budgets
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(DEFAULT_STORE_DIR, "output_lengths.json")
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = {}
+        self._truncated: Dict[str, deque] = {}
+        self._reserved = 0
+        self._legacy_reserved = 0
+        self._output_tokens = 0
+        self._calls = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        for section_key, samples in saved.items():
+            self._samples[section_key] = deque(samples, maxlen=SAMPLES_KEPT)
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({key: list(samples) for key, samples in self._samples.items()}, f)
+        os.replace(tmp_path, self.path)
+
+    def policy_for(self, section_key: str) -> GenerationPolicy:
+        """Section default, with max_tokens re-derived from measured lengths once there are enough"""
+        base = SECTION_POLICIES.get(section_key, DEFAULT_POLICY)
+        with self._lock:
+            samples = sorted(self._samples.get(section_key, ()))
+            truncated = sum(self._truncated.get(section_key, ()))
+        if len(samples) < MIN_SAMPLES:
+            return base
+        p95 = samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+        budget = int(p95 * HEADROOM)
+        if truncated:
+            # Recent answers ran into the limit: grow rather than trust the (clipped) lengths
+            budget = max(budget, int(base.max_tokens * 1.5))
+        budget = int(math.ceil(budget / 64) * 64)
+        return base.with_max_tokens(max(MIN_OUTPUT_TOKENS, min(MAX_OUTPUT_TOKENS, budget)))
+
+    def record(self, section_key: str, output: str, policy: GenerationPolicy, legacy_max_tokens: int):
+        """Record one generated answer and the budget it was given"""
+        tokens = estimate_tokens(output)
+        with self._lock:
+            self._samples.setdefault(section_key, deque(maxlen=SAMPLES_KEPT)).append(tokens)
+            self._truncated.setdefault(section_key, deque(maxlen=10)).append(tokens >= 0.95 * policy.max_tokens)
+            self._calls += 1
+            self._reserved += policy.max_tokens
+            self._legacy_reserved += legacy_max_tokens
+            self._output_tokens += tokens
+            try:
+                self._save()
+            except OSError:
+                pass
+
+    def savings(self) -> dict:
+        """Output tokens reserved under the policies versus the old fixed budgets"""
+        with self._lock:
+            saved = self._legacy_reserved - self._reserved
+            return {
+                "calls": self._calls,
+                "reserved_tokens": self._reserved,
+                "legacy_reserved_tokens": self._legacy_reserved,
+                "saved_tokens": saved,
+                "saved_share": saved / self._legacy_reserved if self._legacy_reserved else 0.0,
+                "output_tokens": self._output_tokens
+            }
+
+
+_output_lengths: Optional[OutputLengths] = None
+_output_lengths_lock = threading.Lock()
+
+
+def get_output_lengths() -> OutputLengths:
+    """Process-wide output length recorder"""
+    global _output_lengths
+    if _output_lengths is None:
+        with _output_lengths_lock:
+            if _output_lengths is None:
+                _output_lengths = OutputLengths()
+    return _output_lengths
@@ -0,0 +1,377 @@
+"""
+Inline XBRL / HTML 10-K ingestion
+Stream-parses an .htm/.html/.xhtml filing with an incremental HTML parser (no DOM is built),
+producing the narrative text and a typed table of the tagged ix:nonFraction facts
+"""
+
+import codecs
+import io
+import re
+from collections import Counter
+from datetime import date
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from statement_extraction import StatementTable, INCOME_STATEMENT, BALANCE_SHEET, CASH_FLOW
+
+CHUNK_SIZE = 64 * 1024
+
+# Tags whose content is never narrative text
+SKIP_TAGS = {"script", "style", "head", "title", "ix:header"}
+# Tags that start a new line in the extracted text
+BLOCK_TAGS = {
+    "p", "div", "br", "tr", "li", "ul", "ol", "table", "h1", "h2", "h3", "h4", "h5", "h6",
+    "section", "article", "header", "footer", "hr", "blockquote", "pre"
+}
+CELL_TAGS = {"td", "th"}
+
+# Cover-page (dei) facts worth keeping from ix:nonNumeric
+DEI_FACTS = {
+    "dei:entityregistrantname", "dei:tradingsymbol", "dei:documentfiscalyearfocus",
+    "dei:documenttype", "dei:documentperiodenddate", "dei:entitycentralindexkey"
+}
+
+# Statement line items built from tagged facts; labels match statement_extraction.LINE_ITEMS
+FACT_LINE_ITEMS = [
+    (INCOME_STATEMENT, "Total revenues", ("us-gaap:Revenues", "us-gaap:RevenueFromContractWithCustomerExcludingAssessedTax", "us-gaap:SalesRevenueNet", "us-gaap:RevenuesNetOfInterestExpense")),
+    (INCOME_STATEMENT, "Cost of revenue", ("us-gaap:CostOfRevenue", "us-gaap:CostOfGoodsAndServicesSold", "us-gaap:CostOfGoodsSold")),
+    (INCOME_STATEMENT, "Gross profit", ("us-gaap:GrossProfit",)),
+    (INCOME_STATEMENT, "Research and development", ("us-gaap:ResearchAndDevelopmentExpense",)),
+    (INCOME_STATEMENT, "Selling, general and administrative", ("us-gaap:SellingGeneralAndAdministrativeExpense",)),
+    (INCOME_STATEMENT, "Operating income", ("us-gaap:OperatingIncomeLoss",)),
+    (INCOME_STATEMENT, "Interest expense", ("us-gaap:InterestExpense",)),
+    (INCOME_STATEMENT, "Provision for income taxes", ("us-gaap:IncomeTaxExpenseBenefit",)),
+    (INCOME_STATEMENT, "Net income", ("us-gaap:NetIncomeLoss", "us-gaap:ProfitLoss")),
+    (INCOME_STATEMENT, "Diluted earnings per share", ("us-gaap:EarningsPerShareDiluted",)),
+    (BALANCE_SHEET, "Total assets", ("us-gaap:Assets",)),
+    (BALANCE_SHEET, "Total liabilities", ("us-gaap:Liabilities",)),
+    (CASH_FLOW, "Net cash provided by operating activities", ("us-gaap:NetCashProvidedByUsedInOperatingActivities",))
+]
+
+SHARES_OUTSTANDING = "dei:EntityCommonStockSharesOutstanding"
+# Monetary unit ids, e.g. "USD", "iso4217_USD", "U_iso4217EUR" (per-share units don't match)
+CURRENCY_UNIT = re.compile(r'(?:u_)?(?:iso4217[_:]?)?([a-z]{3})', re.I)
+
+
+class FactTable:
+    """
+    Tagged numeric facts in columnar form
+    Monetary values are in units of `units[i]` (e.g. USD), already scaled and signed
+    """
+
+    def __init__(self, concepts, values, units, starts, ends, dimensional, decimals):
+        self.concepts = np.array(concepts, dtype=object)
+        self.values = np.array(values, dtype=np.float64)
+        self.units = np.array(units, dtype=object)
+        self.starts = np.array(starts, dtype="datetime64[D]")
+        self.ends = np.array(ends, dtype="datetime64[D]")
+        self.dimensional = np.array(dimensional, dtype=bool)
+        self.decimals = np.array(decimals, dtype=object)
+
+    def __len__(self):
+        return len(self.values)
+
+    def consolidated(self, concept: str, duration: bool = True) -> Dict[int, float]:
+        """
+        Consolidated (no dimensions) values of a concept keyed by fiscal year of the period end
+        Duration facts are restricted to roughly one-year periods; instants have no start
+        """
+        mask = (self.concepts == concept) & ~self.dimensional & ~np.isnat(self.ends)
+        if duration:
+            days = (self.ends - self.starts).astype("timedelta64[D]").astype(np.float64)
+            mask &= (days >= 330) & (days <= 380)
+        else:
+            mask &= np.isnat(self.starts)
+        by_year = {}
+        for end, value in zip(self.ends[mask], self.values[mask]):
+            by_year[int(str(end)[:4])] = float(value)
+        return by_year
+
+    def currency(self, concepts) -> str:
+        """ISO code most of these concepts' facts are reported in ("" when none is monetary)"""
+        counts = Counter()
+        for unit in self.units[np.isin(self.concepts, list(concepts))]:
+            match = CURRENCY_UNIT.fullmatch(unit or "")
+            if match:
+                counts[match.group(1).upper()] += 1
+        return counts.most_common(1)[0][0] if counts else ""
+
+    def to_dict(self) -> dict:
+        """JSON-safe form (dates as ISO strings, missing dates as None)"""
+        def dates(column):
+            return [None if np.isnat(d) else str(d) for d in column]
+        return {
+            "concepts": list(self.concepts),
+            "values": [float(v) for v in self.values],
+            "units": list(self.units),
+            "starts": dates(self.starts),
+            "ends": dates(self.ends),
+            "dimensional": [bool(d) for d in self.dimensional],
+            "decimals": list(self.decimals)
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FactTable":
+        def dates(column):
+            return ["NaT" if d is None else d for d in column]
+        return cls(data["concepts"], data["values"], data["units"], dates(data["starts"]),
+                   dates(data["ends"]), data["dimensional"], data["decimals"])
+
+
+class _Context:
+    def __init__(self):
+        self.start = None
+        self.end = None
+        self.dimensional = False
+
+
+class IXBRLParser(HTMLParser):
+    """Incremental parser: feed() it chunks, then read .text, .facts() and .dei"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        # Raw text of the current chunk; normalized into _text after every feed() so memory
+        # stays close to the size of the final text
+        self._raw = io.StringIO()
+        self._text = io.StringIO()
+        self._held = ""
+        self.dei: Dict[str, str] = {}
+        self._skip_depth = 0
+        self._contexts: Dict[str, _Context] = {}
+        self._context: Optional[_Context] = None
+        self._context_field: Optional[str] = None
+        self._fact: Optional[dict] = None
+        self._fact_depth = 0
+        self._dei_name: Optional[str] = None
+        self._dei_parts: List[str] = []
+        self._rows: List[Tuple] = []
+
+    def feed(self, data):
+        super().feed(data)
+        self._flush_text()
+
+    def _flush_text(self):
+        """Normalize whitespace of the text gathered so far, holding back a trailing run of it"""
+        block = self._held + self._raw.getvalue()
+        self._raw = io.StringIO()
+        body = block.rstrip()
+        self._held = block[len(body):]
+        if self._text.tell() == 0:
+            body = body.lstrip()
+        self._text.write(_normalize_whitespace(body))
+
+    # Parser callbacks
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self._raw.write("\n")
+        elif tag in CELL_TAGS:
+            self._raw.write(" ")
+
+        if tag == "xbrli:context":
+            self._context = _Context()
+            self._contexts[attrs.get("id", "")] = self._context
+        elif self._context is not None and tag in ("xbrli:startdate", "xbrli:enddate", "xbrli:instant"):
+            self._context_field = tag
+        elif self._context is not None and tag in ("xbrldi:explicitmember", "xbrldi:typedmember"):
+            self._context.dimensional = True
+        elif tag == "ix:nonfraction":
+            if self._fact is None:
+                self._fact = {"attrs": attrs, "parts": []}
+                self._fact_depth = 0
+            else:
+                self._fact_depth += 1
+        elif tag == "ix:nonnumeric" and attrs.get("name", "").lower() in DEI_FACTS:
+            self._dei_name = attrs["name"].lower()
+            self._dei_parts = []
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self._raw.write("\n")
+
+        if tag == "xbrli:context":
+            self._context = None
+        elif tag in ("xbrli:startdate", "xbrli:enddate", "xbrli:instant"):
+            self._context_field = None
+        elif tag == "ix:nonfraction" and self._fact is not None:
+            if self._fact_depth:
+                self._fact_depth -= 1
+            else:
+                self._finish_fact()
+        elif tag == "ix:nonnumeric" and self._dei_name:
+            self.dei.setdefault(self._dei_name, " ".join("".join(self._dei_parts).split()))
+            self._dei_name = None
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in ("br", "hr"):
+            self.handle_endtag(tag)
+
+    def handle_data(self, data):
+        if self._context_field is not None:
+            # Text can arrive in pieces when a chunk boundary falls inside it
+            if self._context_field == "xbrli:startdate":
+                self._context.start = (self._context.start or "") + data
+            else:
+                self._context.end = (self._context.end or "") + data
+            return
+        if self._fact is not None:
+            self._fact["parts"].append(data)
+        if self._dei_name:
+            self._dei_parts.append(data)
+        if not self._skip_depth:
+            self._raw.write(data)
+
+    # Facts
+
+    def _finish_fact(self):
+        fact, self._fact = self._fact, None
+        attrs = fact["attrs"]
+        value = parse_fact_value("".join(fact["parts"]), attrs.get("format", ""))
+        if value is None:
+            return
+        scale = attrs.get("scale")
+        if scale and re.fullmatch(r'-?\d+', scale):
+            value *= 10 ** int(scale)
+        if attrs.get("sign") == "-":
+            value = -value
+        self._rows.append((
+            attrs.get("name", ""),
+            value,
+            attrs.get("unitref", ""),
+            attrs.get("contextref", ""),
+            attrs.get("decimals", "")
+        ))
+
+    def facts(self) -> FactTable:
+        concepts, values, units, starts, ends, dimensional, decimals = [], [], [], [], [], [], []
+        for name, value, unit, context_id, decimal in self._rows:
+            context = self._contexts.get(context_id)
+            concepts.append(name)
+            values.append(value)
+            units.append(unit)
+            starts.append(_date(context.start) if context else None)
+            ends.append(_date(context.end) if context else None)
+            dimensional.append(context.dimensional if context else True)
+            decimals.append(decimal)
+        return FactTable(concepts, values, units, starts, ends, dimensional, decimals)
+
+    @property
+    def text(self) -> str:
+        self._flush_text()
+        return self._text.getvalue()
+
+
+SPACES = re.compile(r'[ \t\r\f\v ]+')
+BLANK_LINES = re.compile(r' ?\n(?: ?\n)+ ?')
+
+
+def _normalize_whitespace(text: str) -> str:
+    """Collapse runs of spaces and of blank lines (at most one empty line between paragraphs)"""
+    text = SPACES.sub(' ', text)
+    return BLANK_LINES.sub('\n\n', text).replace(' \n', '\n').replace('\n ', '\n')
+
+
+def _date(value: Optional[str]) -> Optional[np.datetime64]:
+    if not value:
+        return None
+    try:
+        return np.datetime64(date.fromisoformat(value.strip()[:10]), "D")
+    except ValueError:
+        return None
+
+
+def parse_fact_value(text: str, fmt: str) -> Optional[float]:
+    """Numeric value of an ix:nonFraction according to its ixt transformation format"""
+    text = text.strip()
+    fmt = fmt.lower()
+    if "zerodash" in fmt or "fixed-zero" in fmt or "fixedzero" in fmt or text in ("-", "—", "–"):
+        return 0.0
+    if "comma-decimal" in fmt or "numcommadecimal" in fmt:
+        # European style: 1.234.567,89
+        text = text.replace(".", "").replace(" ", "").replace(",", ".")
+    else:
+        text = text.replace(",", "").replace(" ", "")
+    text = re.sub(r'[^\d.]', '', text)
+    if not text:
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+class HtmlExtraction:
+    """Narrative text, tagged facts and cover-page data from one filing"""
+
+    def __init__(self, text: str, facts: FactTable, dei: Dict[str, str]):
+        self.text = text
+        self.facts = facts
+        self.dei = dei
+        self.statements = statements_from_facts(facts)
+
+    @property
+    def company_name(self) -> Optional[str]:
+        return self.dei.get("dei:entityregistrantname")
+
+    @property
+    def shares_outstanding(self) -> Optional[float]:
+        """Cover-page share count, summed across share classes"""
+        mask = self.facts.concepts == SHARES_OUTSTANDING
+        return float(self.facts.values[mask].sum()) if mask.any() else None
+
+
+def extract_html(stream, encoding: str = "utf-8") -> HtmlExtraction:
+    """Stream-parse a filing from a binary file object in fixed-size chunks"""
+    parser = IXBRLParser()
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        parser.feed(decoder.decode(chunk))
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    return HtmlExtraction(parser.text, parser.facts(), parser.dei)
+
+
+def statements_from_facts(facts: FactTable) -> Dict[str, StatementTable]:
+    """
+    Build statement tables from tagged facts so the rest of the pipeline (key metrics,
+    the Business Model Map) works the same as for PDF filings; amounts in millions
+    """
+    rows_by_statement: Dict[str, List[Tuple[str, Dict[int, float]]]] = {}
+    concepts_by_statement: Dict[str, List[str]] = {}
+    for statement, label, concepts in FACT_LINE_ITEMS:
+        for concept in concepts:
+            by_year = facts.consolidated(concept, duration=statement != BALANCE_SHEET)
+            if by_year:
+                rows_by_statement.setdefault(statement, []).append((label, by_year))
+                concepts_by_statement.setdefault(statement, []).append(concept)
+                break
+
+    tables = {}
+    for statement, rows in rows_by_statement.items():
+        years = sorted({year for _, by_year in rows for year in by_year}, reverse=True)[:3]
+        values = np.full((len(rows), len(years)), np.nan)
+        for i, (label, by_year) in enumerate(rows):
+            per_share = "per share" in label
+            for j, year in enumerate(years):
+                if year in by_year:
+                    values[i, j] = by_year[year] if per_share else by_year[year] / 1e6
+        tables[statement] = StatementTable(
+            statement,
+            tuple(str(year) for year in years),
+            tuple(label for label, _ in rows),
+            values,
+            (),
+            facts.currency(concepts_by_statement[statement])
+        )
+    return tables
@@ -0,0 +1,190 @@
+"""
+Incremental year-over-year re-analysis
+Aligns a new filing with the previous one for the same company by hashing content-defined
+chunks of each report item, and decides per analysis section whether last year's analysis
+can be reused as-is, lightly patched, or must be regenerated
+"""
+
+import hashlib
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+from report_sections import build_section_index, section_text, sources_for, SECTION_SOURCES
+
+# Up to this share of changed source text, last year's analysis is reused unchanged
+REUSE_THRESHOLD = 0.05
+# Up to this share, last year's analysis is patched with just the changed text
+PATCH_THRESHOLD = 0.35
+
+# Cap on changed text sent along with a patch request
+MAX_PATCH_CONTEXT = 20000
+# Cap on last year's removed passages quoted in the patch prompt
+MAX_REMOVED_CONTEXT = 8000
+
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+')
+WHITESPACE = re.compile(r'\s+')
+
+
+def _normalize(chunk: str) -> str:
+    return WHITESPACE.sub(" ", chunk).strip().lower()
+
+
+def _hash(chunk: str) -> str:
+    return hashlib.blake2b(_normalize(chunk).encode("utf-8", errors="replace"), digest_size=8).hexdigest()
+
+
+def chunk_text(text: str) -> List[str]:
+    """
+    Split text into content-defined chunks of a few sentences
+    A chunk ends after any sentence whose hash falls in a fixed bucket, so an inserted
+    paragraph only changes the chunks around it instead of shifting every later boundary
+    """
+    chunks = []
+    current = []
+    for sentence in SENTENCE_SPLIT.split(text):
+        if not sentence.strip():
+            continue
+        current.append(sentence)
+        if int(_hash(sentence)[:2], 16) % 4 == 0:
+            chunks.append(" ".join(current))
+            current = []
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+class SectionDelta:
+    """How the source text behind one analysis section changed since last year"""
+
+    def __init__(self, section_key: str, action: str, change_ratio: float,
+                 changed_items: Dict[str, float], added: List[str], removed: List[str]):
+        self.section_key = section_key
+        self.action = action  # "reuse", "patch" or "regenerate"
+        self.change_ratio = change_ratio
+        self.changed_items = changed_items
+        self.added = added
+        self.removed = removed
+
+    def summary(self) -> str:
+        """Short human-readable description of what changed"""
+        if not self.changed_items:
+            return "No material changes in the underlying report text."
+        parts = [f"{item.upper()}: {ratio:.0%} changed" for item, ratio in self.changed_items.items()]
+        return (f"{self.change_ratio:.0%} of the relevant text changed "
+                f"({'; '.join(parts)}; {len(self.added)} passages added, {len(self.removed)} removed).")
+
+    def changed_text(self) -> str:
+        """New passages, for the patch prompt"""
+        return "\n\n".join(self.added)[:MAX_PATCH_CONTEXT]
+
+    def removed_text(self) -> str:
+        """Last year's passages that are gone from this year's filing, quoted in the patch prompt"""
+        shown, size = [], 0
+        for passage in self.removed:
+            if size + len(passage) > MAX_REMOVED_CONTEXT:
+                if not shown:
+                    shown.append(passage[:MAX_REMOVED_CONTEXT])
+                break
+            shown.append(passage)
+            size += len(passage) + 2
+        text = "\n\n".join(shown)
+        if len(shown) < len(self.removed):
+            text += f"\n\n({len(self.removed) - len(shown)} more removed passages not shown)"
+        return text
+
+
+def _item_delta(old_text: str, new_text: str):
+    """(changed share, added chunks, removed chunks) between two versions of an item"""
+    old_chunks = chunk_text(old_text)
+    new_chunks = chunk_text(new_text)
+    old_counts = Counter(_hash(c) for c in old_chunks)
+    new_counts = Counter(_hash(c) for c in new_chunks)
+
+    added, removed = [], []
+    remaining = old_counts.copy()
+    for chunk in new_chunks:
+        h = _hash(chunk)
+        if remaining[h] > 0:
+            remaining[h] -= 1
+        else:
+            added.append(chunk)
+    remaining = new_counts.copy()
+    for chunk in old_chunks:
+        h = _hash(chunk)
+        if remaining[h] > 0:
+            remaining[h] -= 1
+        else:
+            removed.append(chunk)
+
+    total = max(1, len(new_text) + len(old_text))
+    changed = sum(len(c) for c in added) + sum(len(c) for c in removed)
+    return min(1.0, changed / total), added, removed
+
+
+def plan_incremental_update(old_text: str, new_text: str,
+                            section_keys: Optional[List[str]] = None) -> Dict[str, SectionDelta]:
+    """Compare two filings and decide, per analysis section, how to refresh it"""
+    old_index = build_section_index(old_text)
+    new_index = build_section_index(new_text)
+
+    item_deltas = {}
+    plan = {}
+    for section_key in section_keys or list(SECTION_SOURCES):
+        items = sources_for(section_key, new_index)
+        changed_items = {}
+        added, removed = [], []
+        changed_chars = total_chars = 0
+
+        for item in items:
+            if item not in item_deltas:
+                old_item = section_text(old_text, old_index, item)
+                new_item = section_text(new_text, new_index, item)
+                item_deltas[item] = (_item_delta(old_item, new_item), len(old_item) + len(new_item))
+            (ratio, item_added, item_removed), size = item_deltas[item]
+            changed_chars += ratio * size
+            total_chars += size
+            if ratio > 0:
+                changed_items[item] = ratio
+            added.extend(item_added)
+            removed.extend(item_removed)
+
+        change_ratio = changed_chars / total_chars if total_chars else 1.0
+        if change_ratio <= REUSE_THRESHOLD:
+            action = "reuse"
+        elif change_ratio <= PATCH_THRESHOLD:
+            action = "patch"
+        else:
+            action = "regenerate"
+        plan[section_key] = SectionDelta(section_key, action, change_ratio, changed_items, added, removed)
+
+    return plan
+
+
+def build_patch_prompt(original_prompt: str, previous_analysis: str, delta: SectionDelta) -> str:
+    """Prompt asking the model to update last year's analysis for what was added and removed"""
+    removed = ""
+    if delta.removed:
+        removed = f"""
+
+## Removed Passages
+These passages from last year's filing no longer appear in this year's:
+
+{delta.removed_text()}
+
+Drop anything in last year's analysis that relied only on these passages, and revise
+anything they supported in part."""
+
+    return f"""{original_prompt}
+
+## Last Year's Analysis
+The analysis below was written for the previous annual report of this company:
+
+{previous_analysis}
+
+## What Changed
+{delta.summary()}
+The report content provided below contains only the passages that are NEW in this year's filing.{removed}
+
+Update last year's analysis to reflect these changes. Keep everything that is still accurate,
+revise what has changed, and keep the same structure and format."""
@@ -4,70 +4,139 @@ Supports: Anthropic (paid), Groq (free), OpenAI (paid), and Ollama (local/free)
 """
 
 import os
+import json
+import time
+import threading
+import importlib.util
+import re
 import streamlit as st
-from typing import Optional
+from typing import Callable, Optional
+from single_flight import SingleFlight, fingerprint
+from generation_policy import GenerationPolicy
+from metrics import METRICS
+from cancellation import CancelledError, checkpoint
+from shared_cache import get_shared_cache
+from token_budget import Reservation, get_token_governor, request_tokens
+
+# Process-wide registry so concurrent identical completions share one provider call
+LLM_REQUESTS = SingleFlight("llm")
+
+# Providers report some failures as text instead of raising: "Error calling ...", "<SDK> not available. ..."
+FAILED_ANSWER_PATTERN = re.compile(r"Error\b|[\w ]+ not available\. (Please install|Install from)")
+
+def is_failed_answer(answer: Optional[str]) -> bool:
+    """True for an empty answer or a failure a provider returned as text"""
+    return not answer or FAILED_ANSWER_PATTERN.match(answer) is not None
+
+def sdk_installed(module_name: str) -> bool:
+    """Check whether an SDK is installed without importing it"""
+    return importlib.util.find_spec(module_name) is not None
 
 class LLMProvider:
     """Base class for LLM providers"""
 
+    # Output budget used before per-section policies; kept to report the savings against
+    default_max_tokens = 2048
+    # Report characters sent with each prompt
+    max_context_chars = 30000
+    # Token budgets this provider counts against (token_budget.PROVIDER_LIMITS); None: unmetered
+    budget_group: Optional[str] = None
+
     def __init__(self):
         self.provider_name = "Base"
+        self.model = None
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        """SDK client, created on first use so the SDK import stays off the startup path"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._create_client()
+        return self._client
+
+    def _create_client(self):
+        raise NotImplementedError
 
-    def get_completion(self, prompt: str, context: str) -> str:
+    def get_completion(self, prompt: str, context: str, policy: Optional[GenerationPolicy] = None) -> str:
         raise NotImplementedError
 
+    def resolve_policy(self, policy: Optional[GenerationPolicy]) -> GenerationPolicy:
+        return policy or GenerationPolicy(self.default_max_tokens)
+
 class AnthropicProvider(LLMProvider):
     """Anthropic Claude provider (paid)"""
 
+    default_max_tokens = 4096
+    max_context_chars = 50000
+    budget_group = "anthropic"
+
     def __init__(self, api_key: str):
         super().__init__()
         self.provider_name = "Anthropic Claude"
-        try:
-            import anthropic
-            self.client = anthropic.Anthropic(api_key=api_key)
-            self.available = True
-        except ImportError:
-            self.available = False
+        self.model = "claude-sonnet-4-5-20250929"
+        self.api_key = api_key
+        self.available = sdk_installed("anthropic")
+        if not self.available:
             st.warning("Anthropic library not installed. Run: pip install anthropic")
 
-    def get_completion(self, prompt: str, context: str) -> str:
+    def _create_client(self):
+        import anthropic
+        return anthropic.Anthropic(api_key=self.api_key)
+
+    def get_completion(self, prompt: str, context: str, policy: Optional[GenerationPolicy] = None) -> str:
         if not self.available:
             return "Anthropic provider not available. Please install: pip install anthropic"
 
+        policy = self.resolve_policy(policy)
+        options = {}
+        # The API rejects whitespace-only stop sequences
+        stop = [s for s in policy.stop if s.strip()]
+        if stop:
+            options["stop_sequences"] = stop
         message = self.client.messages.create(
-            model="claude-sonnet-4-5-20250929",
-            max_tokens=4096,
+            model=self.model,
+            max_tokens=policy.max_tokens,
+            temperature=policy.temperature,
             messages=[{
                 "role": "user",
-                "content": f"{prompt}\n\nAnnual Report Content:\n{context[:50000]}"
-            }]
+                "content": f"{prompt}{policy.prompt_suffix}\n\nAnnual Report Content:\n{context[:self.max_context_chars]}"
+            }],
+            **options
         )
         return message.content[0].text
 
 class GroqProvider(LLMProvider):
     """Groq provider with free tier (Llama 3.3)"""
 
+    budget_group = "groq"
+
     def __init__(self, api_key: str):
         super().__init__()
         self.provider_name = "Groq (Llama 3.3)"
-        try:
-            from groq import Groq
-            self.client = Groq(api_key=api_key)
-            self.available = True
-        except ImportError:
-            self.available = False
+        self.model = "llama-3.3-70b-versatile"  # Current free tier model (updated from deprecated 3.1)
+        self.api_key = api_key
+        self.available = sdk_installed("groq")
+        if not self.available:
             st.warning("Groq library not installed. Run: pip install groq")
 
-    def get_completion(self, prompt: str, context: str) -> str:
+    def _create_client(self):
+        from groq import Groq
+        return Groq(api_key=self.api_key)
+
+    def get_completion(self, prompt: str, context: str, policy: Optional[GenerationPolicy] = None) -> str:
         if not self.available:
             return "Groq provider not available. Please install: pip install groq"
 
+        policy = self.resolve_policy(policy)
+
         # Groq has token limits, so we need to be more conservative
-        max_context = 30000  # Leave room for prompt + response
-        truncated_context = context[:max_context]
+        truncated_context = context[:self.max_context_chars]  # Leave room for prompt + response
 
         completion = self.client.chat.completions.create(
-            model="llama-3.3-70b-versatile",  # Current free tier model (updated from deprecated 3.1)
+            model=self.model,
             messages=[
                 {
                     "role": "system",
@@ -75,26 +144,40 @@ class GroqProvider(LLMProvider):
                 },
                 {
                     "role": "user",
-                    "content": f"{prompt}\n\nAnnual Report Content:\n{truncated_context}"
+                    "content": f"{prompt}{policy.prompt_suffix}\n\nAnnual Report Content:\n{truncated_context}"
                 }
             ],
-            temperature=0.3,
-            max_tokens=2048
+            temperature=policy.temperature,
+            max_tokens=policy.max_tokens,
+            stop=list(policy.stop) or None
         )
         return completion.choices[0].message.content
 
 class OllamaProvider(LLMProvider):
-    """Ollama local provider (100% free, runs on your computer)"""
+    """
+    Ollama local provider (100% free, runs on your computer)
+    Performance mode: the model is loaded in the background at connect time and kept resident
+    between sections, the context window is sized to each prompt, and responses are streamed
+    """
+
+    base_url = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+    keep_alive = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+    max_ctx = int(os.environ.get("OLLAMA_MAX_CTX", "32768"))
+    # Local tokenizers split financial text finely; undercounting would truncate the prompt
+    chars_per_token = 3
+    # Ollama can handle larger contexts with local models
+    max_context_chars = 20000
 
     def __init__(self, model: str = "llama3.1"):
         super().__init__()
         self.provider_name = f"Ollama ({model})"
         self.model = model
+        self.last_timings = {}
         try:
             import requests
             self.requests = requests
             # Test if Ollama is running
-            response = requests.get("http://localhost:11434/api/tags", timeout=2)
+            response = requests.get(f"{self.base_url}/api/tags", timeout=2)
             self.available = response.status_code == 200
             if not self.available:
                 st.warning("Ollama is installed but not running. Start it with: ollama serve")
@@ -105,56 +188,154 @@ class OllamaProvider(LLMProvider):
             self.available = False
             st.info("Ollama not running locally. Install from: https://ollama.com")
 
-    def get_completion(self, prompt: str, context: str) -> str:
+        if self.available:
+            threading.Thread(target=self.warm_up, name="ollama-warmup", daemon=True).start()
+
+    @classmethod
+    def is_running(cls) -> bool:
+        """Whether an Ollama server answers, without the connection warnings of the constructor"""
+        try:
+            import requests
+            return requests.get(f"{cls.base_url}/api/tags", timeout=2).status_code == 200
+        except Exception:
+            return False
+
+    def warm_up(self):
+        """Load the model into memory (an empty prompt only loads it) so the first section doesn't pay for it"""
+        start = time.perf_counter()
+        try:
+            response = self.requests.post(
+                f"{self.base_url}/api/generate",
+                json={"model": self.model, "prompt": "", "stream": False, "keep_alive": self.keep_alive},
+                timeout=300
+            )
+            response.raise_for_status()
+            METRICS.observe("ollama.warmup_ms", (time.perf_counter() - start) * 1000)
+            load_ns = response.json().get("load_duration")
+            if load_ns:
+                METRICS.observe("ollama.load_ms", load_ns / 1e6)
+        except Exception as e:
+            METRICS.increment("ollama.warmup_errors")
+            print(f"Ollama warmup error: {e}")
+
+    def context_size(self, prompt: str, max_tokens: int) -> int:
+        """num_ctx large enough for the prompt plus the answer, in 2k steps"""
+        needed = len(prompt) // self.chars_per_token + max_tokens + 256
+        return min(self.max_ctx, max(2048, -(-needed // 2048) * 2048))
+
+    def get_completion(self, prompt: str, context: str, policy: Optional[GenerationPolicy] = None) -> str:
         if not self.available:
             return "Ollama not available. Install from https://ollama.com and run: ollama serve"
 
-        # Ollama can handle larger contexts with local models
-        max_context = 20000
-        truncated_context = context[:max_context]
+        policy = self.resolve_policy(policy)
 
+        truncated_context = context[:self.max_context_chars]
+        full_prompt = f"{prompt}{policy.prompt_suffix}\n\nAnnual Report Content:\n{truncated_context}"
+
+        options = {
+            "temperature": policy.temperature,
+            "num_predict": policy.max_tokens,
+            "num_ctx": self.context_size(full_prompt, policy.max_tokens)
+        }
+        if policy.stop:
+            options["stop"] = list(policy.stop)
+
+        start = time.perf_counter()
         try:
             response = self.requests.post(
-                "http://localhost:11434/api/generate",
+                f"{self.base_url}/api/generate",
                 json={
                     "model": self.model,
-                    "prompt": f"{prompt}\n\nAnnual Report Content:\n{truncated_context}",
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.3,
-                        "num_predict": 2048
-                    }
+                    "prompt": full_prompt,
+                    "stream": True,
+                    "keep_alive": self.keep_alive,
+                    "options": options
                 },
+                stream=True,
                 timeout=120
             )
             response.raise_for_status()
-            return response.json()['response']
+            return self._read_stream(response, start)
+        except CancelledError:
+            raise
         except Exception as e:
             return f"Error calling Ollama: {str(e)}"
 
+    def _read_stream(self, response, start: float) -> str:
+        """Collect a streamed NDJSON response and record Ollama's own timings"""
+        parts = []
+        first_token_ms = None
+        final = {}
+        # chunk_size=None hands over data as it arrives instead of buffering 512 bytes
+        for line in response.iter_lines(chunk_size=None):
+            try:
+                checkpoint()
+            except CancelledError:
+                # Dropping the connection makes Ollama stop generating; the partial text is discarded
+                response.close()
+                raise
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if chunk.get("error"):
+                raise RuntimeError(chunk["error"])
+            if chunk.get("response"):
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - start) * 1000
+                parts.append(chunk["response"])
+            if chunk.get("done"):
+                final = chunk
+                break
+
+        # Ollama reports durations in nanoseconds
+        timings = {
+            name: final[field] / 1e6
+            for name, field in (("load_ms", "load_duration"),
+                                ("prompt_eval_ms", "prompt_eval_duration"),
+                                ("eval_ms", "eval_duration"),
+                                ("total_ms", "total_duration"))
+            if final.get(field) is not None
+        }
+        if first_token_ms is not None:
+            timings["first_token_ms"] = first_token_ms
+        for name, value in timings.items():
+            METRICS.observe(f"ollama.{name}", value)
+        if final.get("eval_count") and final.get("eval_duration"):
+            timings["tokens_per_second"] = final["eval_count"] / (final["eval_duration"] / 1e9)
+            METRICS.observe("ollama.tokens_per_second", timings["tokens_per_second"])
+        if final.get("prompt_eval_count") is not None:
+            timings["prompt_tokens"] = final["prompt_eval_count"]
+        self.last_timings = timings
+        return "".join(parts)
+
 class OpenAIProvider(LLMProvider):
     """OpenAI GPT provider (paid, but some free credits for new users)"""
 
+    budget_group = "openai"
+
     def __init__(self, api_key: str):
         super().__init__()
         self.provider_name = "OpenAI GPT-4"
-        try:
-            from openai import OpenAI
-            self.client = OpenAI(api_key=api_key)
-            self.available = True
-        except ImportError:
-            self.available = False
+        self.model = "gpt-4-turbo-preview"
+        self.api_key = api_key
+        self.available = sdk_installed("openai")
+        if not self.available:
             st.warning("OpenAI library not installed. Run: pip install openai")
 
-    def get_completion(self, prompt: str, context: str) -> str:
+    def _create_client(self):
+        from openai import OpenAI
+        return OpenAI(api_key=self.api_key)
+
+    def get_completion(self, prompt: str, context: str, policy: Optional[GenerationPolicy] = None) -> str:
         if not self.available:
             return "OpenAI provider not available. Please install: pip install openai"
 
-        max_context = 30000
-        truncated_context = context[:max_context]
+        policy = self.resolve_policy(policy)
+
+        truncated_context = context[:self.max_context_chars]
 
         completion = self.client.chat.completions.create(
-            model="gpt-4-turbo-preview",
+            model=self.model,
             messages=[
                 {
                     "role": "system",
@@ -162,14 +343,70 @@ class OpenAIProvider(LLMProvider):
                 },
                 {
                     "role": "user",
-                    "content": f"{prompt}\n\nAnnual Report Content:\n{truncated_context}"
+                    "content": f"{prompt}{policy.prompt_suffix}\n\nAnnual Report Content:\n{truncated_context}"
                 }
             ],
-            temperature=0.3,
-            max_tokens=2048
+            temperature=policy.temperature,
+            max_tokens=policy.max_tokens,
+            stop=list(policy.stop) or None
         )
         return completion.choices[0].message.content
 
+def get_shared_completion(provider: LLMProvider, prompt: str, context: str,
+                          policy: Optional[GenerationPolicy] = None,
+                          reservation: Optional[Reservation] = None,
+                          on_generated: Optional[Callable[[str], None]] = None) -> str:
+    """
+    Get a completion from the shared cache, or attach to an identical in-flight request if one exists
+    Requests are identical when provider, model, prompt, context and policy all match. In-flight
+    requests are shared only between callers on the same API key, so one key's failure or quota
+    error never reaches another key's caller. Successful answers are cached for every key on purpose:
+    the same model answers the same request the same way, whoever pays for it
+    Tokens are charged to the token budgets only when this call reached the provider: `reservation`
+    settles to them, and unreserved calls (e.g. company name extraction) are recorded directly
+    `on_generated` is called with the answer only when this call generated it and it didn't fail
+    (not for cache hits or answers shared from another caller's request)
+    """
+    key = fingerprint(
+        provider.provider_name,
+        provider.model,
+        fingerprint(prompt),
+        fingerprint(context),
+        policy.key() if policy else ""
+    )
+    cache = get_shared_cache()
+    cached = cache.get_text("llm", key)
+    if cached is not None:
+        if reservation:
+            reservation.settle(0)
+        return cached
+    checkpoint()
+
+    used_tokens = 0
+
+    def complete():
+        nonlocal used_tokens
+        answer = provider.get_completion(prompt, context, policy)
+        used_tokens = request_tokens(provider, prompt + (policy.prompt_suffix if policy else ""), context, answer)
+        # Failures reported as text are not kept
+        if not is_failed_answer(answer):
+            cache.set_text("llm", (key,), answer)
+            if on_generated:
+                on_generated(answer)
+        return answer
+
+    api_key = getattr(provider, "api_key", None)
+    # Same credential hash the token budgets use for per-key scopes
+    credential = fingerprint(provider.budget_group, api_key)[:16] if api_key else ""
+    try:
+        return LLM_REQUESTS.do(fingerprint(key, credential), complete)
+    finally:
+        # Attached to another caller's request, or failed: nothing of this caller's was spent
+        if reservation:
+            reservation.settle(used_tokens)
+        elif used_tokens:
+            get_token_governor().record(provider, used_tokens)
+
 def get_available_providers() -> dict:
     """Get dictionary of available providers with their config"""
     return {
@@ -230,8 +467,11 @@ def create_provider(provider_name: str, api_key: Optional[str] = None) -> Option
 
 def get_api_key_from_env(key_name: str) -> Optional[str]:
     """Get API key from environment or Streamlit secrets"""
-    # Try Streamlit secrets first
-    if hasattr(st, 'secrets') and key_name in st.secrets:
-        return st.secrets[key_name]
+    # Try Streamlit secrets first (newer Streamlit raises when no secrets.toml exists)
+    try:
+        if hasattr(st, 'secrets') and key_name in st.secrets:
+            return st.secrets[key_name]
+    except Exception:
+        pass
     # Fall back to environment variable
     return os.environ.get(key_name)
@@ -0,0 +1,66 @@
+"""
+Process-wide performance metrics
+Counters and timing observations recorded by providers, research and the app,
+readable as one snapshot for display or benchmarks
+"""
+
+import threading
+from typing import Dict
+
+
+class _Timing:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.last = value
+
+
+class Metrics:
+    """Thread-safe counters and observed values (durations in milliseconds by convention)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._timings: Dict[str, _Timing] = {}
+
+    def increment(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            self._timings.setdefault(name, _Timing()).add(value)
+
+    def counter(self, name: str) -> int:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "timings": {
+                    name: {
+                        "count": t.count,
+                        "mean": t.total / t.count if t.count else 0.0,
+                        "max": t.max,
+                        "last": t.last
+                    }
+                    for name, t in self._timings.items()
+                }
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._timings.clear()
+
+
+METRICS = Metrics()
@@ -0,0 +1,121 @@
+"""
+PDF ingestion: page text plus the structured artifacts derived from it
+"""
+
+import signal
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from statement_extraction import StatementTable, extract_statements
+from text_cleanup import CleanedText, clean_pages
+
+
+class PdfExtraction:
+    """Everything one pass over an uploaded PDF produces"""
+
+    def __init__(self, page_texts: List[str], statements: Dict[str, StatementTable],
+                 metadata: Optional[Dict[str, str]] = None, skipped_pages: Optional[Dict[int, str]] = None):
+        self.page_texts = page_texts
+        self.statements = statements
+        self.metadata = metadata or {}
+        # 1-based page number -> why the page (or its statement table) was left out
+        self.skipped_pages = skipped_pages or {}
+        # Headers, footers, page numbers and the TOC stripped; statements still use raw pages
+        self.cleaned: CleanedText = clean_pages(page_texts)
+
+    @property
+    def text(self) -> str:
+        return self.cleaned.text
+
+
+class PageTimeout(Exception):
+    """A page took longer than its time limit"""
+
+
+@contextmanager
+def time_limit(seconds: Optional[float]):
+    """
+    Raise PageTimeout in this block after `seconds` of wall-clock time
+    Uses SIGALRM, so it only applies on the main thread of a Unix process (the PDF workers);
+    elsewhere the block runs unlimited. Long calls into C code are interrupted once they return.
+    """
+    if not seconds or not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def expire(signum, frame):
+        raise PageTimeout(f"timed out after {seconds:g}s")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+class PageGuard:
+    """Per-page time limit; pages that overrun or fail are recorded and skipped, not fatal"""
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.seconds = seconds
+        self.skipped: Dict[int, str] = {}
+
+    def skip(self, page_number: int, reason: str):
+        self.skipped.setdefault(page_number + 1, reason)
+
+    @contextmanager
+    def page(self, page_number: int, part: str = "statement table"):
+        try:
+            with time_limit(self.seconds):
+                yield
+        except PageTimeout as e:
+            self.skip(page_number, f"{part} {e}")
+            raise
+
+
+def open_pdf(pdf_file):
+    import PyPDF2  # Deferred: heavy import only needed once a report is uploaded
+    return PyPDF2.PdfReader(pdf_file)
+
+
+def extract_page_texts(pdf_reader, guard: Optional[PageGuard] = None) -> List[str]:
+    """Plain text of every page, in order; with a guard, unreadable pages are left empty"""
+    if guard is None:
+        return [page.extract_text() for page in pdf_reader.pages]
+    texts = []
+    for page_number, page in enumerate(pdf_reader.pages):
+        try:
+            with guard.page(page_number, "text"):
+                texts.append(page.extract_text())
+        except MemoryError:
+            guard.skip(page_number, "text ran out of memory")
+            texts.append("")
+        except Exception as e:
+            guard.skip(page_number, f"text unreadable ({type(e).__name__})")
+            texts.append("")
+    return texts
+
+
+def extract_metadata(pdf_reader) -> Dict[str, str]:
+    """Title, author and subject from the document information dictionary (empty if unreadable)"""
+    try:
+        info = pdf_reader.metadata or {}
+    except Exception:
+        return {}
+    fields = {"title": "/Title", "author": "/Author", "subject": "/Subject"}
+    return {name: str(info[key]).strip() for name, key in fields.items() if info.get(key)}
+
+
+def extract_pdf(pdf_file, page_timeout: Optional[float] = None) -> PdfExtraction:
+    """
+    Extract page text, then re-parse just the financial statement pages with positions
+    Pages that fail, or overrun `page_timeout` seconds, are skipped and listed in `skipped_pages`
+    """
+    pdf_reader = open_pdf(pdf_file)
+    guard = PageGuard(page_timeout)
+    page_texts = extract_page_texts(pdf_reader, guard)
+    statements = extract_statements(pdf_reader.pages, page_texts, guard.page)
+    return PdfExtraction(page_texts, statements, extract_metadata(pdf_reader), guard.skipped)
@@ -0,0 +1,199 @@
+"""
+Sandboxed PDF parsing
+Uploaded PDFs are parsed in a small pool of worker processes, so a malformed or pathological
+file cannot stall or bloat the Streamlit server:
+- each worker runs under an address-space rlimit; running out of it fails that document only
+- each page has a time limit inside the worker; a page that overruns is skipped, not fatal
+- each document has a wall-clock limit; a worker that overruns it is killed and replaced
+- workers are recycled after a number of documents, which bounds heap fragmentation
+Workers are handed the path of the spooled upload and parse it memory-mapped, so the PDF is
+never copied through the pipe. The calling thread only waits on the pipe, so the server keeps
+serving other sessions meanwhile.
+"""
+
+import atexit
+import os
+import threading
+import time
+from typing import List, Optional
+
+from metrics import METRICS
+
+PDF_WORKERS = int(os.environ.get("FUNDAMENTALS_PDF_WORKERS", "2"))  # 0 parses in-process
+DOCUMENT_TIMEOUT_SECONDS = float(os.environ.get("FUNDAMENTALS_PDF_TIMEOUT_SECONDS", "180"))
+PAGE_TIMEOUT_SECONDS = float(os.environ.get("FUNDAMENTALS_PDF_PAGE_TIMEOUT_SECONDS", "10"))
+WORKER_MEMORY_MB = int(os.environ.get("FUNDAMENTALS_PDF_WORKER_MB", "2048"))
+DOCUMENTS_PER_WORKER = int(os.environ.get("FUNDAMENTALS_PDF_DOCUMENTS_PER_WORKER", "25"))
+
+
+class PdfParseError(Exception):
+    """The PDF could not be parsed in its sandbox"""
+
+
+class PdfParseTimeout(PdfParseError):
+    """Parsing overran the per-document time limit"""
+
+
+def _limit_memory(megabytes: int):
+    try:
+        import resource
+    except ImportError:  # Windows: no rlimits; the document time limit still applies
+        return
+    limit = megabytes * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def extract_pdf_file(path: str, page_timeout: Optional[float] = None):
+    """Extract a PDF on disk, reading it through a memory map instead of into memory"""
+    import mmap
+    from pdf_extraction import extract_pdf
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+        return extract_pdf(view, page_timeout)
+
+
+def _worker_main(conn, page_timeout: float, memory_mb: int):
+    """Worker loop: receive a PDF path, send back ("ok", PdfExtraction) or ("error", message)"""
+    # One BLAS thread: numpy is only used for small tables, and each thread reserves address space
+    for name in ("OPENBLAS_NUM_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(name, "1")
+    _limit_memory(memory_mb)
+
+    while True:
+        try:
+            path = conn.recv()
+        except EOFError:
+            return
+        try:
+            result = ("ok", extract_pdf_file(path, page_timeout))
+        except MemoryError:
+            result = ("error", f"ran out of memory (limit {memory_mb} MB)")
+        except Exception as e:
+            result = ("error", f"{type(e).__name__}: {e}")
+        try:
+            conn.send(result)
+        except MemoryError:
+            conn.send(("error", f"ran out of memory (limit {memory_mb} MB)"))
+
+
+class _Worker:
+    def __init__(self, context, page_timeout: float, memory_mb: int):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child, page_timeout, memory_mb), name="pdf-worker", daemon=True
+        )
+        self.process.start()
+        child.close()
+        self.documents = 0
+        METRICS.increment("pdf.workers_started")
+
+    def parse(self, path: str, timeout: float):
+        self.documents += 1
+        try:
+            self.conn.send(path)
+            # poll() also returns when the worker dies, and recv() then fails
+            if not self.conn.poll(timeout):
+                raise PdfParseTimeout(f"parsing took longer than {timeout:g}s")
+            return self.conn.recv()
+        except (EOFError, OSError):
+            self.process.join(1)
+            raise PdfParseError(f"the parser crashed (exit code {self.process.exitcode})")
+
+    def stop(self, kill: bool = False):
+        if kill:
+            self.process.kill()
+        self.conn.close()  # the worker sees EOF and exits
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+
+class PdfWorkerPool:
+    """A few long-lived parser processes, started on demand and shared by all sessions"""
+
+    def __init__(self, workers: int = PDF_WORKERS, timeout: float = DOCUMENT_TIMEOUT_SECONDS,
+                 page_timeout: float = PAGE_TIMEOUT_SECONDS, memory_mb: int = WORKER_MEMORY_MB,
+                 documents_per_worker: int = DOCUMENTS_PER_WORKER):
+        import multiprocessing
+        # spawn: forking a threaded server process is unsafe, and spawn is the only option on Windows
+        self._context = multiprocessing.get_context("spawn")
+        self.timeout = timeout
+        self.page_timeout = page_timeout
+        self.memory_mb = memory_mb
+        self.documents_per_worker = documents_per_worker
+        self._slots = threading.BoundedSemaphore(max(1, workers))
+        self._lock = threading.Lock()
+        self._idle: List[_Worker] = []
+
+    def parse(self, path: str, timeout: Optional[float] = None):
+        """PdfExtraction for a PDF file; waits for a free worker if all are busy"""
+        start = time.perf_counter()
+        with self._slots:
+            worker = self._checkout()
+            try:
+                status, payload = worker.parse(path, timeout or self.timeout)
+            except PdfParseTimeout:
+                METRICS.increment("pdf.timeouts")
+                worker.stop(kill=True)
+                raise
+            except BaseException:
+                METRICS.increment("pdf.worker_failures")
+                worker.stop(kill=True)
+                raise
+            if status != "ok":
+                # A worker that hit its memory limit may be left fragmented; replace it
+                worker.documents = self.documents_per_worker
+            self._checkin(worker)
+        METRICS.observe("pdf.parse_ms", (time.perf_counter() - start) * 1000)
+        if status != "ok":
+            raise PdfParseError(payload)
+        METRICS.increment("pdf.pages_skipped", len(payload.skipped_pages))
+        return payload
+
+    def _checkout(self) -> _Worker:
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.process.is_alive():
+                    return worker
+                worker.stop()
+        return _Worker(self._context, self.page_timeout, self.memory_mb)
+
+    def _checkin(self, worker: _Worker):
+        if worker.documents >= self.documents_per_worker:
+            METRICS.increment("pdf.workers_recycled")
+            worker.stop()
+            return
+        with self._lock:
+            self._idle.append(worker)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.stop()
+
+
+_pool: Optional[PdfWorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pdf_workers() -> PdfWorkerPool:
+    """Process-wide PDF worker pool"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PdfWorkerPool()
+                atexit.register(_pool.close)
+    return _pool
+
+
+def parse_pdf(path: str):
+    """Parse a PDF file in the worker pool (in-process when FUNDAMENTALS_PDF_WORKERS=0)"""
+    if PDF_WORKERS <= 0:
+        return extract_pdf_file(path, PAGE_TIMEOUT_SECONDS)
+    return get_pdf_workers().parse(os.path.abspath(path))
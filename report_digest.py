@@ -0,0 +1,269 @@
+"""
+Hierarchical report digest
+The report is summarized once, bottom-up (chunk summaries -> per-item summaries -> a compact
+whole-report digest), with chunk summaries generated in parallel. Sections are then analyzed
+from the digest plus a small raw slice of the items they draw on, instead of the raw report.
+"""
+
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from cancellation import CancelledError
+from generation_policy import GenerationPolicy
+from llm_providers import get_shared_completion, is_failed_answer
+from report_sections import build_section_index, section_text, sources_for, FULL_REPORT
+from single_flight import SingleFlight, fingerprint
+from token_budget import BudgetExceeded, get_token_governor, request_tokens
+
+# Chunks fit the smallest provider context window (Ollama reads 20,000 characters)
+CHUNK_CHARS = 18000
+# Shorter reports are sent whole; a digest would cost more calls than it saves
+MIN_DIGEST_CHARS = 60000
+DIGEST_WORKERS = 4
+# Raw report text sent alongside the digest for each section
+RAW_SLICE_CHARS = 6000
+# Items not digested: boilerplate with little analytical value, and the financial statements
+# (Item 8), whose headline figures come verbatim from the extracted statements instead
+SKIPPED_ITEMS = {"1b", "4", "6", "8", "9", "9a", "9b", "9c", "10", "11", "12", "13", "14", "15", "16"}
+
+CHUNK_POLICY = GenerationPolicy(400, 0.1)
+SECTION_POLICY = GenerationPolicy(600, 0.1)
+REPORT_POLICY = GenerationPolicy(1200, 0.1)
+
+CHUNK_PROMPT = """Summarize this excerpt of an annual report for a financial analyst in at most 200 words.
+Keep every number, percentage, amount, date, segment, product, customer and competitor name exactly
+as written (verbatim, with units). Drop legal boilerplate. Use terse bullet points."""
+
+SECTION_PROMPT = """Combine these summaries of consecutive excerpts from the "{title}" part of an annual
+report into one summary of at most 300 words. Keep every figure and name verbatim, remove repetition,
+use terse bullet points."""
+
+REPORT_PROMPT = """Write a compact digest of this annual report from the part summaries below, at most
+600 words, organized as: Business & segments; Financial performance (key figures verbatim);
+Strategy; Competition & industry; Risks. Keep figures exactly as written."""
+
+# Process-wide so sessions analyzing the same report share one digest build
+DIGEST_REQUESTS = SingleFlight("digest")
+
+
+class DigestUnavailable(RuntimeError):
+    """The digest could not be built in full (a failed call, or no room in the token budgets)"""
+
+
+class ReportDigest:
+    """Digest of one report: the whole-report digest plus a summary per 10-K item"""
+
+    def __init__(self, digest: str, item_summaries: Dict[str, str], key_figures: str = "",
+                 chunks: int = 0, calls: int = 0, input_chars: int = 0, seconds: float = 0.0):
+        self.digest = digest
+        self.item_summaries = item_summaries
+        self.key_figures = key_figures
+        self.chunks = chunks
+        self.calls = calls
+        self.input_chars = input_chars
+        self.seconds = seconds
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ReportDigest":
+        return cls(**data)
+
+
+def worth_digesting(text: str) -> bool:
+    return len(text or "") >= MIN_DIGEST_CHARS
+
+
+def split_chunks(text: str, size: int = CHUNK_CHARS) -> List[str]:
+    """Split at paragraph (or line) breaks into chunks of roughly `size` characters"""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + size)
+        if end < len(text):
+            cut = text.rfind("\n\n", start + size // 2, end)
+            if cut < 0:
+                cut = text.rfind("\n", start + size // 2, end)
+            if cut > start:
+                end = cut
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        start = end
+    return chunks
+
+
+def format_key_figures(metrics: Dict[str, Dict[str, float]]) -> str:
+    """Headline figures from the financial statements, kept verbatim in every section's context"""
+    lines = []
+    for name, by_year in metrics.items():
+        values = ", ".join(f"{year}: {value:,.2f}" for year, value in sorted(by_year.items(), reverse=True))
+        unit = "" if name == "eps_diluted" else " (millions)"
+        lines.append(f"- {name.replace('_', ' ')}{unit}: {values}")
+    return "\n".join(lines)
+
+
+def _map_parallel(fn, items: list, workers: int) -> list:
+    """Run fn over items on a small pool, carrying the caller's context (cancellation token)"""
+    if len(items) <= 1 or workers <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="digest") as pool:
+        futures = [pool.submit(contextvars.copy_context().run, fn, item) for item in items]
+        try:
+            return [future.result() for future in futures]
+        except BaseException:
+            # One failed call sinks the digest: don't start the calls still queued
+            for future in futures:
+                future.cancel()
+            raise
+
+
+def _summarize(provider, prompt: str, context: str, policy: GenerationPolicy) -> str:
+    """
+    One digest call, admitted through the token budgets like a section request
+    The digest is shared by every session on the report, so it counts against the key and
+    provider budgets only
+    """
+    try:
+        reservation = get_token_governor().reserve(provider, None,
+                                                   request_tokens(provider, prompt, context) + policy.max_tokens)
+    except BudgetExceeded as e:
+        raise DigestUnavailable(str(e))
+    try:
+        answer = get_shared_completion(provider, prompt, context, policy, reservation)
+    except (CancelledError, BudgetExceeded):
+        raise
+    except Exception as e:
+        # SDK errors (rate limits, timeouts) sink the digest like failures returned as text
+        raise DigestUnavailable(f"summary failed: {e}")
+    if is_failed_answer(answer):
+        raise DigestUnavailable(f"summary failed: {(answer or 'empty answer')[:200]}")
+    return answer
+
+
+def _admit(provider, jobs: list, items: list, min_share_left: float):
+    """Refuse a digest whose calls would push the daily budgets into degrading section requests"""
+    outputs = len(jobs) * CHUNK_POLICY.max_tokens
+    decision = get_token_governor().plan(
+        provider, None, 0,
+        sum(request_tokens(provider, CHUNK_PROMPT, chunk) for _, chunk in jobs) + outputs,
+        outputs + len(items) * SECTION_POLICY.max_tokens + REPORT_POLICY.max_tokens
+    )
+    # Rate windows only pace the calls (each one waits for its reservation)
+    if decision.degraded or decision.share_left < min_share_left:
+        raise DigestUnavailable(f"not enough token budget left ({decision.tightest})")
+
+
+def build_digest(provider, text: str, key_figures: str = "", workers: int = DIGEST_WORKERS,
+                 min_share_left: float = 0.0) -> ReportDigest:
+    """
+    Summarize the report bottom-up; chunk summaries run in parallel
+    Raises DigestUnavailable when the budgets can't take it or any call fails; nothing partial is returned
+    """
+    start = time.perf_counter()
+    index = build_section_index(text)
+    items = [
+        (item, section.title)
+        for item, section in sorted(index.items(), key=lambda entry: entry[1].start)
+        if item not in SKIPPED_ITEMS
+    ]
+    calls = 0
+    input_chars = 0
+
+    # Level 1: chunk summaries, all items at once
+    jobs = []
+    for item, title in items:
+        for chunk in split_chunks(section_text(text, index, item)):
+            jobs.append((item, chunk))
+    _admit(provider, jobs, items, min_share_left)
+    input_chars += sum(len(chunk) for _, chunk in jobs)
+    summaries = _map_parallel(
+        lambda job: _summarize(provider, CHUNK_PROMPT, job[1], CHUNK_POLICY), jobs, workers
+    )
+    calls += len(jobs)
+
+    by_item: Dict[str, List[str]] = {}
+    for (item, _), summary in zip(jobs, summaries):
+        by_item.setdefault(item, []).append(summary.strip())
+
+    # Level 2: one summary per item (items that fit in one chunk keep their chunk summary)
+    merge = [(item, title) for item, title in items if len(by_item.get(item, ())) > 1]
+
+    def merge_item(entry):
+        item, title = entry
+        combined = "\n\n".join(by_item[item])
+        return _summarize(provider, SECTION_PROMPT.format(title=title), combined, SECTION_POLICY)
+
+    merged = dict(zip((item for item, _ in merge), _map_parallel(merge_item, merge, workers)))
+    calls += len(merge)
+    input_chars += sum(len("\n\n".join(by_item[item])) for item, _ in merge)
+    item_summaries = {
+        item: merged.get(item) or (by_item[item][0] if by_item.get(item) else "")
+        for item, _ in items
+    }
+
+    # Level 3: the whole-report digest
+    parts = "\n\n".join(
+        f"## {title or item}\n{item_summaries[item]}" for item, title in items if item_summaries.get(item)
+    )
+    if key_figures:
+        parts = f"## Key figures from the financial statements\n{key_figures}\n\n{parts}"
+    digest = _summarize(provider, REPORT_PROMPT, parts, REPORT_POLICY)
+    calls += 1
+    input_chars += len(parts)
+
+    return ReportDigest(digest, item_summaries, key_figures, len(jobs), calls, input_chars,
+                        time.perf_counter() - start)
+
+
+def digest_artifact_name(provider) -> str:
+    """Digests depend on the model that wrote them"""
+    return f"digest-{fingerprint(provider.provider_name, provider.model)[:12]}"
+
+
+def get_report_digest(provider, store, report_id: str, text: str, key_figures: str = "",
+                      min_share_left: float = 0.0) -> ReportDigest:
+    """
+    Digest for a report, built once per report and provider and cached in the report store
+    Raises DigestUnavailable when it can't be built; callers send the report itself instead
+    """
+    name = digest_artifact_name(provider)
+    digest = store.get_artifact(report_id, name)
+    # Digests stored before failed calls were caught may hold an error text
+    if digest is not None and not is_failed_answer(digest.digest):
+        return digest
+
+    def build():
+        built = build_digest(provider, text, key_figures, min_share_left=min_share_left)
+        store.put_artifact(report_id, name, built)
+        return built
+
+    return DIGEST_REQUESTS.do(fingerprint(report_id, name), build)
+
+
+def digest_context(digest: ReportDigest, text: str, section_key: str,
+                   raw_chars: int = RAW_SLICE_CHARS) -> str:
+    """
+    Context for one section: the report digest, summaries of the items the section draws on,
+    and the opening of those items verbatim
+    """
+    index = build_section_index(text)
+    items = sources_for(section_key, index)
+
+    parts = [f"## Report digest\n{digest.digest}"]
+    if digest.key_figures:
+        parts.append(f"## Key figures from the financial statements\n{digest.key_figures}")
+    summaries = [
+        f"### {index[item].title or item}\n{digest.item_summaries[item]}"
+        for item in items if digest.item_summaries.get(item) and item != FULL_REPORT
+    ]
+    if summaries:
+        parts.append("## Summaries of the relevant parts\n" + "\n\n".join(summaries))
+
+    per_item = raw_chars // max(1, len(items))
+    excerpts = [section_text(text, index, item)[:per_item].strip() for item in items]
+    parts.append("## Excerpts from the report\n" + "\n\n[...]\n\n".join(e for e in excerpts if e))
+    return "\n\n".join(parts)
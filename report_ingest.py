@@ -0,0 +1,71 @@
+"""
+Report ingestion
+Extracts a filing's text, statements and metadata into the report store, once per file
+content. Used for uploads and by the watchlist warm-up.
+"""
+
+import os
+
+from metrics import METRICS
+from report_store import get_default_store
+from single_flight import SingleFlight
+from upload_spool import SpooledUpload, copy_hashed
+
+HTML_EXTENSIONS = ('htm', 'html', 'xhtml')
+
+# Concurrent uploads of the same file are extracted once
+UPLOAD_INGESTS = SingleFlight("ingest")
+
+
+def _ingest_report_file(path: str, kind: str) -> str:
+    """Extract text and financial statements from a spooled upload into the report store"""
+    store = get_default_store()
+    if kind == 'html':
+        # Inline XBRL / HTML filing: streamed through an incremental parser
+        from html_ingest import extract_html
+        with open(path, 'rb') as f:
+            extraction = extract_html(f)
+        report_id = store.put_text(extraction.text)
+        store.put_artifact(report_id, "facts", extraction.facts)
+        store.put_artifact(report_id, "cover", extraction.dei)
+    else:
+        # Parsed memory-mapped in a worker process with time and memory limits; raises PdfParseError
+        from pdf_workers import parse_pdf
+        extraction = parse_pdf(path)
+        report_id = store.put_text(extraction.text)
+        store.put_artifact(report_id, "metadata", extraction.metadata)
+        store.put_artifact(report_id, "skipped_pages", extraction.skipped_pages)
+        store.put_artifact(report_id, "cleanup", {
+            "page_offsets": extraction.cleaned.page_offsets,
+            "summary": extraction.cleaned.summary()
+        })
+    store.put_artifact(report_id, "statements", extraction.statements)
+    return report_id
+
+
+def report_kind(file_name: str) -> str:
+    """'html' for .htm/.html/.xhtml filings, 'pdf' otherwise"""
+    return 'html' if file_name.lower().rsplit('.', 1)[-1] in HTML_EXTENSIONS else 'pdf'
+
+
+def ingest_report(upload: SpooledUpload) -> str:
+    """Report id for a spooled upload; a file processed before is recognized by its hash"""
+    store = get_default_store()
+    report_id = store.report_for_upload(upload.content_hash)
+    if report_id:
+        METRICS.increment("uploads.deduplicated")
+        return report_id
+
+    def extract():
+        extracted_id = _ingest_report_file(upload.path, report_kind(upload.file_name))
+        store.register_upload(upload.content_hash, extracted_id)
+        return extracted_id
+
+    return UPLOAD_INGESTS.do(upload.content_hash, extract)
+
+
+def local_upload(path: str) -> SpooledUpload:
+    """A filing already on disk, hashed like an upload (so uploading it later is recognized)"""
+    with open(path, "rb") as f, open(os.devnull, "wb") as sink:
+        content_hash, size = copy_hashed(f, sink)
+    return SpooledUpload(path, os.path.basename(path), content_hash, size)
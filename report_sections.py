@@ -0,0 +1,113 @@
+"""
+Section index for annual reports
+Locates the standard 10-K items (Business, Risk Factors, MD&A, ...) in extracted text and
+maps each analysis section to the parts of the report it draws on
+"""
+
+import re
+from typing import Dict, List
+
+# 10-K item headings, e.g. "Item 1A. Risk Factors" or "ITEM 7 - MANAGEMENT'S DISCUSSION"
+ITEM_PATTERN = re.compile(
+    r'^[ \t]*item[ \t]+(1a|1b|1c|1|2|3|4|5|6|7a|7|8|9a|9b|9c|9|10|11|12|13|14|15|16)\b[ \t]*[.:\-–—]?[ \t]*([^\n]{0,100})',
+    re.IGNORECASE | re.MULTILINE
+)
+
+ITEM_TITLES = {
+    "1": "Business",
+    "1a": "Risk Factors",
+    "1b": "Unresolved Staff Comments",
+    "1c": "Cybersecurity",
+    "2": "Properties",
+    "3": "Legal Proceedings",
+    "4": "Mine Safety Disclosures",
+    "5": "Market for Registrant's Common Equity",
+    "6": "Reserved",
+    "7": "Management's Discussion and Analysis",
+    "7a": "Quantitative and Qualitative Disclosures About Market Risk",
+    "8": "Financial Statements and Supplementary Data",
+    "9": "Changes in and Disagreements with Accountants",
+    "9a": "Controls and Procedures",
+    "9b": "Other Information",
+    "9c": "Disclosure Regarding Foreign Jurisdictions",
+    "10": "Directors, Executive Officers and Corporate Governance",
+    "11": "Executive Compensation",
+    "12": "Security Ownership",
+    "13": "Certain Relationships and Related Transactions",
+    "14": "Principal Accountant Fees and Services",
+    "15": "Exhibits and Financial Statement Schedules",
+    "16": "Form 10-K Summary"
+}
+
+# Key used when a report has no recognizable 10-K structure
+FULL_REPORT = "full"
+
+# Which report items each analysis section draws on ("cover" is the text before Item 1)
+SECTION_SOURCES = {
+    "quick_stats": ["cover", "5"],
+    "business_overview": ["1"],
+    "business_model_map": ["7", "8"],
+    "the_machine": ["1", "7"],
+    "ecosystem": ["1", "1a"],
+    "industry_deep_dive": ["1", "7"],
+    "risk_analysis": ["1a", "7a"],
+    "seven_powers": ["1", "1a", "7"],
+    "bull_bear_cases": ["1a", "7"]
+}
+
+
+class ReportSection:
+    """A span of the report text belonging to one item"""
+
+    def __init__(self, item: str, title: str, start: int, end: int):
+        self.item = item
+        self.title = title
+        self.start = start
+        self.end = end
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __repr__(self):
+        return f"ReportSection({self.item!r}, {self.title!r}, {self.start}, {self.end})"
+
+
+def build_section_index(text: str) -> Dict[str, ReportSection]:
+    """
+    Index the report by 10-K item
+    Item headings also appear in the table of contents, so for each item the
+    longest span between consecutive headings is kept
+    """
+    matches = list(ITEM_PATTERN.finditer(text))
+    if not matches:
+        return {FULL_REPORT: ReportSection(FULL_REPORT, "Full Report", 0, len(text))}
+
+    index: Dict[str, ReportSection] = {}
+    for i, match in enumerate(matches):
+        item = match.group(1).lower()
+        start = match.start()
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        best = index.get(item)
+        if best is None or end - start > len(best):
+            title = match.group(2).strip() or ITEM_TITLES.get(item, "")
+            index[item] = ReportSection(item, title, start, end)
+
+    first_item = min(section.start for section in index.values())
+    if first_item > 0:
+        index["cover"] = ReportSection("cover", "Cover Page", 0, first_item)
+
+    return index
+
+
+def section_text(text: str, index: Dict[str, ReportSection], item: str) -> str:
+    section = index.get(item)
+    return text[section.start:section.end] if section else ""
+
+
+def sources_for(section_key: str, index: Dict[str, ReportSection]) -> List[str]:
+    """Report items an analysis section draws on, restricted to those present in the index"""
+    if FULL_REPORT in index:
+        return [FULL_REPORT]
+    items = [item for item in SECTION_SOURCES.get(section_key, []) if item in index]
+    # Fall back to the whole report when none of the expected items were found
+    return items or sorted(index, key=lambda item: index[item].start)
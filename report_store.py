@@ -0,0 +1,417 @@
+"""
+Shared, reference-counted store for report artifacts
+Sessions keep a small report handle; the extracted text lives compressed on disk with
+a bounded in-memory cache, and per-session analyses are kept compressed
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+
+from cancellation import SESSION_END, get_cancellations
+from shared_cache import SharedCache, get_shared_cache
+from upload_spool import get_upload_spool
+
+DEFAULT_STORE_DIR = os.environ.get(
+    "FUNDAMENTALS_STORE_DIR",
+    os.path.join(tempfile.gettempdir(), "fundamentals_reports")
+)
+DEFAULT_MAX_MEMORY_BYTES = int(os.environ.get("FUNDAMENTALS_STORE_MAX_MB", "256")) * 1024 * 1024
+DEFAULT_IDLE_SECONDS = int(os.environ.get("FUNDAMENTALS_SESSION_IDLE_SECONDS", "1800"))
+
+
+def report_id_for_text(text: str) -> str:
+    """Content hash used as the report handle"""
+    return hashlib.sha256(text.encode("utf-8", errors="replace")).hexdigest()[:32]
+
+
+def company_key(company_name: str) -> str:
+    """Normalized company name used to match filings across years"""
+    return re.sub(r'[^a-z0-9]+', ' ', company_name.lower()).strip()
+
+
+def encode_artifact(name: str, value):
+    """JSON-safe form of an artifact; artifacts are never pickled, so a stored one cannot run code"""
+    if name == "statements":
+        return {statement: table.to_dict() for statement, table in value.items()}
+    if name == "skipped_pages":
+        return {str(page): reason for page, reason in value.items()}
+    if name == "cleanup":
+        return dict(value, page_offsets=[int(offset) for offset in value["page_offsets"]])
+    if name == "facts" or name.startswith("digest-"):
+        return value.to_dict()
+    return value
+
+
+def decode_artifact(name: str, value):
+    if name == "statements":
+        from statement_extraction import StatementTable
+        return {statement: StatementTable.from_dict(table) for statement, table in value.items()}
+    if name == "skipped_pages":
+        return {int(page): reason for page, reason in value.items()}
+    if name == "cleanup":
+        import numpy as np
+        return dict(value, page_offsets=np.array(value["page_offsets"], dtype=np.int64))
+    if name == "facts":
+        from html_ingest import FactTable
+        return FactTable.from_dict(value)
+    if name.startswith("digest-"):
+        from report_digest import ReportDigest
+        return ReportDigest.from_dict(value)
+    return value
+
+
+class _Session:
+    """What the store tracks for one browser session"""
+
+    def __init__(self):
+        self.report_id: Optional[str] = None
+        self.analyses: Dict[str, bytes] = {}
+        self.last_seen = time.monotonic()
+
+    def analyses_bytes(self) -> int:
+        return sum(len(v) for v in self.analyses.values())
+
+
+class ReportStore:
+    """
+    Process-wide store for report text and analyses
+
+    - Report text is stored once per content hash, zlib-compressed on disk
+    - Decompressed text is kept in an LRU cache bounded by `max_memory_bytes`;
+      reports nobody references are the first to go
+    - Sessions reference reports through `acquire`; idle sessions are evicted
+      after `idle_seconds` and their analyses dropped
+    - With a `shared` cache, text, artifacts and the upload index are also written there,
+      and local misses are filled from it, so replicas see each other's reports
+    """
+
+    def __init__(self, root: str = DEFAULT_STORE_DIR,
+                 max_memory_bytes: int = DEFAULT_MAX_MEMORY_BYTES,
+                 idle_seconds: int = DEFAULT_IDLE_SECONDS,
+                 shared: Optional[SharedCache] = None):
+        self.root = root
+        self.max_memory_bytes = max_memory_bytes
+        self.idle_seconds = idle_seconds
+        self.shared = shared
+        os.makedirs(self.root, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._hot: "OrderedDict[str, str]" = OrderedDict()
+        self._hot_bytes = 0
+        self._refs: Dict[str, Set[str]] = {}
+        self._sessions: Dict[str, _Session] = {}
+        self._last_sweep = time.monotonic()
+
+    # Report text
+
+    def _path(self, report_id: str) -> str:
+        return os.path.join(self.root, f"{report_id}.txt.z")
+
+    def put_text(self, text: str) -> str:
+        """Store report text (deduplicated by content) and return its report id"""
+        report_id = report_id_for_text(text)
+        path = self._path(report_id)
+        if not os.path.exists(path):
+            self._write_text(path, text)
+            if self.shared:
+                self.shared.set_text("text", (report_id,), text)
+        with self._lock:
+            self._remember(report_id, text)
+        return report_id
+
+    def _write_text(self, path: str, text: str):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(zlib.compress(text.encode("utf-8", errors="replace"), 6))
+        os.replace(tmp_path, path)
+
+    def _fetch_shared_text(self, report_id: str) -> bool:
+        """Copy a report's text from the shared cache to local disk, if it is there"""
+        text = self.shared.get_text("text", report_id) if self.shared else None
+        if text is None:
+            return False
+        self._write_text(self._path(report_id), text)
+        return True
+
+    def has_text(self, report_id: str) -> bool:
+        return (report_id in self._hot or os.path.exists(self._path(report_id))
+                or self._fetch_shared_text(report_id))
+
+    def get_text(self, report_id: str) -> str:
+        """Return report text, from memory if hot, otherwise decompressed from disk"""
+        with self._lock:
+            text = self._hot.get(report_id)
+            if text is not None:
+                self._hot.move_to_end(report_id)
+                return text
+
+        if not os.path.exists(self._path(report_id)):
+            self._fetch_shared_text(report_id)
+        with open(self._path(report_id), "rb") as f:
+            text = zlib.decompress(f.read()).decode("utf-8")
+
+        with self._lock:
+            self._remember(report_id, text)
+        return text
+
+    def _remember(self, report_id: str, text: str):
+        """Add text to the hot cache, then evict until under the memory ceiling"""
+        if report_id not in self._hot:
+            self._hot[report_id] = text
+            self._hot_bytes += len(text)
+        self._hot.move_to_end(report_id)
+        self._enforce_ceiling()
+
+    def _enforce_ceiling(self):
+        # Unreferenced reports go first, then least recently used
+        for only_unreferenced in (True, False):
+            for report_id in list(self._hot):
+                if self.memory_bytes() <= self.max_memory_bytes:
+                    return
+                if only_unreferenced and self._refs.get(report_id):
+                    continue
+                self._hot_bytes -= len(self._hot.pop(report_id))
+
+    # Sessions
+
+    def acquire(self, session_id: str, report_id: str):
+        """Point a session at a report (releasing whatever it held before)"""
+        with self._lock:
+            session = self._sessions.setdefault(session_id, _Session())
+            if session.report_id != report_id:
+                self._release_report(session_id, session)
+                session.analyses = {}
+                session.report_id = report_id
+                self._refs.setdefault(report_id, set()).add(session_id)
+            session.last_seen = time.monotonic()
+
+    def release(self, session_id: str):
+        """Forget a session and drop its reference"""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session:
+                self._release_report(session_id, session)
+
+    def _release_report(self, session_id: str, session: _Session):
+        refs = self._refs.get(session.report_id)
+        if refs is not None:
+            refs.discard(session_id)
+            if not refs:
+                del self._refs[session.report_id]
+
+    def touch(self, session_id: str, report_id: Optional[str] = None):
+        """
+        Mark a session active; re-acquires its report if it was evicted while idle
+        Also sweeps idle sessions at most once a minute
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None and report_id:
+                self.acquire(session_id, report_id)
+            elif session is not None:
+                session.last_seen = time.monotonic()
+
+            now = time.monotonic()
+            if now - self._last_sweep > 60:
+                self._last_sweep = now
+                self.evict_idle()
+
+    def evict_idle(self) -> int:
+        """Release sessions idle for longer than idle_seconds; returns how many were evicted"""
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            idle = [sid for sid, s in self._sessions.items() if s.last_seen < cutoff]
+            for session_id in idle:
+                self.release(session_id)
+                get_cancellations().cancel_session(session_id, SESSION_END)
+                get_upload_spool().release(session_id)
+            self._enforce_ceiling()
+        return len(idle)
+
+    # Analyses
+
+    def get_analysis(self, session_id: str, section_key: str) -> Optional[str]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            blob = session.analyses.get(section_key) if session else None
+        return zlib.decompress(blob).decode("utf-8") if blob is not None else None
+
+    def set_analysis(self, session_id: str, section_key: str, analysis: str):
+        blob = zlib.compress(analysis.encode("utf-8", errors="replace"), 6)
+        with self._lock:
+            session = self._sessions.setdefault(session_id, _Session())
+            session.analyses[section_key] = blob
+            session.last_seen = time.monotonic()
+            self._enforce_ceiling()
+
+    def clear_analyses(self, session_id: str):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session:
+                session.analyses = {}
+
+    # Derived artifacts (financial statements, digests, ...) cached alongside the report text
+
+    def _artifact_path(self, report_id: str, name: str) -> str:
+        return os.path.join(self.root, "artifacts", report_id, f"{name}.json.z")
+
+    def put_artifact(self, report_id: str, name: str, value, shared: bool = True):
+        encoded = encode_artifact(name, value)
+        path = self._artifact_path(report_id, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(zlib.compress(json.dumps(encoded).encode("utf-8"), 6))
+        os.replace(tmp_path, path)
+        if shared and self.shared:
+            self.shared.set_json("artifact", (report_id, name), encoded)
+
+    def get_artifact(self, report_id: str, name: str, default=None):
+        try:
+            with open(self._artifact_path(report_id, name), "rb") as f:
+                return decode_artifact(name, json.loads(zlib.decompress(f.read())))
+        except FileNotFoundError:
+            pass
+        encoded = self.shared.get_json("artifact", report_id, name) if self.shared else None
+        if encoded is None:
+            return default
+        try:
+            value = decode_artifact(name, encoded)
+        except (KeyError, TypeError, ValueError) as e:
+            # Written by an older layout of the artifact: a miss
+            print(f"Cache error (decode artifact {name}): {e!r}")
+            return default
+        self.put_artifact(report_id, name, value, shared=False)
+        return value
+
+    # Analysis archive, filing history and processed uploads (persisted across restarts)
+
+    def _archive_path(self, report_id: str, section_key: str) -> str:
+        return os.path.join(self.root, "analyses", report_id, f"{section_key}.z")
+
+    def archive_analysis(self, report_id: str, section_key: str, analysis: str):
+        """Keep an analysis with its report beyond the session that produced it"""
+        path = self._archive_path(report_id, section_key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(zlib.compress(analysis.encode("utf-8", errors="replace"), 6))
+        os.replace(tmp_path, path)
+
+    def get_archived_analysis(self, report_id: str, section_key: str) -> Optional[str]:
+        try:
+            with open(self._archive_path(report_id, section_key), "rb") as f:
+                return zlib.decompress(f.read()).decode("utf-8")
+        except FileNotFoundError:
+            return None
+
+    def _filings_path(self) -> str:
+        return os.path.join(self.root, "filings.json")
+
+    def _load_filings(self) -> Dict[str, list]:
+        try:
+            with open(self._filings_path()) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def register_filing(self, company_name: str, report_id: str):
+        """Record that a report was analyzed for a company (most recent last)"""
+        company = company_key(company_name)
+        with self._lock:
+            filings = self._load_filings()
+            history = [r for r in filings.get(company, []) if r != report_id]
+            history.append(report_id)
+            filings[company] = history[-10:]
+            tmp_path = f"{self._filings_path()}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(filings, f)
+            os.replace(tmp_path, self._filings_path())
+
+    def _upload_path(self, content_hash: str) -> str:
+        return os.path.join(self.root, "uploads", f"{content_hash[:32]}.id")
+
+    def register_upload(self, content_hash: str, report_id: str):
+        """Remember which report an uploaded file (by content hash) was extracted into"""
+        path = self._upload_path(content_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(report_id)
+        os.replace(tmp_path, path)
+        if self.shared:
+            self.shared.set_text("upload", (content_hash,), report_id)
+
+    def report_for_upload(self, content_hash: str) -> Optional[str]:
+        """Report previously extracted from this exact file, if its text is still stored"""
+        try:
+            with open(self._upload_path(content_hash)) as f:
+                report_id = f.read().strip()
+        except FileNotFoundError:
+            report_id = self.shared.get_text("upload", content_hash) if self.shared else None
+        return report_id if report_id and self.has_text(report_id) else None
+
+    def previous_filing(self, company_name: str, report_id: str) -> Optional[str]:
+        """Most recent other report for the same company whose text is still stored"""
+        with self._lock:
+            history = self._load_filings().get(company_key(company_name), [])
+        for previous_id in reversed(history):
+            if previous_id != report_id and self.has_text(previous_id):
+                return previous_id
+        return None
+
+    # Reporting
+
+    def memory_bytes(self) -> int:
+        """Approximate bytes held in memory (hot text plus compressed analyses)"""
+        return self._hot_bytes + sum(s.analyses_bytes() for s in self._sessions.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "referenced_reports": len(self._refs),
+                "hot_reports": len(self._hot),
+                "hot_text_bytes": self._hot_bytes,
+                "memory_bytes": self.memory_bytes(),
+                "max_memory_bytes": self.max_memory_bytes
+            }
+
+    def session_footprints(self) -> Dict[str, int]:
+        """
+        Per-session bytes attributable to the store: its analyses plus an even
+        share of the hot text of the report it references
+        """
+        with self._lock:
+            footprints = {}
+            for session_id, session in self._sessions.items():
+                shared = 0
+                text = self._hot.get(session.report_id) if session.report_id else None
+                if text is not None:
+                    shared = len(text) // max(1, len(self._refs.get(session.report_id, ())))
+                footprints[session_id] = session.analyses_bytes() + shared
+            return footprints
+
+
+_default_store: Optional[ReportStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_store() -> ReportStore:
+    """Process-wide store shared by every session"""
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                cache = get_shared_cache()
+                # An in-process cache would only duplicate what the store keeps itself
+                _default_store = ReportStore(shared=cache if cache.backend.distributed else None)
+    return _default_store
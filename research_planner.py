@@ -0,0 +1,141 @@
+"""
+Research query planning
+Sections ask for overlapping web searches: business overview, ecosystem and industry all look
+up competitors, and overview and bull/bear both look up news. Each section declares its
+searches as intents on a topic. Intents on the same topic are merged into one query that
+fetches as many results as the most demanding section uses. The query runs once per company,
+and each section takes its share of the results.
+"""
+
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metrics import METRICS
+from single_flight import SingleFlight
+
+
+class QueryIntent:
+    """A search a section wants: its topic, how the section phrases it and how many results it uses"""
+
+    def __init__(self, topic: str, query: str, num_results: int = 3):
+        self.topic = topic
+        self.query = query
+        self.num_results = num_results
+
+
+# Industry searches are anchored on the company ("<company> industry ...") rather than on an
+# industry name guessed from a first search, which cost a query and often returned a sentence
+SECTION_INTENTS: Dict[str, List[QueryIntent]] = {
+    "quick_stats": [
+        QueryIntent("profile", "{company} market cap sector industry", 3)
+    ],
+    "business_overview": [
+        QueryIntent("overview", "{company} company overview business model", 3),
+        QueryIntent("competitors", "{company} competitors market share", 3),
+        QueryIntent("news", "{company} recent news developments 2024", 3),
+        QueryIntent("industry_trends", "{company} industry trends outlook", 3)
+    ],
+    "ecosystem": [
+        QueryIntent("competitors", "{company} main competitors comparison", 5)
+    ],
+    "industry_deep_dive": [
+        QueryIntent("industry_analysis", "{company} industry analysis 2024", 3),
+        QueryIntent("industry_trends", "{company} industry market trends forecast", 3),
+        QueryIntent("competitors", "{company} industry major players competition", 3)
+    ],
+    "risk_analysis": [
+        QueryIntent("risks", "{company} risks challenges concerns", 3),
+        QueryIntent("industry_risks", "{company} industry risks regulatory", 3)
+    ],
+    "bull_bear_cases": [
+        QueryIntent("news", "{company} news 2024", 5)
+    ]
+}
+
+
+class PlannedQuery:
+    """One outbound search serving every section that asked for its topic"""
+
+    def __init__(self, topic: str, query: str, num_results: int, sections: List[str]):
+        self.topic = topic
+        self.query = query
+        self.num_results = num_results
+        self.sections = sections
+
+
+class ResearchPlan:
+    """
+    The merged query set for one company
+    Queries run on first use, so a section only waits for its own topics; later sections
+    that share a topic take their results from the first run
+    """
+
+    def __init__(self, company_name: str, search: Callable[[str, int], List[dict]],
+                 sections: Optional[List[str]] = None):
+        self.company_name = company_name
+        self.search = search
+        self.queries: Dict[str, PlannedQuery] = {}
+        # Searches the sections would issue on their own
+        self.requested = 0
+        self.issued = 0
+        self._results: Dict[str, List[dict]] = {}
+        self._lock = threading.Lock()
+        self._flights = SingleFlight("research")
+
+        for section in sections or list(SECTION_INTENTS):
+            for intent in SECTION_INTENTS.get(section, ()):
+                self.requested += 1
+                query = intent.query.format(company=company_name)
+                planned = self.queries.get(intent.topic)
+                if planned is None:
+                    self.queries[intent.topic] = PlannedQuery(intent.topic, query, intent.num_results, [section])
+                    continue
+                planned.sections.append(section)
+                # The section that uses the most results decides the phrasing
+                if intent.num_results > planned.num_results:
+                    planned.query, planned.num_results = query, intent.num_results
+        METRICS.increment("research.queries_requested", self.requested)
+        METRICS.increment("research.queries_planned", len(self.queries))
+
+    def results(self, section: str) -> List[Tuple[str, List[dict]]]:
+        """(query that ran, the section's share of its results) for each of the section's intents"""
+        gathered = []
+        for intent in SECTION_INTENTS.get(section, ()):
+            planned = self.queries.get(intent.topic)
+            if planned is not None:
+                gathered.append((planned.query, self._run(planned)[:intent.num_results]))
+        return gathered
+
+    def _run(self, planned: PlannedQuery) -> List[dict]:
+        with self._lock:
+            results = self._results.get(planned.topic)
+        if results is not None:
+            return results
+
+        def search():
+            # A run of this topic may have finished between the check above and joining the flight
+            with self._lock:
+                results = self._results.get(planned.topic)
+            if results is not None:
+                return results
+            results = self.search(planned.query, planned.num_results)
+            METRICS.increment("research.searches")
+            with self._lock:
+                self.issued += 1
+                # Empty results are usually a blocked request: let the next section try again
+                if results:
+                    self._results[planned.topic] = results
+            return results
+
+        # Sections (or threads) asking for a topic at the same time share one search
+        return self._flights.do(planned.topic, search)
+
+    def summary(self) -> dict:
+        saved = self.requested - len(self.queries)
+        return {
+            "requested": self.requested,
+            "planned": len(self.queries),
+            "saved": saved,
+            "saved_share": saved / self.requested if self.requested else 0.0,
+            "merged": {p.topic: sorted(set(p.sections)) for p in self.queries.values() if len(p.sections) > 1}
+        }
@@ -0,0 +1,174 @@
+"""
+Section prompts
+Shared by the section pages and the watchlist warm-up, so a warmed analysis answers the
+same question the app asks
+"""
+
+SECTION_PROMPTS = {
+    "quick_stats": """Analyze this annual report and provide a concise one-liner summary with:
+    - Sector and Industry classification
+    - Market capitalization (if mentioned)
+    - Stock ticker symbol
+
+    Format: "[Company Name] | [Sector] - [Industry] | Market Cap: $X.XB"
+
+    Keep it brief and factual.""",
+
+    "business_overview": """Provide a quick but comprehensive overview of the business covering:
+
+    1. **How It Makes Money**: Primary revenue streams and business model
+    2. **Customers**: Who are the main customer segments?
+    3. **Suppliers**: Key suppliers and dependencies
+    4. **Rivals**: Main competitors in the market
+    5. **Ecosystem**: Key partners, platforms, or ecosystem players
+    6. **Company History**: Brief history and major milestones
+
+    Keep each subsection concise (2-3 sentences). Use bullet points for clarity.""",
+
+    "business_model_map": """Analyze the annual report and extract:
+
+    1. **Revenue Breakdown**: List all major revenue streams with approximate percentages or dollar amounts
+    2. **Cost Structure**: Break down major cost categories (COGS, SG&A, R&D, etc.) with amounts
+    3. **Gross Profit and Operating Profit**: Extract these key metrics
+
+    Format your response as a structured breakdown that can be used to create a flow diagram.
+    Include actual numbers from the report whenever possible.""",
+
+    "the_machine": """Analyze the business as a machine with three components:
+
+    1. **INPUTS**: What goes into the business?
+       - Raw materials, technology, talent, capital, data, etc.
+       - Key dependencies and resources
+
+    2. **PROCESS**: How does the business transform inputs?
+       - Core operations and capabilities
+       - Key processes and technologies
+       - Value creation mechanisms
+
+    3. **OUTPUTS**: What comes out?
+       - Products and services
+       - Value delivered to customers
+       - Financial outcomes
+
+    Provide a detailed but clear explanation of each component.""",
+
+    "ecosystem": """Provide a detailed analysis of the company's ecosystem:
+
+    1. **CUSTOMERS**:
+       - Customer segments and characteristics
+       - Customer concentration and dependencies
+       - Customer acquisition and retention
+
+    2. **SUPPLIERS**:
+       - Key suppliers and supply chain
+       - Supplier power and dependencies
+       - Supply chain risks
+
+    3. **COMPETITION**:
+       - Direct competitors
+       - Competitive positioning
+       - Market share dynamics
+
+    4. **SUBSTITUTES**:
+       - Alternative solutions or products
+       - Threat of substitution
+
+    5. **OTHER CHARACTERISTICS**:
+       - Network effects
+       - Regulatory environment
+       - Industry dynamics
+
+    Be specific and use information from the annual report.""",
+
+    "industry_deep_dive": """Provide a comprehensive analysis of the industry:
+
+    1. **Industry Overview**: Market size, growth rates, maturity
+    2. **Key Trends**: Major trends shaping the industry
+    3. **Market Dynamics**: Supply/demand dynamics, pricing power
+    4. **Technology Impact**: How technology is disrupting or enabling
+    5. **Regulatory Environment**: Key regulations affecting the industry
+    6. **Future Outlook**: Where is the industry headed?
+
+    Draw insights from the annual report's industry discussion sections.""",
+
+    "risk_analysis": """Extract and analyze all major risks facing the business:
+
+    1. **Strategic Risks**: Competition, market position, strategic execution
+    2. **Operational Risks**: Supply chain, operations, execution risks
+    3. **Financial Risks**: Debt, liquidity, currency, interest rate risks
+    4. **Regulatory & Legal Risks**: Compliance, litigation, regulatory changes
+    5. **Technology Risks**: Cybersecurity, technological disruption
+    6. **Market Risks**: Economic conditions, market volatility
+    7. **ESG Risks**: Environmental, social, governance risks
+
+    For each risk category, highlight the most material risks mentioned in the report.
+    Rate each category as High/Medium/Low risk based on disclosure emphasis.""",
+
+    "seven_powers": """Assess the company across Hamilton Helmer's 7 Powers framework:
+
+    1. **SCALE ECONOMIES**: Does increasing scale reduce per-unit costs?
+       - Assessment: Strong/Moderate/Weak
+       - Evidence from the report
+       - Comparison to competitors
+
+    2. **NETWORK EFFECTS**: Does the product become more valuable as more people use it?
+       - Assessment: Strong/Moderate/Weak
+       - Evidence and examples
+
+    3. **COUNTER-POSITIONING**: Does the business model create disadvantages for incumbents?
+       - Assessment: Strong/Moderate/Weak
+       - How it differs from traditional competitors
+
+    4. **SWITCHING COSTS**: How difficult is it for customers to switch to competitors?
+       - Assessment: Strong/Moderate/Weak
+       - Types of switching costs present
+
+    5. **BRANDING**: Does the brand command premium pricing or preference?
+       - Assessment: Strong/Moderate/Weak
+       - Brand strength indicators
+
+    6. **CORNERED RESOURCE**: Does the company have unique access to key resources?
+       - Assessment: Strong/Moderate/Weak
+       - What resources and how defensible
+
+    7. **PROCESS POWER**: Are there proprietary processes that competitors can't replicate?
+       - Assessment: Strong/Moderate/Weak
+       - Examples of unique processes
+
+    For each power, provide assessment, reasoning, and competitive comparison.""",
+
+    "bull_bear_cases": """Develop comprehensive bull and bear investment cases:
+
+    **🐂 BULL CASE - What Needs to Go RIGHT:**
+
+    1. Key assumptions that must hold true
+    2. Market opportunities that materialize
+    3. Execution on strategic initiatives
+    4. Favorable industry trends
+    5. Competitive advantages that strengthen
+    6. Financial targets achieved
+    7. Potential upside scenarios
+
+    **🐻 BEAR CASE - What Could Go WRONG:**
+
+    1. Key risks that materialize
+    2. Market opportunities that don't materialize
+    3. Execution failures or challenges
+    4. Adverse industry trends
+    5. Competitive threats intensify
+    6. Financial challenges or misses
+    7. Potential downside scenarios
+
+    Be specific and realistic. Base scenarios on information and risks disclosed in the annual report.
+    For each case, provide 5-7 concrete points."""
+}
+
+
+def section_prompt(section_key: str) -> str:
+    """Prompt for a section, including any output format it needs"""
+    prompt = SECTION_PROMPTS[section_key]
+    if section_key == "business_model_map":
+        # Deferred: only needed once the section is analyzed
+        from financial_extraction import JSON_INSTRUCTIONS
+        prompt += JSON_INSTRUCTIONS
+    return prompt
@@ -0,0 +1,336 @@
+"""
+Shared cache for work that is expensive to repeat: extracted report text and artifacts,
+LLM responses and search results
+
+Replicas behind a load balancer share one backend, so a session that reconnects to another
+replica finds the same report and answers instead of paying for them again. Backends:
+- "memory": in-process LRU (the default; one replica)
+- "sqlite:///path/cache.db": SQLite on shared storage, writes serialized by a lock file
+- "redis://host:6379/0": any Redis-compatible server (requires `pip install redis`)
+- "off": no caching
+
+Every backend stores bytes under the same key schema, "fundamentals:v1:<namespace>:<hash>",
+and values over COMPRESS_MIN_BYTES are zlib-compressed. Backend failures and values that
+don't decode count as misses.
+
+Everything is stored as text or JSON (report artifacts included), never pickled, so a value
+read back from a shared backend cannot run code in the app.
+"""
+
+import itertools
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from metrics import METRICS
+from single_flight import fingerprint
+
+CACHE_URL = os.environ.get("FUNDAMENTALS_CACHE", "memory")
+KEY_PREFIX = "fundamentals"
+SCHEMA_VERSION = "v1"
+COMPRESS_MIN_BYTES = 1024
+MEMORY_MAX_BYTES = int(os.environ.get("FUNDAMENTALS_CACHE_MAX_MB", "128")) * 1024 * 1024
+# Entries without a TTL (report text, artifacts) would otherwise grow the database file forever
+SQLITE_MAX_BYTES = int(os.environ.get("FUNDAMENTALS_CACHE_SQLITE_MAX_MB", "2048")) * 1024 * 1024
+# Writes between checks of the database size (summing it scans the table)
+SQLITE_SIZE_CHECK_EVERY = 64
+
+# Seconds an entry lives, per namespace (None: until evicted)
+DAY = 24 * 3600
+TTL_SECONDS: Dict[str, Optional[int]] = {
+    "text": None,
+    "artifact": None,
+    "upload": None,
+    "llm": 30 * DAY,
+    "similar": 30 * DAY,
+    "search": DAY,
+    "research": DAY
+}
+
+# One-byte value header: raw or zlib-compressed
+RAW = b"r"
+COMPRESSED = b"z"
+
+
+def cache_key(namespace: str, *parts) -> str:
+    """Key shared by every backend and replica: fundamentals:v1:<namespace>:<hash of parts>"""
+    return f"{KEY_PREFIX}:{SCHEMA_VERSION}:{namespace}:{fingerprint(*parts)}"
+
+
+def encode_value(value: bytes) -> bytes:
+    if len(value) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(value, 6)
+        if len(compressed) < len(value):
+            return COMPRESSED + compressed
+    return RAW + value
+
+
+def decode_value(stored: bytes) -> bytes:
+    header, body = stored[:1], stored[1:]
+    return zlib.decompress(body) if header == COMPRESSED else body
+
+
+class CacheBackend:
+    """Byte store with optional expiry; subclasses implement get, set and delete"""
+
+    name = "off"
+    # Whether other processes (replicas) see the same entries
+    distributed = False
+
+    def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        pass
+
+    def delete(self, key: str):
+        pass
+
+
+class MemoryBackend(CacheBackend):
+    """In-process LRU bounded by total value bytes"""
+
+    name = "memory"
+
+    def __init__(self, max_bytes: int = MEMORY_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, expires)
+        self._bytes = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.time():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (value, time.time() + ttl if ttl else None)
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                self._pop(next(iter(self._entries)))
+
+    def delete(self, key: str):
+        with self._lock:
+            self._pop(key)
+
+    def _pop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[0])
+
+
+@contextmanager
+def file_lock(path: str, exclusive: bool = True):
+    """
+    Advisory lock on `path` (created if missing)
+    SQLite's own locking is unreliable on network filesystems, so replicas sharing a
+    database file serialize through this lock as well. No-op where fcntl is unavailable.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class SQLiteBackend(CacheBackend):
+    """SQLite database on storage shared by the replicas"""
+
+    name = "sqlite"
+    distributed = True
+
+    def __init__(self, path: str, max_bytes: int = SQLITE_MAX_BYTES):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._writes = itertools.count(1)
+        with file_lock(self.lock_path):
+            connection = self._connection()
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)")
+            self._evict(connection)
+
+    def _connection(self):
+        # One connection per thread; sqlite3 connections are not shared across threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            import sqlite3  # Deferred: only the SQLite backend needs it
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            # Rollback journal rather than WAL: WAL needs shared memory, which network filesystems lack
+            connection.execute("PRAGMA journal_mode=DELETE")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str) -> Optional[bytes]:
+        with file_lock(self.lock_path, exclusive=False):
+            row = self._connection().execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return bytes(row[0])
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        expires = time.time() + ttl if ttl else None
+        with file_lock(self.lock_path):
+            connection = self._connection()
+            connection.execute("INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                               (key, value, expires))
+            connection.execute("DELETE FROM cache WHERE expires IS NOT NULL AND expires < ?", (time.time(),))
+            if next(self._writes) % SQLITE_SIZE_CHECK_EVERY == 0:
+                self._evict(connection)
+
+    def _evict(self, connection):
+        """Drop the oldest writes until the values fit in 90% of max_bytes (called under the file lock)"""
+        total = connection.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - int(self.max_bytes * 0.9)
+        # INSERT OR REPLACE gives a rewritten key a new rowid, so rowid order is write order
+        cutoff = None
+        for rowid, size in connection.execute("SELECT rowid, LENGTH(value) FROM cache ORDER BY rowid"):
+            cutoff = rowid
+            excess -= size
+            if excess <= 0:
+                break
+        evicted = connection.execute("DELETE FROM cache WHERE rowid <= ?", (cutoff,)).rowcount
+        METRICS.increment("cache.evictions", evicted)
+
+    def delete(self, key: str):
+        with file_lock(self.lock_path):
+            self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+
+class RedisBackend(CacheBackend):
+    """Client for a Redis-compatible server"""
+
+    name = "redis"
+    distributed = True
+
+    def __init__(self, url: str):
+        try:
+            import redis  # Optional dependency: only needed for a Redis-backed deployment
+        except ImportError:
+            raise ImportError("FUNDAMENTALS_CACHE names a Redis server; install the client with: pip install redis")
+        self.url = url
+        # RESP2: spoken by every Redis-compatible server, including pre-6 Redis
+        self._client = redis.Redis.from_url(url, protocol=2, socket_timeout=5, socket_connect_timeout=5)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        self._client.set(key, value, ex=ttl)
+
+    def delete(self, key: str):
+        self._client.delete(key)
+
+
+def create_backend(url: str) -> CacheBackend:
+    """Backend for a FUNDAMENTALS_CACHE setting"""
+    if url in ("", "off", "none"):
+        return CacheBackend()
+    if url == "memory":
+        return MemoryBackend()
+    if url.startswith("sqlite://"):
+        return SQLiteBackend(url[len("sqlite://"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"Unknown cache backend: {url}")
+
+
+class SharedCache:
+    """Namespaced, compressed values over a backend; backend errors are counted and treated as misses"""
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+
+    def get_bytes(self, namespace: str, *parts) -> Optional[bytes]:
+        try:
+            stored = self.backend.get(cache_key(namespace, *parts))
+        except Exception as e:
+            METRICS.increment("cache.errors")
+            print(f"Cache error ({self.backend.name} get): {e}")
+            return None
+        if stored is None:
+            METRICS.increment(f"cache.{namespace}.misses")
+            return None
+        try:
+            value = decode_value(stored)
+        except zlib.error as e:
+            return self._undecodable(namespace, e)
+        METRICS.increment(f"cache.{namespace}.hits")
+        return value
+
+    def _undecodable(self, namespace: str, error: Exception, default=None):
+        # A truncated value, or one written by an older layout of the class it holds
+        METRICS.increment("cache.errors")
+        METRICS.increment(f"cache.{namespace}.misses")
+        print(f"Cache error ({self.backend.name} decode {namespace}): {error!r}")
+        return default
+
+    def set_bytes(self, namespace: str, parts: tuple, value: bytes):
+        try:
+            self.backend.set(cache_key(namespace, *parts), encode_value(value), TTL_SECONDS.get(namespace))
+        except Exception as e:
+            METRICS.increment("cache.errors")
+            print(f"Cache error ({self.backend.name} set): {e}")
+
+    def get_text(self, namespace: str, *parts) -> Optional[str]:
+        value = self.get_bytes(namespace, *parts)
+        try:
+            return value.decode("utf-8") if value is not None else None
+        except UnicodeDecodeError as e:
+            return self._undecodable(namespace, e)
+
+    def set_text(self, namespace: str, parts: tuple, text: str):
+        self.set_bytes(namespace, parts, text.encode("utf-8", errors="replace"))
+
+    def get_json(self, namespace: str, *parts, default=None):
+        value = self.get_bytes(namespace, *parts)
+        if value is None:
+            return default
+        try:
+            return json.loads(value)
+        except ValueError as e:
+            return self._undecodable(namespace, e, default)
+
+    def set_json(self, namespace: str, parts: tuple, value):
+        self.set_bytes(namespace, parts, json.dumps(value).encode("utf-8"))
+
+
+_cache: Optional[SharedCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_shared_cache() -> SharedCache:
+    """Process-wide cache on the backend named by FUNDAMENTALS_CACHE"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SharedCache(create_backend(CACHE_URL))
+    return _cache
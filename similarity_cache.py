@@ -0,0 +1,268 @@
+"""
+Approximate reuse of analyses for near-identical inputs
+The same filing re-exported by another PDF producer, or web research that differs by one
+result, misses the exact-hash caches. Here the report context is fingerprinted with SimHash
+and the web research block with MinHash. An earlier analysis for the same section, prompt,
+model and generation policy is reused when both fingerprints are similar enough.
+"""
+
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from metrics import METRICS
+from shared_cache import SharedCache, get_shared_cache
+
+SIMHASH_BITS = 64
+# Share of SimHash bits that must agree (0.95: at most 3 of 64 differ); 0 turns the cache off
+CONTEXT_THRESHOLD = float(os.environ.get("FUNDAMENTALS_SIMILARITY_THRESHOLD", "0.95"))
+# Estimated Jaccard similarity of the research results (one result per line)
+RESEARCH_THRESHOLD = float(os.environ.get("FUNDAMENTALS_RESEARCH_SIMILARITY_THRESHOLD", "0.5"))
+MAX_ENTRIES = int(os.environ.get("FUNDAMENTALS_SIMILARITY_MAX_ENTRIES", "50000"))
+SHINGLE_WORDS = 3
+MINHASH_PERMUTATIONS = 64
+# Mersenne prime for the MinHash permutations (a * x + b) mod p
+MINHASH_PRIME = (1 << 61) - 1
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _words(text: str) -> List[str]:
+    # NFKC folds ligatures and full-width characters that differ between PDF producers
+    return _WORD.findall(unicodedata.normalize("NFKC", text).lower())
+
+
+def _hash64(value: str) -> int:
+    # Stable across processes, unlike hash()
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of a text's word shingles; similar texts differ in few bits"""
+    import numpy as np  # Deferred: only needed once an analysis is requested
+
+    words = _words(text)
+    if not words:
+        return 0
+    shingles = {}
+    for i in range(max(1, len(words) - SHINGLE_WORDS + 1)):
+        shingle = " ".join(words[i:i + SHINGLE_WORDS])
+        shingles[shingle] = shingles.get(shingle, 0) + 1
+    hashes = np.fromiter((_hash64(s) for s in shingles), dtype=np.uint64, count=len(shingles))
+    weights = np.fromiter(shingles.values(), dtype=np.int64, count=len(shingles))
+    bits = ((hashes[:, None] >> np.arange(SIMHASH_BITS, dtype=np.uint64)) & np.uint64(1)).astype(np.int64)
+    # Each shingle votes +weight for its set bits and -weight for the others
+    votes = (2 * bits - 1).T @ weights
+    return sum(1 << int(bit) for bit in np.nonzero(votes > 0)[0])
+
+
+# Fixed seed: signatures must compare equal across processes and restarts
+_rng = random.Random(20240601)
+_MINHASH_A = [_rng.randrange(1, MINHASH_PRIME) for _ in range(MINHASH_PERMUTATIONS)]
+_MINHASH_B = [_rng.randrange(0, MINHASH_PRIME) for _ in range(MINHASH_PERMUTATIONS)]
+
+
+def minhash(text: str) -> bytes:
+    """MinHash signature of a text's non-empty lines (normalized); empty text gives b"" """
+    lines = {" ".join(_words(line)) for line in text.splitlines()}
+    lines.discard("")
+    if not lines:
+        return b""
+    values = [_hash64(line) % MINHASH_PRIME for line in lines]
+    signature = array("Q", (min((a * x + b) % MINHASH_PRIME for x in values)
+                            for a, b in zip(_MINHASH_A, _MINHASH_B)))
+    return signature.tobytes()
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def minhash_similarity(a: bytes, b: bytes) -> float:
+    """Estimated Jaccard similarity; two empty research blocks are identical"""
+    if not a or not b:
+        return 1.0 if a == b else 0.0
+    first, second = array("Q", a), array("Q", b)
+    return sum(x == y for x, y in zip(first, second)) / len(first)
+
+
+class SimHashIndex:
+    """
+    Fingerprints within `max_distance` bits of a query, per scope
+    Fingerprints are split into max_distance + 1 blocks. Any fingerprint within max_distance
+    bits matches the query exactly on at least one block, so a lookup only compares the entries
+    that share a block with it instead of every entry.
+    """
+
+    def __init__(self, max_distance: int):
+        self.max_distance = max(0, min(SIMHASH_BITS - 1, max_distance))
+        count = self.max_distance + 1
+        width = SIMHASH_BITS // count
+        self._blocks = []
+        for i in range(count):
+            bits = width if i < count - 1 else SIMHASH_BITS - width * (count - 1)
+            self._blocks.append((i * width, (1 << bits) - 1))
+        self._tables: List[Dict[Tuple[str, int], Set[int]]] = [{} for _ in self._blocks]
+        self._fingerprints: Dict[int, Tuple[str, int]] = {}
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+    def _keys(self, scope: str, fingerprint: int):
+        for table, (shift, mask) in zip(self._tables, self._blocks):
+            yield table, (scope, (fingerprint >> shift) & mask)
+
+    def add(self, entry_id: int, scope: str, fingerprint: int):
+        self._fingerprints[entry_id] = (scope, fingerprint)
+        for table, key in self._keys(scope, fingerprint):
+            table.setdefault(key, set()).add(entry_id)
+
+    def remove(self, entry_id: int):
+        scope, fingerprint = self._fingerprints.pop(entry_id)
+        for table, key in self._keys(scope, fingerprint):
+            ids = table.get(key)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del table[key]
+
+    def nearest(self, scope: str, fingerprint: int) -> List[Tuple[int, int]]:
+        """(distance, entry id) of entries within max_distance bits, closest first"""
+        candidates = set()
+        for table, key in self._keys(scope, fingerprint):
+            candidates.update(table.get(key, ()))
+        matches = []
+        for entry_id in candidates:
+            distance = hamming(fingerprint, self._fingerprints[entry_id][1])
+            if distance <= self.max_distance:
+                matches.append((distance, entry_id))
+        matches.sort()
+        return matches
+
+
+class InputFingerprint:
+    """SimHash of a request's report context and MinHash of its web research"""
+
+    def __init__(self, context: int, research: bytes):
+        self.context = context
+        self.research = research
+
+
+class SimilarMatch:
+    """An earlier analysis served for a near-identical request"""
+
+    def __init__(self, analysis: str, context_similarity: float, research_similarity: float):
+        self.analysis = analysis
+        self.context_similarity = context_similarity
+        self.research_similarity = research_similarity
+
+    def describe(self) -> str:
+        return (f"report text {self.context_similarity:.0%} similar, "
+                f"web research {self.research_similarity:.0%} similar")
+
+
+class _Entry:
+    def __init__(self, scope: str, fingerprint: InputFingerprint, storage_key: Tuple):
+        self.scope = scope
+        self.fingerprint = fingerprint
+        self.storage_key = storage_key
+
+
+class SimilarityCache:
+    """
+    Near-duplicate lookup in front of the provider for one kind of request (a `scope`: section,
+    prompt, model and policy). The index stays in process; analyses live in the shared cache.
+    """
+
+    def __init__(self, context_threshold: float = CONTEXT_THRESHOLD, research_threshold: float = RESEARCH_THRESHOLD,
+                 max_entries: int = MAX_ENTRIES, shared: Optional[SharedCache] = None):
+        self.shared = shared or get_shared_cache()
+        # Analyses are kept in the shared cache, so there is nothing to reuse when it is off
+        self.enabled = context_threshold > 0 and self.shared.backend.name != "off"
+        self.research_threshold = research_threshold
+        self.max_entries = max_entries
+        self.index = SimHashIndex(int(round((1 - context_threshold) * SIMHASH_BITS)))
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._next_id = 0
+
+    def fingerprint(self, context: str, research: str = "") -> InputFingerprint:
+        start = time.perf_counter()
+        fingerprint = InputFingerprint(simhash(context), minhash(research))
+        METRICS.observe("similarity.fingerprint_ms", (time.perf_counter() - start) * 1000)
+        return fingerprint
+
+    def lookup(self, scope: str, fingerprint: InputFingerprint) -> Optional[SimilarMatch]:
+        """Closest earlier analysis whose context and research are both similar enough"""
+        if not self.enabled:
+            return None
+        start = time.perf_counter()
+        with self._lock:
+            candidates = []
+            for distance, entry_id in self.index.nearest(scope, fingerprint.context):
+                entry = self._entries[entry_id]
+                research_similarity = minhash_similarity(fingerprint.research, entry.fingerprint.research)
+                if research_similarity >= self.research_threshold:
+                    candidates.append((entry_id, entry, 1 - distance / SIMHASH_BITS, research_similarity))
+        METRICS.observe("similarity.lookup_ms", (time.perf_counter() - start) * 1000)
+
+        for entry_id, entry, context_similarity, research_similarity in candidates:
+            analysis = self.shared.get_text("similar", *entry.storage_key)
+            if analysis is None:
+                # Evicted from the shared cache: forget the fingerprint too
+                self._forget(entry_id)
+                continue
+            with self._lock:
+                if entry_id in self._entries:
+                    self._entries.move_to_end(entry_id)
+            METRICS.increment("similarity.hits")
+            return SimilarMatch(analysis, context_similarity, research_similarity)
+        METRICS.increment("similarity.misses")
+        return None
+
+    def add(self, scope: str, fingerprint: InputFingerprint, analysis: str):
+        if not self.enabled:
+            return
+        storage_key = (scope, fingerprint.context, fingerprint.research.hex())
+        self.shared.set_text("similar", storage_key, analysis)
+        with self._lock:
+            for distance, existing_id in self.index.nearest(scope, fingerprint.context):
+                if distance == 0 and self._entries[existing_id].storage_key == storage_key:
+                    self._entries.move_to_end(existing_id)
+                    return
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(scope, fingerprint, storage_key)
+            self.index.add(entry_id, scope, fingerprint.context)
+            while len(self._entries) > self.max_entries:
+                oldest, _ = self._entries.popitem(last=False)
+                self.index.remove(oldest)
+
+    def _forget(self, entry_id: int):
+        with self._lock:
+            if self._entries.pop(entry_id, None) is not None:
+                self.index.remove(entry_id)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_similarity_cache: Optional[SimilarityCache] = None
+_similarity_cache_lock = threading.Lock()
+
+
+def get_similarity_cache() -> SimilarityCache:
+    """Process-wide similarity cache"""
+    global _similarity_cache
+    if _similarity_cache is None:
+        with _similarity_cache_lock:
+            if _similarity_cache is None:
+                _similarity_cache = SimilarityCache()
+    return _similarity_cache
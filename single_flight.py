@@ -0,0 +1,101 @@
+"""
+Process-wide single-flight registry for expensive outbound requests
+Concurrent identical requests attach to one outstanding call and share its result or error
+"""
+
+import hashlib
+import threading
+from typing import Any, Callable, Dict
+
+from cancellation import CancelledError, checkpoint
+
+
+def fingerprint(*parts) -> str:
+    """
+    Build a stable request key from its parts (provider, model, prompt, ...)
+    Large parts are hashed so keys stay small
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8", errors="replace"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+class _InFlightCall:
+    """A single outstanding call that any number of waiters can attach to"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls with the same key
+
+    The first caller (the leader) runs the function; callers arriving while it
+    is still running block until it finishes and receive the same result or
+    exception. Once the call completes the key is released, so later calls
+    run fresh (result caching is left to the callers' own caches).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _InFlightCall] = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        while True:
+            try:
+                return self._do(key, fn)
+            except CancelledError:
+                # The leader was cancelled by its own session; unless this caller was cancelled
+                # too, run the call again rather than fail with someone else's cancellation
+                checkpoint()
+
+    def _do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _InFlightCall()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+            else:
+                call.waiters += 1
+                self.shared += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def in_flight(self) -> int:
+        """Number of distinct calls currently outstanding"""
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "executed": self.executed,
+            "shared": self.shared,
+            "in_flight": self.in_flight()
+        }
@@ -0,0 +1,422 @@
+"""
+Table-aware extraction of financial statements from PDF annual reports
+Finds the income statement, balance sheet and cash-flow statement pages by keyword density,
+rebuilds their rows and columns from PyPDF2 text positions, and stores the line items as a
+compact columnar table per statement (one column per fiscal year)
+"""
+
+import bisect
+import re
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from amount_normalization import AMOUNT_PATTERN, DASHES, detect_currency, normalize_amounts
+
+INCOME_STATEMENT = "income_statement"
+BALANCE_SHEET = "balance_sheet"
+CASH_FLOW = "cash_flow"
+
+# Statement titles (strong signal) and line-item vocabulary (density signal)
+STATEMENT_TITLES = {
+    INCOME_STATEMENT: re.compile(r'statements? of (consolidated )?(operations|income|earnings|comprehensive income)|income statements?', re.I),
+    BALANCE_SHEET: re.compile(r'balance sheets?|statements? of financial (position|condition)', re.I),
+    CASH_FLOW: re.compile(r'statements? of cash flows?|cash flows? statements?', re.I)
+}
+STATEMENT_KEYWORDS = {
+    INCOME_STATEMENT: re.compile(r'net sales|revenues?|cost of (sales|revenues?|goods)|gross (profit|margin)|operating (income|expenses)|net income|per share|diluted', re.I),
+    BALANCE_SHEET: re.compile(r'total assets|total liabilities|current assets|current liabilities|stockholders.? equity|shareholders.? equity|retained earnings|goodwill', re.I),
+    CASH_FLOW: re.compile(r'operating activities|investing activities|financing activities|depreciation|capital expenditures|cash equivalents', re.I)
+}
+MIN_KEYWORD_HITS = 5
+
+YEAR = re.compile(r'^(?:fiscal\s+)?((?:19|20)\d\d)$', re.I)
+ROW_TOLERANCE = 3.0
+# Approximate glyph width, for positions of cells that share one text run
+CHAR_WIDTH = 4.5
+# Also bare "Basic"/"Diluted" rows under an earnings-per-share heading, but not the share counts
+# ("Diluted weighted-average shares outstanding") that often follow them
+PER_SHARE = re.compile(r'^(?!.*\b(shares|weighted)\b)(.*per (common )?share|(basic|diluted)\b)', re.I)
+
+# Line items used for the deterministic key metrics
+LINE_ITEMS = {
+    "revenue": (INCOME_STATEMENT, re.compile(r'^(total )?(net )?(revenues?|sales|net sales|net revenues?)( and other income)?$|^total (net )?(revenues?|sales)', re.I)),
+    "cost_of_revenue": (INCOME_STATEMENT, re.compile(r'^(total )?cost of (revenues?|sales|goods sold|products sold)', re.I)),
+    "gross_profit": (INCOME_STATEMENT, re.compile(r'^gross (profit|margin)', re.I)),
+    "operating_income": (INCOME_STATEMENT, re.compile(r'^(total )?operating (income|profit|loss)|^income (\(loss\) )?from operations', re.I)),
+    "net_income": (INCOME_STATEMENT, re.compile(r'^net (income|earnings|loss)(?!.*per share)', re.I)),
+    "eps_diluted": (INCOME_STATEMENT, re.compile(
+        r'^(?!.*\b(shares|weighted)\b)(?=.*\bdiluted\b)(.*\b(per (common )?share|earnings|eps)\b|diluted\W*$)', re.I)),
+    "total_assets": (BALANCE_SHEET, re.compile(r'^total assets', re.I)),
+    "total_liabilities": (BALANCE_SHEET, re.compile(r'^total liabilities$', re.I)),
+    "cash_from_operations": (CASH_FLOW, re.compile(r'^net cash (provided by|from|generated).*operating', re.I))
+}
+
+# Non-operating lines between operating income and net income
+TAX_LINE = re.compile(r'\btax(es)?\b', re.I)
+INCOME_LINE = re.compile(r'\b(income|gains?)\b', re.I)
+
+
+class StatementTable:
+    """
+    One financial statement in columnar form
+    `values[i, j]` is line item `labels[i]` for fiscal year `years[j]`, in millions (NaN if blank)
+    of `currency` (an ISO code, "" when the statement doesn't show one)
+    """
+
+    def __init__(self, statement: str, years: Tuple[str, ...], labels: Tuple[str, ...],
+                 values: np.ndarray, pages: Tuple[int, ...], currency: str = ""):
+        self.statement = statement
+        self.years = years
+        self.labels = labels
+        self.values = values
+        self.pages = pages
+        self.currency = currency
+
+    def find(self, pattern) -> Optional[int]:
+        """Row index of the first line item whose label matches"""
+        for i, label in enumerate(self.labels):
+            if pattern.search(label):
+                return i
+        return None
+
+    def latest_column(self) -> int:
+        """Column of the most recent fiscal year (the first column when the headers aren't years)"""
+        years = [(year, j) for j, year in enumerate(self.years) if year.isdigit()]
+        return max(years)[1] if years else 0
+
+    def get(self, pattern, year: Optional[str] = None) -> Optional[float]:
+        """Value of the first matching line item for a year (latest by default)"""
+        row = self.find(pattern)
+        if row is None or not self.years:
+            return None
+        column = self.years.index(year) if year in self.years else self.latest_column()
+        value = self.values[row, column]
+        return None if np.isnan(value) else float(value)
+
+    def rows(self):
+        for label, row in zip(self.labels, self.values):
+            yield label, row
+
+    def to_dict(self) -> dict:
+        """JSON-safe form (blank values as None), e.g. for analysis bundles"""
+        return {
+            "statement": self.statement,
+            "years": list(self.years),
+            "labels": list(self.labels),
+            "values": [[None if np.isnan(v) else float(v) for v in row] for row in self.values],
+            "pages": list(self.pages),
+            "currency": self.currency
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "StatementTable":
+        values = np.array([[np.nan if v is None else v for v in row] for row in data["values"]], dtype=float)
+        return cls(data["statement"], tuple(data["years"]), tuple(data["labels"]),
+                   values.reshape(len(data["labels"]), len(data["years"])), tuple(data["pages"]),
+                   data.get("currency", ""))
+
+
+def classify_page(page_text: str) -> Optional[str]:
+    """Which statement a page holds, if any: a title match plus enough line-item vocabulary"""
+    head = page_text[:600]
+    best, best_hits = None, 0
+    for statement, title in STATEMENT_TITLES.items():
+        hits = len(STATEMENT_KEYWORDS[statement].findall(page_text))
+        if title.search(head):
+            hits += MIN_KEYWORD_HITS
+        if hits > best_hits:
+            best, best_hits = statement, hits
+    return best if best_hits >= 2 * MIN_KEYWORD_HITS else None
+
+
+def _collect_fragments(page) -> List[Tuple[float, float, str]]:
+    """(x, y, text) for every text run on a page, via PyPDF2's visitor callback"""
+    fragments = []
+
+    def visitor(text, cm, tm, font_dict, font_size):
+        text = text.replace("\n", " ")
+        if not text.strip():
+            return
+        x = tm[4] * cm[0] + tm[5] * cm[2] + cm[4]
+        y = tm[4] * cm[1] + tm[5] * cm[3] + cm[5]
+        fragments.append((x, y, text))
+
+    page.extract_text(visitor_text=visitor)
+    return fragments
+
+
+def _is_amount(token: str) -> bool:
+    token = token.strip()
+    return token in DASHES or AMOUNT_PATTERN.fullmatch(token) is not None
+
+
+def _split_cells(x: float, text: str, char_width: float = CHAR_WIDTH):
+    """
+    Split a text run into label text and numeric cells with estimated x positions
+    Runs often hold several cells ("$ 12,345   $ 11,000") or a stray "$"
+    """
+    label_parts, cells = [], []
+    offset = 0
+    for token in re.split(r'(\s+)', text):
+        if token and not token.isspace():
+            if token in ("$", "€", "£", "¥"):
+                pass
+            elif _is_amount(token) and not (label_parts and not cells and token.isdigit() and len(token) < 3):
+                cells.append((x + offset * char_width, token))
+            elif not cells:
+                label_parts.append(token)
+        offset += len(token)
+    return " ".join(label_parts), cells
+
+
+def _group_rows(fragments):
+    """Group fragments into visual rows (top to bottom, left to right)"""
+    rows = []
+    for x, y, text in sorted(fragments, key=lambda f: (-f[1], f[0])):
+        if rows and abs(rows[-1][0] - y) <= ROW_TOLERANCE:
+            rows[-1][1].append((x, text))
+        else:
+            rows.append((y, [(x, text)]))
+    return [sorted(items) for _, items in rows]
+
+
+def parse_statement_page(page, page_text: str):
+    """
+    Rebuild the table on one statement page
+    Returns (years, column x positions, [(label, [(x, cell), ...]), ...], scale caption)
+    """
+    years, year_x = [], []
+    rows = []
+    pending_label = ""
+
+    for items in _group_rows(_collect_fragments(page)):
+        tokens = [
+            (x + match.start() * CHAR_WIDTH, match.group(0))
+            for x, text in items for match in re.finditer(r'\S+', text)
+        ]
+        if tokens and all(YEAR.match(t) for _, t in tokens) and not years:
+            years = [YEAR.match(t).group(1) for _, t in tokens]
+            year_x = [x for x, _ in tokens]
+            continue
+
+        label_parts, cells = [], []
+        for x, text in items:
+            label, row_cells = _split_cells(x, text)
+            if label:
+                label_parts.append(label)
+            cells.extend(row_cells)
+        label = " ".join(label_parts).strip(" .:")
+
+        if not cells:
+            # Wrapped label: keep it for the next numeric row
+            pending_label = label if label and label[0].isalpha() else ""
+            continue
+        if pending_label and label and label[0].islower():
+            label = f"{pending_label} {label}"
+        pending_label = ""
+        if label:
+            rows.append((label, cells))
+
+    return years, year_x, rows, page_text[:800]
+
+
+def _column_boundaries(xs: List[float], columns: int) -> Optional[List[float]]:
+    """
+    Split cell x positions into `columns` groups at the widest gaps
+    Numbers are right-aligned under centered headers, so clustering the cells themselves
+    is more reliable than matching each cell to the nearest header
+    """
+    positions = sorted(set(round(x) for x in xs))
+    if len(positions) < columns:
+        return None
+    gaps = sorted(range(1, len(positions)), key=lambda i: positions[i] - positions[i - 1], reverse=True)
+    return sorted((positions[i] + positions[i - 1]) / 2 for i in gaps[:columns - 1])
+
+
+def _to_table(statement: str, page_number: int, years, year_x, rows, caption: str) -> Optional[StatementTable]:
+    if not rows:
+        return None
+    if not years:
+        width = max(len(cells) for _, cells in rows)
+        years = [f"col{i + 1}" for i in range(width)]
+        year_x = None
+
+    boundaries = _column_boundaries([x for _, cells in rows for x, _ in cells], len(years)) if year_x else None
+
+    labels = []
+    cells_by_column = [[] for _ in years]
+    for label, cells in rows:
+        row_cells = [""] * len(years)
+        if year_x is None:
+            for j, (_, cell) in enumerate(cells[:len(years)]):
+                row_cells[j] = cell
+        else:
+            for x, cell in cells:
+                column = bisect.bisect(boundaries, x) if boundaries is not None else \
+                    min(range(len(year_x)), key=lambda j: abs(year_x[j] - x))
+                row_cells[column] = cell
+        labels.append(label)
+        for j, cell in enumerate(row_cells):
+            cells_by_column[j].append(cell)
+
+    # Normalize each year column in bulk, honoring the caption's declared scale
+    normalized = [normalize_amounts(column, caption=caption, unit="millions") for column in cells_by_column]
+    columns = [column.values for column in normalized]
+    values = np.column_stack(columns) if columns else np.empty((len(labels), 0))
+    # Currency marked on the cells ("$ 12,345"), else declared in the caption ("€ in millions")
+    marked = [code for column in normalized for code in column.currency if code]
+    currency = max(set(marked), key=marked.count) if marked else detect_currency(caption)
+
+    # Per-share amounts are exempt from the caption's scale ("in millions, except per share")
+    for i, label in enumerate(labels):
+        if PER_SHARE.search(label):
+            row = [column[i] for column in cells_by_column]
+            values[i] = normalize_amounts(row, unit="units", default_unit="units").values
+    return StatementTable(statement, tuple(years), tuple(labels), values, (page_number,), currency)
+
+
+def _merge(first: StatementTable, second: StatementTable) -> StatementTable:
+    """Continue a statement across pages when the year columns line up"""
+    if first.years != second.years:
+        return first
+    return StatementTable(
+        first.statement,
+        first.years,
+        first.labels + second.labels,
+        np.vstack([first.values, second.values]),
+        first.pages + second.pages,
+        first.currency or second.currency
+    )
+
+
+def extract_statements(pages, page_texts: List[str], page_guard=None) -> Dict[str, StatementTable]:
+    """
+    Extract the primary financial statements
+    Only pages classified as statements by keyword density are re-parsed with positions;
+    `page_guard(page_number)`, if given, is a context manager wrapped around each re-parse
+    """
+    tables: Dict[str, StatementTable] = {}
+    for page_number, page_text in enumerate(page_texts):
+        statement = classify_page(page_text)
+        if statement is None:
+            continue
+        try:
+            with page_guard(page_number) if page_guard else nullcontext():
+                table = _to_table(statement, page_number, *parse_statement_page(pages[page_number], page_text))
+        except Exception as e:
+            print(f"Statement extraction error on page {page_number + 1}: {e}")
+            continue
+        if table is None:
+            continue
+        if statement in tables:
+            # Keep the first statement found (later hits are usually notes or segment tables),
+            # unless this page continues it
+            if tables[statement].pages[-1] == page_number - 1:
+                tables[statement] = _merge(tables[statement], table)
+        elif len(table.labels) >= 3:
+            tables[statement] = table
+    return tables
+
+
+def key_metrics(tables: Dict[str, StatementTable]) -> Dict[str, Dict[str, float]]:
+    """Headline figures per fiscal year, e.g. {"revenue": {"2024": 12345.0, "2023": ...}}"""
+    metrics = {}
+    for name, (statement, pattern) in LINE_ITEMS.items():
+        table = tables.get(statement)
+        if table is None:
+            continue
+        row = table.find(pattern)
+        if row is None:
+            continue
+        metrics[name] = {
+            year: float(value) for year, value in zip(table.years, table.values[row]) if not np.isnan(value)
+        }
+    return metrics
+
+
+def statements_currency(tables: Dict[str, StatementTable]) -> str:
+    """Reporting currency of the statements, preferring the income statement's"""
+    for statement in (INCOME_STATEMENT, BALANCE_SHEET, CASH_FLOW):
+        table = tables.get(statement)
+        if table is not None and table.currency:
+            return table.currency
+    return ""
+
+
+def _adds_to_income(label: str, amount: float) -> bool:
+    """
+    Whether a non-operating line raises net income, by its sign as presented: income and gains
+    are positive ("Other income (expense), net  45"), a tax provision is positive as an expense
+    and negative as a benefit, and expenses and losses are deductions either way
+    """
+    if TAX_LINE.search(label):
+        return amount < 0
+    return amount > 0 and INCOME_LINE.search(label) is not None
+
+
+def business_model_from_statements(tables: Dict[str, StatementTable]):
+    """
+    Business model (revenue, cost lines, profit levels) for the latest year, straight from
+    the income statement; None when the statement lacks revenue
+    """
+    from financial_extraction import BusinessModelData
+
+    table = tables.get(INCOME_STATEMENT)
+    if table is None or not table.years:
+        return None
+
+    def row_of(name):
+        return table.find(LINE_ITEMS[name][1])
+
+    revenue_row = row_of("revenue")
+    if revenue_row is None:
+        return None
+    # Statements list years either way round
+    latest = table.values[:, table.latest_column()]
+    revenue = abs(latest[revenue_row])
+    if np.isnan(revenue) or revenue <= 0:
+        return None
+
+    # Revenue lines listed above a "total" revenue row are its segments
+    segments = [(table.labels[i], abs(latest[i])) for i in range(revenue_row) if not np.isnan(latest[i]) and latest[i] > 0]
+    if not segments or abs(sum(a for _, a in segments) - revenue) > 0.01 * revenue:
+        segments = [("Revenue", revenue)]
+
+    gross_row, operating_row, net_row = row_of("gross_profit"), row_of("operating_income"), row_of("net_income")
+    cost_row = row_of("cost_of_revenue")
+
+    costs = []
+    if cost_row is not None and not np.isnan(latest[cost_row]):
+        costs.append((table.labels[cost_row], "cost_of_revenue", abs(latest[cost_row])))
+    start = max(r for r in (revenue_row, cost_row, gross_row) if r is not None) + 1
+    if operating_row is not None:
+        for i in range(start, operating_row):
+            if not np.isnan(latest[i]) and latest[i] != 0 and not table.labels[i].lower().startswith("total"):
+                costs.append((table.labels[i], "operating", abs(latest[i])))
+    if operating_row is not None and net_row is not None:
+        for i in range(operating_row + 1, net_row):
+            if not np.isnan(latest[i]) and latest[i] != 0 and not table.labels[i].lower().startswith(("total", "income before")):
+                category = "other_income" if _adds_to_income(table.labels[i], latest[i]) else "other"
+                costs.append((table.labels[i], category, abs(latest[i])))
+
+    def value(row):
+        return None if row is None or np.isnan(latest[row]) else float(latest[row])
+
+    gross_profit = value(gross_row)
+    if gross_profit is None and cost_row is not None:
+        gross_profit = revenue - abs(latest[cost_row])
+
+    return BusinessModelData(
+        segment_names=tuple(name for name, _ in segments),
+        segment_amounts=np.array([amount for _, amount in segments], dtype=np.float64),
+        cost_names=tuple(name for name, _, _ in costs),
+        cost_categories=tuple(category for _, category, _ in costs),
+        cost_amounts=np.array([amount for _, _, amount in costs], dtype=np.float64),
+        total_revenue=float(revenue),
+        gross_profit=gross_profit,
+        operating_profit=value(operating_row),
+        net_income=value(net_row),
+        currency=table.currency
+    )
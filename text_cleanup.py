@@ -0,0 +1,138 @@
+"""
+Layout-noise stripping for extracted report text
+Removes running headers and footers, page numbers and the table of contents, rejoins
+hyphenated line breaks and collapses whitespace, keeping a map from the cleaned text back
+to the original pages. Every step is a single pass over the lines, so cost is linear in size.
+"""
+
+import re
+from collections import Counter
+from typing import Dict, List
+
+import numpy as np
+
+# Lines this close to the top or bottom of a page are header/footer candidates
+MARGIN_LINES = 3
+# A margin line repeated on at least this share of pages is a running header or footer
+REPEAT_SHARE = 0.3
+MIN_REPEAT_PAGES = 3
+
+PAGE_NUMBER_PATTERN = re.compile(
+    r'^(?:page\s+)?(?:\d{1,3}|[ivxlc]{1,6})(?:\s+of\s+\d{1,4})?$|^[-–—]\s*\d{1,4}\s*[-–—]$',
+    re.IGNORECASE
+)
+TOC_HEADING_PATTERN = re.compile(r'^(?:table\s+of\s+contents|contents|index)$', re.IGNORECASE)
+# "Item 7. Management's Discussion and Analysis ..... 45"
+TOC_ENTRY_PATTERN = re.compile(r'(?:\.{2,}|\s)\s*\d{1,4}$')
+TOC_MIN_SHARE = 0.4
+DIGITS = re.compile(r'\d+')
+SPACES = re.compile(r'[ \t\xa0]+')
+HYPHENATED = re.compile(r'[A-Za-z]-$')
+
+
+class CleanedText:
+    """
+    Cleaned report text with its page map
+    `page_offsets[i]` is where original page i starts in `text` (pages that became empty
+    share the offset of the next page)
+    """
+
+    def __init__(self, text: str, page_offsets: np.ndarray, original_chars: int, removed: Dict[str, int]):
+        self.text = text
+        self.page_offsets = page_offsets
+        self.original_chars = original_chars
+        self.removed = removed
+
+    @property
+    def compression_ratio(self) -> float:
+        """Cleaned size as a share of the original (lower is more compact)"""
+        return len(self.text) / self.original_chars if self.original_chars else 1.0
+
+    def page_for_offset(self, offset: int) -> int:
+        """Original page number (0-based) of a character in the cleaned text"""
+        return max(0, int(np.searchsorted(self.page_offsets, offset, side="right")) - 1)
+
+    def summary(self) -> str:
+        parts = [f"{count} {what}" for what, count in self.removed.items() if count]
+        detail = f" (removed {', '.join(parts)})" if parts else ""
+        return (f"{len(self.text):,} characters after cleanup, {self.compression_ratio:.0%} "
+                f"of the {self.original_chars:,} extracted{detail}")
+
+
+def _margin_key(line: str) -> str:
+    """Header/footer identity ignoring page numbers and case"""
+    return DIGITS.sub('#', line.lower())
+
+
+def _is_toc_page(lines: List[str]) -> bool:
+    if not any(TOC_HEADING_PATTERN.match(line) for line in lines[:MARGIN_LINES + 2]):
+        return False
+    entries = sum(1 for line in lines if TOC_ENTRY_PATTERN.search(line))
+    return entries >= TOC_MIN_SHARE * len(lines)
+
+
+def clean_pages(page_texts: List[str]) -> CleanedText:
+    """Clean per-page text as extracted from the PDF"""
+    removed = Counter()
+    original_chars = sum(len(text) for text in page_texts)
+
+    pages = []
+    for text in page_texts:
+        lines = [SPACES.sub(' ', line).strip() for line in text.splitlines()]
+        pages.append([line for line in lines if line])
+
+    # Running headers and footers: margin lines repeated across many pages
+    margin_pages = Counter()
+    for lines in pages:
+        margin = lines[:MARGIN_LINES] + lines[-MARGIN_LINES:] if len(lines) > 2 * MARGIN_LINES else lines
+        margin_pages.update({_margin_key(line) for line in margin})
+    threshold = max(MIN_REPEAT_PAGES, REPEAT_SHARE * len(pages))
+    repeated = {key for key, count in margin_pages.items() if count >= threshold}
+
+    kept_lines: List[str] = []
+    line_pages: List[int] = []
+    for page_number, lines in enumerate(pages):
+        toc_page = _is_toc_page(lines)
+        last = len(lines) - 1
+        for i, line in enumerate(lines):
+            in_margin = i < MARGIN_LINES or i > last - MARGIN_LINES
+            if in_margin and _margin_key(line) in repeated:
+                removed["header/footer lines"] += 1
+            elif in_margin and PAGE_NUMBER_PATTERN.match(line):
+                removed["page numbers"] += 1
+            elif toc_page and (TOC_ENTRY_PATTERN.search(line) or TOC_HEADING_PATTERN.match(line)):
+                removed["table of contents lines"] += 1
+            elif TOC_HEADING_PATTERN.match(line) and in_margin:
+                # "Table of Contents" back-links on every page
+                removed["table of contents lines"] += 1
+            else:
+                kept_lines.append(line)
+                line_pages.append(page_number)
+
+    # Rejoin words hyphenated across line (and page) breaks, then lay out the text
+    parts: List[str] = []
+    page_offsets = np.zeros(len(pages), dtype=np.int64)
+    next_page = 0
+    offset = 0
+    for i, line in enumerate(kept_lines):
+        page_number = line_pages[i]
+        if i + 1 < len(kept_lines) and HYPHENATED.search(line) and kept_lines[i + 1][:1].islower():
+            removed["hyphenated breaks"] += 1
+            head, _, rest = kept_lines[i + 1].partition(' ')
+            kept_lines[i + 1] = rest
+            line = line[:-1] + head
+            if not rest:
+                line_pages[i + 1] = page_number
+        if not line:
+            continue
+        if parts:
+            parts.append("\n")
+            offset += 1
+        while next_page <= page_number:
+            page_offsets[next_page] = offset
+            next_page += 1
+        parts.append(line)
+        offset += len(line)
+    page_offsets[next_page:] = offset
+
+    return CleanedText("".join(parts), page_offsets, original_chars, dict(removed))
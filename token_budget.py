@@ -0,0 +1,313 @@
+"""
+Token budgets per session, per API key and per provider, over sliding windows
+Requests to metered providers reserve their estimated tokens before they run and settle to
+the measured amount afterwards. As a budget runs low, requests degrade: first a shorter
+report context, then no web research. A request that no longer fits waits for the window
+to free up (short waits), goes to the local model, or is refused until the budget resets.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from cancellation import checkpoint
+from generation_policy import estimate_tokens
+from metrics import METRICS
+from single_flight import fingerprint
+
+MINUTE = 60
+HOUR = 3600
+DAY = 24 * HOUR
+
+
+def _limits(*windows: Tuple[int, int]) -> Tuple[Tuple[int, int], ...]:
+    """(window seconds, token limit) pairs; a limit of 0 switches that window off"""
+    return tuple((seconds, limit) for seconds, limit in windows if limit > 0)
+
+
+SESSION_LIMITS = _limits((HOUR, int(os.environ.get("FUNDAMENTALS_SESSION_TOKENS_PER_HOUR", "150000"))))
+KEY_LIMITS = _limits((DAY, int(os.environ.get("FUNDAMENTALS_KEY_TOKENS_PER_DAY", "1000000"))))
+# Shared by every session using the provider; Groq's defaults follow its free tier
+PROVIDER_LIMITS: Dict[str, Tuple[Tuple[int, int], ...]] = {
+    "groq": _limits((MINUTE, int(os.environ.get("FUNDAMENTALS_GROQ_TOKENS_PER_MINUTE", "12000"))),
+                    (DAY, int(os.environ.get("FUNDAMENTALS_GROQ_TOKENS_PER_DAY", "100000")))),
+    "anthropic": _limits((DAY, int(os.environ.get("FUNDAMENTALS_ANTHROPIC_TOKENS_PER_DAY", "2000000")))),
+    "openai": _limits((DAY, int(os.environ.get("FUNDAMENTALS_OPENAI_TOKENS_PER_DAY", "2000000"))))
+}
+
+# Windows shorter than this are rate limits: they free up soon, so they delay requests
+# rather than degrade them
+RATE_WINDOW_SECONDS = 5 * MINUTE
+# Requests that would wait longer than this go to the local model or are refused
+MAX_QUEUE_SECONDS = int(os.environ.get("FUNDAMENTALS_BUDGET_MAX_QUEUE_SECONDS", "90"))
+# Allowance for web research text added to the prompt, before it is known
+RESEARCH_TOKENS = 1500
+
+# Degradation steps: (share of the provider's report context kept, web research allowed,
+# budget share that must be left after the request to stop at this step)
+DEGRADATION_STEPS = (
+    (1.0, True, 0.5),
+    (0.5, True, 0.25),
+    (0.35, False, 0.0)
+)
+
+
+class BudgetExceeded(RuntimeError):
+    """A request did not fit its token budgets in time"""
+
+
+def window_label(seconds: int) -> str:
+    for unit, name in ((DAY, "day"), (HOUR, "hour"), (MINUTE, "minute")):
+        if seconds % unit == 0:
+            count = seconds // unit
+            return f"per {name}" if count == 1 else f"per {count} {name}s"
+    return f"per {seconds}s"
+
+
+def request_tokens(provider, prompt: str, context: str, answer: str = "") -> int:
+    """Estimated tokens of one request: prompt, the context the provider keeps, and the answer"""
+    max_context = getattr(provider, "max_context_chars", None) or len(context)
+    return estimate_tokens(prompt) + estimate_tokens(context[:max_context]) + estimate_tokens(answer)
+
+
+class _Usage:
+    """Token entries of one scope, oldest first; each entry is [timestamp, tokens]"""
+
+    def __init__(self, limits: Tuple[Tuple[int, int], ...]):
+        self.limits = limits
+        self.horizon = max(seconds for seconds, _ in limits)
+        self.entries: deque = deque()
+
+    def prune(self, now: float):
+        while self.entries and self.entries[0][0] <= now - self.horizon:
+            self.entries.popleft()
+
+    def used(self, seconds: int, now: float) -> int:
+        return sum(tokens for stamp, tokens in self.entries if stamp > now - seconds)
+
+    def wait_for(self, tokens: int, now: float) -> float:
+        """Seconds until `tokens` more fit every window (inf if they never can)"""
+        wait = 0.0
+        for seconds, limit in self.limits:
+            if tokens > limit:
+                return math.inf
+            excess = self.used(seconds, now) + tokens - limit
+            for stamp, spent in self.entries:
+                if excess <= 0:
+                    break
+                if stamp > now - seconds:
+                    excess -= spent
+                    wait = max(wait, stamp + seconds - now)
+        return wait
+
+
+class Reservation:
+    """Tokens held for one request until it settles to what it actually used"""
+
+    def __init__(self, governor: "TokenGovernor", group: str, entries: List[list], tokens: int):
+        self._governor = governor
+        self.group = group
+        self.entries = entries
+        self.tokens = tokens
+        self.settled = False
+
+    def settle(self, tokens: int):
+        """Replace the estimate with the measured tokens (0 for a cache hit or failed call)"""
+        if self.settled:
+            return
+        with self._governor._lock:
+            for entry in self.entries:
+                entry[1] = tokens
+            self.settled = True
+        METRICS.increment(f"budget.tokens.{self.group}", tokens)
+
+
+class BudgetDecision:
+    """How a request should run given the budgets: as asked, degraded, delayed or not at all"""
+
+    def __init__(self, action: str = "run", context_share: float = 1.0, web_research: bool = True,
+                 tokens: int = 0, wait_seconds: float = 0.0, tightest: Optional[str] = None,
+                 share_left: float = 1.0):
+        # "run", or "over" when even the most degraded request does not fit right now
+        self.action = action
+        self.context_share = context_share
+        self.web_research = web_research
+        self.tokens = tokens
+        self.wait_seconds = wait_seconds
+        self.tightest = tightest
+        self.share_left = share_left
+
+    @property
+    def degraded(self) -> bool:
+        return self.context_share < 1.0 or not self.web_research
+
+    def notes(self) -> List[str]:
+        notes = []
+        if self.context_share < 1.0:
+            notes.append(f"report context cut to {self.context_share:.0%}")
+        if not self.web_research:
+            notes.append("web research skipped")
+        return notes
+
+    def __repr__(self):
+        return (f"BudgetDecision(action={self.action!r}, context_share={self.context_share}, "
+                f"web_research={self.web_research}, tokens={self.tokens}, wait_seconds={self.wait_seconds:.0f})")
+
+
+class TokenGovernor:
+    """Sliding-window token accounting and admission for metered providers"""
+
+    def __init__(self, session_limits=SESSION_LIMITS, key_limits=KEY_LIMITS, provider_limits=None):
+        self.session_limits = session_limits
+        self.key_limits = key_limits
+        self.provider_limits = PROVIDER_LIMITS if provider_limits is None else provider_limits
+        self._lock = threading.Lock()
+        self._usage: Dict[str, _Usage] = {}
+
+    def _scopes(self, provider, session_id: Optional[str]) -> List[Tuple[str, str, tuple]]:
+        """(scope key, label, limits) for each budget a request counts against"""
+        group = getattr(provider, "budget_group", None)
+        if not group:
+            return []  # Local models are free
+        scopes = []
+        if session_id and self.session_limits:
+            scopes.append((f"session:{session_id}", "this session", self.session_limits))
+        api_key = getattr(provider, "api_key", None)
+        if api_key and self.key_limits:
+            scopes.append((f"key:{fingerprint(group, api_key)[:16]}", "this API key", self.key_limits))
+        if self.provider_limits.get(group):
+            scopes.append((f"provider:{group}", f"{provider.provider_name}, all sessions",
+                           self.provider_limits[group]))
+        return scopes
+
+    def _scope_usage(self, key: str, limits) -> _Usage:
+        usage = self._usage.get(key)
+        if usage is None:
+            usage = self._usage[key] = _Usage(limits)
+        return usage
+
+    def plan(self, provider, session_id: Optional[str], prompt_tokens: int, context_tokens: int,
+             output_tokens: int, research_tokens: int = 0) -> BudgetDecision:
+        """The least degraded way to run a request that leaves enough of every budget"""
+        scopes = self._scopes(provider, session_id)
+        if not scopes:
+            return BudgetDecision(tokens=prompt_tokens + context_tokens + research_tokens + output_tokens)
+        now = time.time()
+        with self._lock:
+            usages = [(label, self._scope_usage(key, limits)) for key, label, limits in scopes]
+            for usage in (u for _, u in usages):
+                usage.prune(now)
+
+            def step_cost(context_share: float, web_research: bool) -> int:
+                return (prompt_tokens + math.ceil(context_tokens * context_share)
+                        + (research_tokens if web_research else 0) + output_tokens)
+
+            def share_left(tokens: int) -> Tuple[float, Optional[str]]:
+                # Budget windows only: rate windows delay requests instead of degrading them
+                tightest, label_of_tightest = 1.0, None
+                for label, usage in usages:
+                    for seconds, limit in usage.limits:
+                        if seconds < RATE_WINDOW_SECONDS:
+                            continue
+                        left = (limit - usage.used(seconds, now) - tokens) / limit
+                        if left < tightest:
+                            tightest, label_of_tightest = left, f"{label} {window_label(seconds)}"
+                return tightest, label_of_tightest
+
+            for context_share, web_research, minimum_left in DEGRADATION_STEPS:
+                tokens = step_cost(context_share, web_research)
+                left, tightest = share_left(tokens)
+                wait = max(usage.wait_for(tokens, now) for _, usage in usages)
+                if left >= minimum_left and wait == 0:
+                    return BudgetDecision("run", context_share, web_research, tokens,
+                                          tightest=tightest, share_left=max(0.0, left))
+                if left >= minimum_left:
+                    # Only a rate window is full: wait for it rather than degrade further
+                    return BudgetDecision("over", context_share, web_research, tokens, wait,
+                                          tightest=self._blocking_label(usages, tokens, now), share_left=left)
+
+            return BudgetDecision("over", context_share, web_research, tokens, wait,
+                                  tightest=self._blocking_label(usages, tokens, now) or tightest,
+                                  share_left=max(0.0, left))
+
+    @staticmethod
+    def _blocking_label(usages, tokens: int, now: float) -> Optional[str]:
+        for label, usage in usages:
+            for seconds, limit in usage.limits:
+                if usage.used(seconds, now) + tokens > limit:
+                    return f"{label} {window_label(seconds)}"
+        return None
+
+    def try_reserve(self, provider, session_id: Optional[str], tokens: int) -> Optional[Reservation]:
+        """Hold `tokens` in every budget if they fit them all right now"""
+        scopes = self._scopes(provider, session_id)
+        group = getattr(provider, "budget_group", None) or "local"
+        if not scopes:
+            return Reservation(self, group, [], tokens)
+        now = time.time()
+        with self._lock:
+            usages = [self._scope_usage(key, limits) for key, _, limits in scopes]
+            for usage in usages:
+                usage.prune(now)
+            if any(usage.wait_for(tokens, now) > 0 for usage in usages):
+                return None
+            entries = []
+            for usage in usages:
+                entry = [now, tokens]
+                usage.entries.append(entry)
+                entries.append(entry)
+        return Reservation(self, group, entries, tokens)
+
+    def reserve(self, provider, session_id: Optional[str], tokens: int,
+                timeout: float = MAX_QUEUE_SECONDS, poll_seconds: float = 0.5) -> Reservation:
+        """Wait (cancellably) until `tokens` fit, then hold them"""
+        deadline = time.monotonic() + timeout
+        while True:
+            reservation = self.try_reserve(provider, session_id, tokens)
+            if reservation is not None:
+                return reservation
+            if time.monotonic() >= deadline:
+                METRICS.increment("budget.queue_timeouts")
+                raise BudgetExceeded(f"token budget still full after waiting {timeout:.0f}s")
+            checkpoint()
+            time.sleep(poll_seconds)
+
+    def record(self, provider, tokens: int, session_id: Optional[str] = None):
+        """Charge tokens used without a reservation (e.g. the shared report digest)"""
+        scopes = self._scopes(provider, session_id)
+        if not scopes:
+            return
+        now = time.time()
+        with self._lock:
+            for key, _, limits in scopes:
+                self._scope_usage(key, limits).entries.append([now, tokens])
+        METRICS.increment(f"budget.tokens.{provider.budget_group}", tokens)
+
+    def status(self, provider, session_id: Optional[str]) -> List[dict]:
+        """Usage of each budget a session's requests count against"""
+        now = time.time()
+        rows = []
+        with self._lock:
+            for key, label, limits in self._scopes(provider, session_id):
+                usage = self._usage.get(key)
+                for seconds, limit in limits:
+                    used = usage.used(seconds, now) if usage else 0
+                    rows.append({"scope": label, "window": window_label(seconds), "used": used, "limit": limit})
+        return rows
+
+
+_governor: Optional[TokenGovernor] = None
+_governor_lock = threading.Lock()
+
+
+def get_token_governor() -> TokenGovernor:
+    """Process-wide token governor"""
+    global _governor
+    if _governor is None:
+        with _governor_lock:
+            if _governor is None:
+                _governor = TokenGovernor()
+    return _governor
@@ -0,0 +1,127 @@
+"""
+Upload spooling
+Uploaded filings are streamed to a per-session temp area in fixed-size chunks, hashed as they
+are written, and parsed from the file (memory-mapped) rather than from an in-memory copy.
+The content hash lets the report store recognize a filing it has already processed.
+Spooled files are deleted when the session ends or uploads another file.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from metrics import METRICS
+
+DEFAULT_UPLOAD_DIR = os.environ.get(
+    "FUNDAMENTALS_UPLOAD_DIR",
+    os.path.join(tempfile.gettempdir(), "fundamentals_uploads")
+)
+CHUNK_BYTES = 1024 * 1024
+# Session folders left behind by a previous server process are removed after this long
+ORPHAN_SECONDS = int(os.environ.get("FUNDAMENTALS_SESSION_IDLE_SECONDS", "1800"))
+
+
+class SpooledUpload:
+    """An upload on disk: where it is, its SHA-256 and its size"""
+
+    def __init__(self, path: str, file_name: str, content_hash: str, size: int):
+        self.path = path
+        self.file_name = file_name
+        self.content_hash = content_hash
+        self.size = size
+
+
+def copy_hashed(stream, out, chunk_bytes: int = CHUNK_BYTES) -> Tuple[str, int]:
+    """Copy a binary stream to `out` chunk by chunk; returns (SHA-256 hex, bytes copied)"""
+    digest = hashlib.sha256()
+    size = 0
+    if hasattr(stream, "seek"):
+        stream.seek(0)
+    while True:
+        chunk = stream.read(chunk_bytes)
+        if not chunk:
+            break
+        digest.update(chunk)
+        out.write(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+class UploadSpool:
+    """Per-session temp files for uploads, one live upload per session"""
+
+    def __init__(self, root: str = DEFAULT_UPLOAD_DIR):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._uploads: Dict[str, SpooledUpload] = {}
+        self.remove_orphans()
+
+    def _session_dir(self, session_id: str) -> str:
+        return os.path.join(self.root, session_id)
+
+    def spool(self, session_id: str, stream, file_name: str) -> SpooledUpload:
+        """Write an upload to this session's temp area, replacing its previous upload"""
+        start = time.perf_counter()
+        directory = self._session_dir(session_id)
+        os.makedirs(directory, exist_ok=True)
+        extension = os.path.splitext(file_name)[1].lower()
+        with tempfile.NamedTemporaryFile(dir=directory, suffix=".part", delete=False) as f:
+            content_hash, size = copy_hashed(stream, f)
+        path = os.path.join(directory, f"{content_hash[:32]}{extension}")
+        os.replace(f.name, path)
+        upload = SpooledUpload(path, file_name, content_hash, size)
+
+        with self._lock:
+            previous = self._uploads.get(session_id)
+            self._uploads[session_id] = upload
+        if previous is not None and previous.path != path:
+            _remove(previous.path)
+        METRICS.observe("uploads.spool_ms", (time.perf_counter() - start) * 1000)
+        METRICS.increment("uploads.spooled_bytes", size)
+        return upload
+
+    def current(self, session_id: str) -> Optional[SpooledUpload]:
+        with self._lock:
+            return self._uploads.get(session_id)
+
+    def release(self, session_id: str):
+        """Delete a session's temp files (session ended)"""
+        with self._lock:
+            self._uploads.pop(session_id, None)
+        shutil.rmtree(self._session_dir(session_id), ignore_errors=True)
+
+    def remove_orphans(self, max_age_seconds: int = ORPHAN_SECONDS) -> int:
+        """Remove session folders not written to for `max_age_seconds` (e.g. after a restart)"""
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        for entry in os.scandir(self.root):
+            if entry.is_dir() and entry.stat().st_mtime < cutoff and entry.name not in self._uploads:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        return removed
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+_spool: Optional[UploadSpool] = None
+_spool_lock = threading.Lock()
+
+
+def get_upload_spool() -> UploadSpool:
+    """Process-wide upload spool"""
+    global _spool
+    if _spool is None:
+        with _spool_lock:
+            if _spool is None:
+                _spool = UploadSpool()
+    return _spool
@@ -1,6 +1,6 @@
 import plotly.graph_objects as go
 import streamlit as st
-import re
+from amount_normalization import find_amounts, normalize_amount
 
 def parse_financial_data(analysis_text):
     """
@@ -19,8 +19,8 @@ def parse_financial_data(analysis_text):
     # Look for revenue items (lines with $ amounts)
     lines = analysis_text.split('\n')
     for line in lines:
-        # Extract dollar amounts
-        amounts = re.findall(r'\$[\d,]+\.?\d*[BMK]?', line)
+        # Extract monetary amounts ("$1.2 billion", "(€345m)", ...)
+        amounts = find_amounts(line)
         if amounts and ('revenue' in line.lower() or 'sales' in line.lower()):
             data['revenues'].append({
                 'name': line.split(':')[0].strip() if ':' in line else 'Revenue',
@@ -29,15 +29,23 @@ def parse_financial_data(analysis_text):
 
     return data
 
-def create_sankey_diagram(revenues, costs, gross_profit=None, operating_profit=None):
+def create_sankey_diagram(revenues, costs, gross_profit=None, operating_profit=None, net_income=None):
     """
     Create a Sankey diagram showing revenue flows to costs
 
     Args:
         revenues: List of dicts with 'name' and 'amount' keys
-        costs: List of dicts with 'name' and 'amount' keys
+        costs: List of dicts with 'name', 'amount' and optional 'category' keys
+            ('cost_of_revenue', 'operating', 'other', or 'other_income' for non-operating
+            items that add to income)
         gross_profit: Optional gross profit amount
         operating_profit: Optional operating profit amount
+        net_income: Optional net income amount
+
+    Costs flow out of the profit level they are deducted from: cost of revenue from
+    Total Revenue, operating costs from Gross Profit, other costs from Operating Profit.
+    Without the intermediate profit levels, costs flow straight from Total Revenue.
+    Other income flows into Net Income alongside what is left of Operating Profit.
     """
 
     # Color schemes
@@ -45,64 +53,67 @@ def create_sankey_diagram(revenues, costs, gross_profit=None, operating_profit=N
     cost_color = 'rgba(220, 20, 60, 0.6)'      # Red/Pink
     profit_color = 'rgba(65, 105, 225, 0.6)'   # Blue
 
-    # Build nodes
     labels = []
     colors = []
-
-    # Add revenue nodes
-    revenue_start_idx = 0
-    for rev in revenues:
-        labels.append(rev['name'])
-        colors.append(revenue_color)
-
-    # Add intermediate node (Total Revenue)
-    total_revenue_idx = len(labels)
-    labels.append('Total Revenue')
-    colors.append(revenue_color)
-
-    # Add cost nodes
-    cost_start_idx = len(labels)
-    for cost in costs:
-        labels.append(cost['name'])
-        colors.append(cost_color)
-
-    # Add profit node if applicable
-    if gross_profit:
-        gross_profit_idx = len(labels)
-        labels.append('Gross Profit')
-        colors.append(profit_color)
-
-    if operating_profit:
-        operating_profit_idx = len(labels)
-        labels.append('Operating Profit')
-        colors.append(profit_color)
-
-    # Build links
     sources = []
     targets = []
     values = []
     link_colors = []
 
+    def add_node(label, color):
+        labels.append(label)
+        colors.append(color)
+        return len(labels) - 1
+
+    def add_link(source, target, amount, color):
+        value = parse_amount(amount)
+        if value > 0:
+            sources.append(source)
+            targets.append(target)
+            values.append(value)
+            link_colors.append(color)
+
     # Revenue sources to Total Revenue
-    for i, rev in enumerate(revenues):
-        sources.append(revenue_start_idx + i)
-        targets.append(total_revenue_idx)
-        values.append(parse_amount(rev['amount']))
-        link_colors.append(revenue_color)
-
-    # Total Revenue to Costs
-    for i, cost in enumerate(costs):
-        sources.append(total_revenue_idx)
-        targets.append(cost_start_idx + i)
-        values.append(parse_amount(cost['amount']))
-        link_colors.append(cost_color)
-
-    # Total Revenue to Gross Profit
+    revenue_nodes = [add_node(rev['name'], revenue_color) for rev in revenues]
+    total_revenue_idx = add_node('Total Revenue', revenue_color)
+    for node, rev in zip(revenue_nodes, revenues):
+        add_link(node, total_revenue_idx, rev['amount'], revenue_color)
+
+    # Profit levels, each fed by the level above it
+    gross_profit_idx = operating_profit_idx = None
     if gross_profit:
-        sources.append(total_revenue_idx)
-        targets.append(gross_profit_idx)
-        values.append(parse_amount(gross_profit))
-        link_colors.append(profit_color)
+        gross_profit_idx = add_node('Gross Profit', profit_color)
+        add_link(total_revenue_idx, gross_profit_idx, gross_profit, profit_color)
+    if operating_profit:
+        operating_profit_idx = add_node('Operating Profit', profit_color)
+        add_link(gross_profit_idx if gross_profit_idx is not None else total_revenue_idx,
+                 operating_profit_idx, operating_profit, profit_color)
+
+    # Other income feeds Net Income instead of being deducted
+    inflows = [cost for cost in costs if cost.get('category') == 'other_income']
+    costs = [cost for cost in costs if cost.get('category') != 'other_income']
+    net_income_idx = None
+    if net_income and operating_profit_idx is not None:
+        net_income_idx = add_node('Net Income', profit_color)
+        # Net income less the other income is what Operating Profit passes on
+        carried = parse_amount(net_income) - sum(parse_amount(item['amount']) for item in inflows)
+        add_link(operating_profit_idx, net_income_idx, carried, profit_color)
+
+    # Other income into Net Income (or into Operating Profit / Total Revenue without it)
+    income_target = next(idx for idx in (net_income_idx, operating_profit_idx, total_revenue_idx) if idx is not None)
+    for item in inflows:
+        income_idx = add_node(item['name'], revenue_color)
+        add_link(income_idx, income_target, item['amount'], revenue_color)
+
+    # Costs out of the level they are deducted from
+    parents = {
+        'cost_of_revenue': total_revenue_idx,
+        'operating': gross_profit_idx if gross_profit_idx is not None else total_revenue_idx,
+        'other': operating_profit_idx if operating_profit_idx is not None else total_revenue_idx
+    }
+    for cost in costs:
+        cost_idx = add_node(cost['name'], cost_color)
+        add_link(parents.get(cost.get('category'), total_revenue_idx), cost_idx, cost['amount'], cost_color)
 
     # Create the Sankey diagram
     fig = go.Figure(data=[go.Sankey(
@@ -117,7 +128,8 @@ def create_sankey_diagram(revenues, costs, gross_profit=None, operating_profit=N
             source=sources,
             target=targets,
             value=values,
-            color=link_colors
+            color=link_colors,
+            hovertemplate='%{value:,.1f}M<extra></extra>'
         )
     )])
 
@@ -131,23 +143,16 @@ def create_sankey_diagram(revenues, costs, gross_profit=None, operating_profit=N
     return fig
 
 def parse_amount(amount_str):
-    """Convert string amount like '$5.2B' to numeric value in millions"""
-    # Remove $ and commas
-    amount_str = amount_str.replace('$', '').replace(',', '').strip()
-
-    # Extract number and multiplier
-    multipliers = {'B': 1000, 'M': 1, 'K': 0.001, 'T': 1000000}
-
-    for suffix, multiplier in multipliers.items():
-        if suffix in amount_str:
-            number = float(amount_str.replace(suffix, ''))
-            return number * multiplier
-
-    # If no suffix, assume it's already in millions or raw number
-    try:
+    """
+    Convert an amount like '$5.2B', '$1.2 billion' or '(345)' to a numeric value in millions
+    Amounts without a scale are assumed to already be in millions; unparseable input gives 0
+    """
+    # Structured extraction already yields numbers in millions
+    if isinstance(amount_str, (int, float)):
         return float(amount_str)
-    except:
-        return 0
+
+    value = normalize_amount(amount_str, unit="millions", default_unit="millions")
+    return value if value is not None else 0
 
 def create_sample_sankey():
     """Create a sample Sankey diagram based on the Warner Bros image"""
@@ -247,22 +252,25 @@ def create_sample_sankey():
 
     return fig
 
-def display_sankey_with_data(revenue_data, cost_data, profit_data=None):
+def display_sankey_with_data(revenue_data, cost_data, profit_data=None, fig=None):
     """
     Display Sankey diagram with extracted financial data
 
     Args:
-        revenue_data: Dict with revenue line items
-        cost_data: Dict with cost line items
+        revenue_data: List of revenue line items
+        cost_data: List of cost line items
         profit_data: Optional dict with profit metrics
+        fig: Optional prebuilt (e.g. memoized) figure for the same data
     """
     try:
-        fig = create_sankey_diagram(
-            revenues=revenue_data,
-            costs=cost_data,
-            gross_profit=profit_data.get('gross_profit') if profit_data else None,
-            operating_profit=profit_data.get('operating_profit') if profit_data else None
-        )
+        if fig is None:
+            fig = create_sankey_diagram(
+                revenues=revenue_data,
+                costs=cost_data,
+                gross_profit=profit_data.get('gross_profit') if profit_data else None,
+                operating_profit=profit_data.get('operating_profit') if profit_data else None,
+                net_income=profit_data.get('net_income') if profit_data else None
+            )
         st.plotly_chart(fig, use_container_width=True)
     except Exception as e:
         st.warning(f"Could not generate custom diagram: {e}")
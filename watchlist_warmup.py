@@ -0,0 +1,454 @@
+"""
+Watchlist warm-up
+Off-peak, pre-computes what the first analyst to open a watchlist company would otherwise wait
+for: the extracted report text, web research and the nine section analyses. Each warmed report
+is saved as a bundle in the library, so an interactive session that uploads the same filing
+takes its sections from there. Companies are warmed most-used and stalest first, within the
+token budgets and a search rate limit, and leave part of each budget for interactive use.
+
+Usage:
+    python watchlist_warmup.py watchlist.csv [--provider "Groq (FREE - Llama 3.3)"] [--now]
+
+The watchlist is a CSV with `company` and `filing` columns (filing paths relative to the CSV).
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from metrics import METRICS
+from report_store import DEFAULT_STORE_DIR, company_key
+
+DAY = 24 * 3600
+# Local time window for warm-up runs, e.g. "01:00-06:00" (may wrap past midnight)
+WARMUP_WINDOW = os.environ.get("FUNDAMENTALS_WARMUP_WINDOW", "01:00-06:00")
+# A company warmed more recently than this, from an unchanged filing, is left alone
+REFRESH_SECONDS = float(os.environ.get("FUNDAMENTALS_WARMUP_REFRESH_HOURS", "20")) * 3600
+SEARCHES_PER_MINUTE = float(os.environ.get("FUNDAMENTALS_WARMUP_SEARCHES_PER_MINUTE", "20"))
+# Share of each token budget the warm-up leaves for interactive sessions
+MIN_BUDGET_LEFT = float(os.environ.get("FUNDAMENTALS_WARMUP_MIN_BUDGET_LEFT", "0.5"))
+DEFAULT_PROVIDER = os.environ.get("FUNDAMENTALS_WARMUP_PROVIDER", "Groq (FREE - Llama 3.3)")
+USAGE_HALF_LIFE_SECONDS = 7 * DAY
+# Priority multiplier for a company never warmed, or whose filing changed
+MAX_STALENESS = 3.0
+
+
+def _write_json(path: str, data: dict):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+class UsageLog:
+    """
+    How often each company is opened in the app, decayed with a one-week half-life
+    Persisted next to the report store
+    """
+
+    def __init__(self, path: Optional[str] = None, half_life: float = USAGE_HALF_LIFE_SECONDS):
+        self.path = path or os.path.join(DEFAULT_STORE_DIR, "usage.json")
+        self.half_life = half_life
+        self._lock = threading.Lock()
+
+    def _decayed(self, entry: dict, now: float) -> float:
+        return entry["score"] * 0.5 ** (max(0.0, now - entry["updated"]) / self.half_life)
+
+    def record(self, company_name: str, now: Optional[float] = None):
+        now = now or time.time()
+        key = company_key(company_name)
+        with self._lock:
+            usage = _read_json(self.path)
+            entry = usage.get(key)
+            score = self._decayed(entry, now) if entry else 0.0
+            usage[key] = {"score": score + 1, "updated": now}
+            try:
+                _write_json(self.path, usage)
+            except OSError as e:
+                print(f"Could not save usage: {e}")
+
+    def frequency(self, company_name: str, now: Optional[float] = None) -> float:
+        entry = _read_json(self.path).get(company_key(company_name))
+        return self._decayed(entry, now or time.time()) if entry else 0.0
+
+
+class WarmupLog:
+    """What the warm-up last did per company: filing, report, when, and whether all sections finished"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(DEFAULT_STORE_DIR, "warmup.json")
+        self._lock = threading.Lock()
+
+    def get(self, company_name: str) -> Optional[dict]:
+        return _read_json(self.path).get(company_key(company_name))
+
+    def mark(self, company_name: str, filing_stat: List[int], report_id: str, sections: int, complete: bool):
+        with self._lock:
+            log = _read_json(self.path)
+            log[company_key(company_name)] = {
+                "filing_stat": filing_stat, "report_id": report_id, "warmed_at": time.time(),
+                "sections": sections, "complete": complete
+            }
+            _write_json(self.path, log)
+
+
+class WatchlistEntry:
+    """A company and the filing to warm for it"""
+
+    def __init__(self, company_name: str, filing_path: str):
+        self.company_name = company_name
+        self.filing_path = filing_path
+
+    def filing_stat(self) -> List[int]:
+        """Size and mtime, so an unchanged filing is recognized without hashing it"""
+        stat = os.stat(self.filing_path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+
+def load_watchlist(path: str) -> List[WatchlistEntry]:
+    """Watchlist CSV with `company` and `filing` columns"""
+    root = os.path.dirname(os.path.abspath(path))
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        missing = {"company", "filing"} - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError(f"{path}: missing column(s) {', '.join(sorted(missing))}")
+        return [
+            WatchlistEntry(row["company"].strip(), os.path.join(root, row["filing"].strip()))
+            for row in reader if row["company"] and row["filing"]
+        ]
+
+
+def parse_window(spec: str) -> Tuple[int, int]:
+    """("HH:MM-HH:MM") -> (start, end) in minutes after midnight"""
+    start, end = (datetime.strptime(part.strip(), "%H:%M") for part in spec.split("-"))
+    return start.hour * 60 + start.minute, end.hour * 60 + end.minute
+
+
+def next_window(now: datetime, window: Tuple[int, int]) -> Tuple[datetime, datetime]:
+    """The window in progress at `now`, or else the next one"""
+    start_minute, end_minute = window
+    length = timedelta(minutes=(end_minute - start_minute) % (24 * 60) or 24 * 60)
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    for days in (-1, 0, 1):
+        start = midnight + timedelta(days=days, minutes=start_minute)
+        if now < start + length:
+            return start, start + length
+    raise AssertionError("unreachable")
+
+
+class RateLimiter:
+    """Spaces calls at least 60 / per_minute seconds apart (0 = unlimited)"""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self.calls = 0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+            self.calls += 1
+        if start > now:
+            time.sleep(start - now)
+
+
+class BudgetStop(Exception):
+    """The warm-up has to stop: its window ended or the budgets it may use are spent"""
+
+    def __init__(self, reason: str, sections: int = 0):
+        super().__init__(reason)
+        # Sections of the company in progress that were finished (and bundled) before stopping
+        self.sections = sections
+
+
+class SectionFailed(ValueError):
+    """The provider failed on a section; the sections finished before it were bundled"""
+
+    def __init__(self, reason: str, sections: int = 0):
+        super().__init__(reason)
+        self.sections = sections
+
+
+class WarmupReport:
+    """Outcome of one warm-up run"""
+
+    def __init__(self):
+        self.warmed: List[Tuple[str, int]] = []
+        self.failed: Dict[str, str] = {}
+        self.fresh = 0
+        self.searches = 0
+        self.stopped: Optional[str] = None
+        self.seconds = 0.0
+
+    def summary(self) -> str:
+        sections = sum(count for _, count in self.warmed)
+        text = (f"Warmed {len(self.warmed)} companies ({sections} sections, {self.searches} searches sent) "
+                f"in {self.seconds:.0f}s; {self.fresh} already warm, {len(self.failed)} failed")
+        return text + (f"; stopped: {self.stopped}" if self.stopped else "")
+
+
+class WarmupScheduler:
+    """Warms watchlist companies in priority order with one provider"""
+
+    def __init__(self, provider, usage: Optional[UsageLog] = None, log: Optional[WarmupLog] = None,
+                 searches_per_minute: float = SEARCHES_PER_MINUTE, min_budget_left: float = MIN_BUDGET_LEFT,
+                 refresh_seconds: float = REFRESH_SECONDS):
+        self.provider = provider
+        self.usage = usage or get_usage_log()
+        self.log = log or WarmupLog()
+        self.search_limiter = RateLimiter(searches_per_minute)
+        self.min_budget_left = min_budget_left
+        self.refresh_seconds = refresh_seconds
+
+    def priority(self, entry: WatchlistEntry, now: float) -> float:
+        """(1 + recent usage) x staleness; below 1 when the last warm-up is still fresh"""
+        state = self.log.get(entry.company_name)
+        if state is None or not state.get("complete") or state.get("filing_stat") != entry.filing_stat():
+            staleness = MAX_STALENESS
+        else:
+            staleness = min(MAX_STALENESS, (now - state["warmed_at"]) / self.refresh_seconds)
+        return (1 + self.usage.frequency(entry.company_name, now)) * staleness
+
+    def queue(self, entries: List[WatchlistEntry]) -> List[Tuple[float, WatchlistEntry]]:
+        """Entries due for warming, highest priority first"""
+        now = time.time()
+        due = []
+        for entry in entries:
+            try:
+                priority = self.priority(entry, now)
+            except OSError as e:
+                print(f"Skipping {entry.company_name}: {e}")
+                continue
+            if priority >= 1:
+                due.append((priority, entry))
+        due.sort(key=lambda item: item[0], reverse=True)
+        return due
+
+    def run(self, entries: List[WatchlistEntry], deadline: float = float("inf")) -> WarmupReport:
+        from pdf_workers import PdfParseError
+
+        report = WarmupReport()
+        start = time.time()
+        searches_before = self.search_limiter.calls
+        queue = self.queue(entries)
+        report.fresh = len(entries) - len(queue)
+        for _, entry in queue:
+            try:
+                report.warmed.append((entry.company_name, self.warm(entry, deadline)))
+            except BudgetStop as e:
+                if e.sections:
+                    report.warmed.append((entry.company_name, e.sections))
+                report.stopped = str(e)
+                break
+            except SectionFailed as e:
+                if e.sections:
+                    report.warmed.append((entry.company_name, e.sections))
+                report.failed[entry.company_name] = str(e)
+                METRICS.increment("warmup.failed")
+            except (OSError, ValueError, PdfParseError) as e:
+                report.failed[entry.company_name] = str(e)
+                METRICS.increment("warmup.failed")
+        report.searches = self.search_limiter.calls - searches_before
+        report.seconds = time.time() - start
+        return report
+
+    def warm(self, entry: WatchlistEntry, deadline: float = float("inf")) -> int:
+        """
+        Ingest, research and analyze one company, then save its bundle; returns the sections done
+        Raises BudgetStop after saving whatever finished when the window or budgets run out, and
+        SectionFailed, likewise after saving, when the provider fails on a section
+        """
+        from analysis_bundle import build_bundle, get_bundle_library
+        from generation_policy import get_output_lengths
+        from cancellation import CancelledError
+        from llm_providers import get_shared_completion, is_failed_answer
+        from report_digest import (DigestUnavailable, worth_digesting, get_report_digest, digest_context,
+                                   format_key_figures)
+        from report_ingest import ingest_report, local_upload
+        from report_store import get_default_store
+        from section_prompts import SECTION_PROMPTS, section_prompt
+        from statement_extraction import key_metrics
+        from web_research import WebResearchEnhancer, search_duckduckgo
+
+        store = get_default_store()
+        filing_stat = entry.filing_stat()
+        report_id = ingest_report(local_upload(entry.filing_path))
+        store.register_filing(entry.company_name, report_id)
+        report_text = store.get_text(report_id)
+        researcher = WebResearchEnhancer(entry.company_name)
+        researcher.plan.search = lambda query, num_results: search_duckduckgo(
+            query, num_results, before_fetch=self.search_limiter.wait)
+        output_lengths = get_output_lengths()
+        key_figures = format_key_figures(key_metrics(store.get_artifact(report_id, "statements", {})))
+
+        analyses = {}
+        stop = failure = None
+        for section_key in SECTION_PROMPTS:
+            if time.time() >= deadline:
+                stop = "off-peak window ended"
+                break
+            # The filing hasn't changed, so neither has an analysis made from it
+            archived = store.get_archived_analysis(report_id, section_key)
+            if archived is not None:
+                # Research is refetched only where the shared cache has expired it
+                researcher.get_research_for_section(section_key)
+                analyses[section_key] = archived
+                continue
+            prompt = section_prompt(section_key)
+            policy = output_lengths.policy_for(section_key)
+            # Checked before any searching or digesting, estimated on the report like the app does
+            reservation = self._reserve(prompt, report_text, policy, deadline)
+            if reservation is None:
+                stop = f"token budget reserved for interactive sessions ({self.min_budget_left:.0%})"
+                break
+            try:
+                # Same request the app makes with its defaults (web research on, report digest on)
+                enhanced_prompt = researcher.enhance_prompt(prompt, section_key)
+                context = report_text
+                if worth_digesting(report_text):
+                    try:
+                        # The digest's calls keep the same share of the budgets free for interactive use
+                        digest = get_report_digest(self.provider, store, report_id, report_text, key_figures,
+                                                   min_share_left=self.min_budget_left)
+                        context = digest_context(digest, report_text, section_key)
+                    except DigestUnavailable as e:
+                        print(f"{entry.company_name}: report digest unavailable, sending the report: {e}")
+                analysis = get_shared_completion(
+                    self.provider, prompt=enhanced_prompt, context=context, policy=policy, reservation=reservation,
+                    on_generated=lambda answer: output_lengths.record(section_key, answer, policy,
+                                                                      self.provider.default_max_tokens))
+            except CancelledError:
+                raise
+            except Exception as e:
+                analysis = f"Error: {e}"
+            finally:
+                reservation.settle(0)
+            if is_failed_answer(analysis):
+                # Sections finished so far are still bundled and logged below
+                failure = f"{section_key}: {(analysis or 'empty answer')[:200]}"
+                break
+            store.archive_analysis(report_id, section_key, analysis)
+            analyses[section_key] = analysis
+            METRICS.increment("warmup.sections")
+
+        if analyses:
+            library = get_bundle_library()
+            bundle = library.save(build_bundle(store, report_id, entry.company_name, analyses,
+                                               research=dict(researcher.cache), source="warmup"))
+            # Older warm-up bundles of the same report are superseded
+            for old in library.bundles():
+                if old.report_id == report_id and old.source == "warmup" and old.bundle_id != bundle.bundle_id:
+                    library.discard(old)
+        complete = len(analyses) == len(SECTION_PROMPTS)
+        self.log.mark(entry.company_name, filing_stat, report_id, len(analyses), complete)
+        METRICS.increment("warmup.companies")
+        if stop:
+            raise BudgetStop(stop, len(analyses))
+        if failure:
+            raise SectionFailed(failure, len(analyses))
+        return len(analyses)
+
+    def _reserve(self, prompt: str, context: str, policy, deadline: float):
+        """Hold the request's tokens without degrading it or dipping into the interactive share"""
+        from generation_policy import estimate_tokens
+        from token_budget import RESEARCH_TOKENS, get_token_governor
+
+        governor = get_token_governor()
+        while True:
+            # No session: the warm-up counts against the API key and provider budgets only
+            decision = governor.plan(self.provider, None, estimate_tokens(prompt),
+                                     estimate_tokens(context[:self.provider.max_context_chars]),
+                                     policy.max_tokens, RESEARCH_TOKENS)
+            if decision.share_left < self.min_budget_left or decision.degraded:
+                return None
+            if decision.action == "run":
+                reservation = governor.try_reserve(self.provider, None, decision.tokens)
+                if reservation is not None:
+                    return reservation
+            # A rate window is full: wait for it if that fits in the window
+            wait = max(1.0, decision.wait_seconds)
+            if time.time() + wait >= deadline:
+                return None
+            METRICS.increment("warmup.budget_waits")
+            time.sleep(wait)
+
+
+_usage_log: Optional[UsageLog] = None
+_usage_log_lock = threading.Lock()
+
+
+def get_usage_log() -> UsageLog:
+    """Process-wide company usage log"""
+    global _usage_log
+    if _usage_log is None:
+        with _usage_log_lock:
+            if _usage_log is None:
+                _usage_log = UsageLog()
+    return _usage_log
+
+
+def connect(provider_name: str):
+    """Provider from the catalog, with its API key from the environment"""
+    from llm_providers import create_provider, get_api_key_from_env, get_available_providers
+
+    info = get_available_providers().get(provider_name)
+    if info is None:
+        raise SystemExit(f"Unknown provider {provider_name!r}")
+    api_key = get_api_key_from_env(info["key_name"]) if info["requires_key"] else None
+    provider = create_provider(provider_name, api_key)
+    if not provider or not provider.available:
+        raise SystemExit(f"Could not connect to {provider_name}")
+    return provider
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("watchlist", help="CSV with company and filing columns")
+    parser.add_argument("--provider", default=DEFAULT_PROVIDER)
+    parser.add_argument("--window", default=WARMUP_WINDOW, help="Off-peak window, local time (HH:MM-HH:MM)")
+    parser.add_argument("--now", action="store_true", help="Run once now instead of waiting for the window")
+    parser.add_argument("--once", action="store_true", help="Stop after one window")
+    args = parser.parse_args()
+
+    scheduler = WarmupScheduler(connect(args.provider))
+    window = parse_window(args.window)
+    while True:
+        if args.now:
+            deadline = float("inf")
+        else:
+            start, end = next_window(datetime.now(), window)
+            if datetime.now() < start:
+                print(f"Waiting for the off-peak window at {start:%Y-%m-%d %H:%M}")
+                time.sleep((start - datetime.now()).total_seconds())
+            deadline = end.timestamp()
+        # Re-read each run, so watchlist edits apply without a restart
+        report = scheduler.run(load_watchlist(args.watchlist), deadline)
+        print(report.summary())
+        sys.stdout.flush()
+        if args.now or args.once:
+            return
+        # Past the window's end, so the next iteration waits for tomorrow's
+        time.sleep(max(0.0, deadline - time.time()) + 1)
+
+
+if __name__ == "__main__":
+    main()
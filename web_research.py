@@ -3,145 +3,96 @@ Web research module to supplement annual report analysis with online data
 Uses DuckDuckGo search (no API key needed) and web scraping
 """
 
-import requests
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
 import re
 from urllib.parse import quote_plus
-
-def search_duckduckgo(query: str, num_results: int = 5) -> List[Dict[str, str]]:
+from single_flight import SingleFlight, fingerprint
+from shared_cache import get_shared_cache
+from cancellation import CancelledError, checkpoint
+from llm_providers import get_shared_completion, is_failed_answer
+from generation_policy import GenerationPolicy
+from company_identification import CompanyGuess, identify_company, CONFIDENCE_THRESHOLD
+from research_planner import ResearchPlan
+
+# Process-wide registry so concurrent identical searches share one HTTP request
+SEARCH_REQUESTS = SingleFlight("search")
+
+# LLM answers to the company name question that are not a name
+MAX_COMPANY_NAME_CHARS = 80
+NOT_A_NAME_PATTERN = re.compile(
+    r"\b(sorry|unable|cannot|can't|could not|not (available|provided|mentioned|specified|found|clear)|"
+    r"unknown|no company|annual report|as an ai)\b", re.IGNORECASE)
+
+def search_duckduckgo(query: str, num_results: int = 5,
+                      before_fetch: Optional[Callable[[], None]] = None) -> List[Dict[str, str]]:
     """
     Search DuckDuckGo for relevant information
     Returns list of search results with title, link, and snippet
+    `before_fetch` runs before a request actually goes out (not for cached results), e.g. to pace them
     """
     try:
-        # DuckDuckGo HTML search
-        url = f"https://html.duckduckgo.com/html/?q={quote_plus(query)}"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-
-        # Parse results (basic extraction)
-        results = []
-
-        # Extract result blocks
-        result_pattern = r'<a class="result__a" href="([^"]+)"[^>]*>([^<]+)</a>'
-        snippet_pattern = r'<a class="result__snippet"[^>]*>([^<]+)</a>'
-
-        links = re.findall(result_pattern, response.text)
-        snippets = re.findall(snippet_pattern, response.text)
-
-        for i, (link, title) in enumerate(links[:num_results]):
-            snippet = snippets[i] if i < len(snippets) else ""
-            results.append({
-                'title': title.strip(),
-                'link': link,
-                'snippet': snippet.strip()
-            })
-
-        return results
-
+        # Abandoned analyses stop issuing searches
+        checkpoint()
+        key = fingerprint("duckduckgo", query, num_results)
+        cache = get_shared_cache()
+        cached = cache.get_json("search", key)
+        if cached is not None:
+            return cached
+
+        def fetch():
+            if before_fetch:
+                before_fetch()
+            results = _fetch_duckduckgo(query, num_results)
+            # An empty page is more often a blocked request than a real answer
+            if results:
+                cache.set_json("search", (key,), results)
+            return results
+
+        return SEARCH_REQUESTS.do(key, fetch)
+
+    except CancelledError:
+        raise
     except Exception as e:
         print(f"Search error: {e}")
         return []
 
-def get_company_info(company_name: str) -> str:
-    """
-    Get supplementary information about a company from web search
-    """
-    research_queries = [
-        f"{company_name} company overview business model",
-        f"{company_name} competitors market share",
-        f"{company_name} recent news developments 2024",
-        f"{company_name} industry trends outlook"
-    ]
-
-    all_info = []
-
-    for query in research_queries:
-        results = search_duckduckgo(query, num_results=3)
-        if results:
-            info = f"\n### Search: {query}\n"
-            for r in results:
-                info += f"- **{r['title']}**: {r['snippet']}\n"
-            all_info.append(info)
-
-    return "\n".join(all_info) if all_info else "No additional web research available."
-
-def get_industry_research(industry: str, company_name: str) -> str:
-    """
-    Get industry-specific research
-    """
-    queries = [
-        f"{industry} industry analysis 2024",
-        f"{industry} market trends forecast",
-        f"{industry} major players competition"
-    ]
+def _fetch_duckduckgo(query: str, num_results: int) -> List[Dict[str, str]]:
+    """Run a single DuckDuckGo HTML search and parse the result blocks"""
+    import requests  # Deferred: only needed once web research actually runs
 
-    research = []
+    # DuckDuckGo HTML search
+    url = f"https://html.duckduckgo.com/html/?q={quote_plus(query)}"
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+    }
 
-    for query in queries:
-        results = search_duckduckgo(query, num_results=3)
-        if results:
-            for r in results:
-                research.append(f"- {r['title']}: {r['snippet']}")
+    response = requests.get(url, headers=headers, timeout=10)
+    response.raise_for_status()
 
-    return "\n".join(research) if research else ""
+    # Parse results (basic extraction)
+    results = []
 
-def get_competitor_info(company_name: str) -> str:
-    """
-    Research competitors
-    """
-    query = f"{company_name} main competitors comparison"
-    results = search_duckduckgo(query, num_results=5)
+    # Extract result blocks
+    result_pattern = r'<a class="result__a" href="([^"]+)"[^>]*>([^<]+)</a>'
+    snippet_pattern = r'<a class="result__snippet"[^>]*>([^<]+)</a>'
 
-    if results:
-        info = []
-        for r in results:
-            info.append(f"- {r['title']}: {r['snippet']}")
-        return "\n".join(info)
+    links = re.findall(result_pattern, response.text)
+    snippets = re.findall(snippet_pattern, response.text)
 
-    return ""
+    for i, (link, title) in enumerate(links[:num_results]):
+        snippet = snippets[i] if i < len(snippets) else ""
+        results.append({
+            'title': title.strip(),
+            'link': link,
+            'snippet': snippet.strip()
+        })
 
-def get_recent_news(company_name: str) -> str:
-    """
-    Get recent news about the company
-    """
-    query = f"{company_name} news 2024"
-    results = search_duckduckgo(query, num_results=5)
-
-    if results:
-        news = []
-        for r in results:
-            news.append(f"- {r['title']}: {r['snippet']}")
-        return "\n".join(news)
-
-    return ""
+    return results
 
-def get_risk_research(company_name: str, industry: str) -> str:
-    """
-    Research risks and challenges
-    """
-    queries = [
-        f"{company_name} risks challenges concerns",
-        f"{industry} industry risks regulatory"
-    ]
-
-    research = []
-
-    for query in queries:
-        results = search_duckduckgo(query, num_results=3)
-        if results:
-            for r in results:
-                research.append(f"- {r['title']}: {r['snippet']}")
-
-    return "\n".join(research) if research else ""
-
-def extract_company_name_from_report(report_text: str, llm_provider) -> str:
+def extract_company_name_from_report(report_text: str, llm_provider) -> Optional[str]:
     """
     Use LLM to extract company name from report
+    Returns None when the provider call fails
     """
     prompt = """Extract ONLY the company name from this annual report.
     Return just the company name, nothing else.
@@ -149,45 +100,70 @@ def extract_company_name_from_report(report_text: str, llm_provider) -> str:
     """
 
     try:
-        result = llm_provider.get_completion(prompt, report_text[:5000])
-        # Clean up the result
-        company_name = result.strip().replace('"', '').replace("'", "")
-        return company_name
-    except:
-        return "Unknown Company"
-
-def gather_web_research(company_name: str, section: str) -> str:
+        result = get_shared_completion(llm_provider, prompt, report_text[:5000], GenerationPolicy(64, 0.0))
+    except Exception as e:
+        print(f"Company name extraction error: {e}")
+        return None
+    if is_failed_answer(result):
+        return None
+    # Clean up the result
+    company_name = result.strip().replace('"', '').replace("'", "")
+    # A wrong name sends every research query to the wrong company: accept only something name-shaped
+    if (len(company_name) > MAX_COMPANY_NAME_CHARS or "\n" in company_name
+            or NOT_A_NAME_PATTERN.search(company_name)):
+        print(f"Company name extraction gave no usable name: {company_name[:100]!r}")
+        return None
+    return company_name or None
+
+def identify_report_company(report_text: str, llm_provider, metadata: Optional[Dict[str, str]] = None,
+                            tagged_name: Optional[str] = None) -> CompanyGuess:
+    """
+    Identify the reporting company from the cover page, metadata and entity mentions,
+    asking the LLM only when those local signals are not confident
+    """
+    guess = identify_company(report_text, metadata, tagged_name)
+    if guess.confident or llm_provider is None:
+        return guess
+
+    name = extract_company_name_from_report(report_text, llm_provider)
+    if name:
+        return CompanyGuess(name, max(guess.confidence, CONFIDENCE_THRESHOLD), "LLM")
+    return guess
+
+def _result_lines(results: List[Dict[str, str]]) -> List[str]:
+    return [f"- {r['title']}: {r['snippet']}" for r in results]
+
+def gather_web_research(company_name: str, section: str, plan: Optional[ResearchPlan] = None) -> str:
     """
     Gather relevant web research for a specific analysis section
+    `plan` shares merged searches across sections; without one only this section's are run
     """
+    plan = plan or ResearchPlan(company_name, search_duckduckgo, [section])
+    searches = plan.results(section)
     research = ""
 
     if section == "quick_stats":
-        results = search_duckduckgo(f"{company_name} market cap sector industry", 3)
-        if results:
-            research = "\n".join([f"- {r['snippet']}" for r in results])
+        research = "\n".join(f"- {r['snippet']}" for _, results in searches for r in results)
 
     elif section == "business_overview":
-        research = get_company_info(company_name)
+        all_info = []
+        for query, results in searches:
+            if results:
+                info = f"\n### Search: {query}\n"
+                for r in results:
+                    info += f"- **{r['title']}**: {r['snippet']}\n"
+                all_info.append(info)
+        research = "\n".join(all_info) if all_info else "No additional web research available."
 
     elif section == "ecosystem":
-        competitor_info = get_competitor_info(company_name)
+        competitor_info = "\n".join(line for _, results in searches for line in _result_lines(results))
         research = f"### Competitor Research:\n{competitor_info}"
 
-    elif section == "industry_deep_dive":
-        # First get industry from a quick search
-        industry_results = search_duckduckgo(f"{company_name} industry sector", 1)
-        industry = "technology"  # default
-        if industry_results:
-            industry = industry_results[0].get('snippet', 'technology')[:50]
-
-        research = get_industry_research(industry, company_name)
-
-    elif section == "risk_analysis":
-        research = get_risk_research(company_name, "")
+    elif section in ("industry_deep_dive", "risk_analysis"):
+        research = "\n".join(line for _, results in searches for line in _result_lines(results))
 
     elif section == "bull_bear_cases":
-        news = get_recent_news(company_name)
+        news = "\n".join(line for _, results in searches for line in _result_lines(results))
         research = f"### Recent News & Developments:\n{news}"
 
     return research
@@ -200,6 +176,8 @@ class WebResearchEnhancer:
     def __init__(self, company_name: str):
         self.company_name = company_name
         self.cache = {}
+        # Searches for all sections, merged where they overlap and run as sections need them
+        self.plan = ResearchPlan(company_name, search_duckduckgo)
 
     def get_research_for_section(self, section: str) -> str:
         """
@@ -208,7 +186,12 @@ class WebResearchEnhancer:
         if section in self.cache:
             return self.cache[section]
 
-        research = gather_web_research(self.company_name, section)
+        shared = get_shared_cache()
+        research = shared.get_text("research", self.company_name, section)
+        if research is None:
+            research = gather_web_research(self.company_name, section, self.plan)
+            if research:
+                shared.set_text("research", (self.company_name, section), research)
         self.cache[section] = research
         return research
 